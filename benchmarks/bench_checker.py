@@ -0,0 +1,112 @@
+"""Throughput, classification latency and memory of the checker against a local farm.
+
+    python -m benchmarks.bench_checker --sizes 1000 10000 100000 --latency 0.02 --drop-rate 0.1
+    python -m benchmarks.bench_checker --sizes 100000 --workers 4
+
+Proxy entries cycle over the farm's servers, so large lists reuse the same
+fake proxies; each entry is still checked independently.
+"""
+import argparse
+import asyncio
+import gc
+import statistics
+import time
+import tracemalloc
+
+import proxy_checker
+from proxy_checker import check_all_proxies_sharded, iter_checked_proxies
+from utils.proxy_farm import ProxyFarm
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_size(farm, size, concurrency, trace_memory):
+    proxies = farm.sample_proxies(size)
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+
+    latencies = []
+    counts = {}
+    misclassified = 0
+    start = time.perf_counter()
+    async for result in iter_checked_proxies(proxies, concurrency):
+        latencies.append(result["check_ms"] or 0.0)
+        proxy_type = result["type"] or "BAD"
+        counts[proxy_type] = counts.get(proxy_type, 0) + 1
+        if result["type"] and result["type"] != result["proxy"]["expected_type"]:
+            misclassified += 1
+    elapsed = time.perf_counter() - start
+
+    peak_mb = None
+    if trace_memory:
+        peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    print(f"\n== {size} proxies (concurrency {concurrency}) ==")
+    print(f"throughput : {size / elapsed:.0f} proxies/sec ({elapsed:.2f}s)")
+    print(f"latency    : p50 {percentile(latencies, 50):.1f} ms, "
+          f"p99 {percentile(latencies, 99):.1f} ms, mean {statistics.fmean(latencies):.1f} ms")
+    print(f"results    : {counts}, misclassified {misclassified}")
+    if peak_mb is not None:
+        print(f"memory     : {peak_mb:.1f} MB peak traced")
+    rss = max_rss_mb()
+    if rss is not None:
+        print(f"max RSS    : {rss:.1f} MB")
+
+
+async def run_size_sharded(farm, size, concurrency, workers):
+    proxies = farm.sample_proxies(size)
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    # Run the pool from a thread so the farm on this loop keeps serving
+    categorized = await loop.run_in_executor(
+        None, check_all_proxies_sharded, proxies, workers, concurrency)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n== {size} proxies ({workers} workers, concurrency {concurrency} each) ==")
+    print(f"throughput : {size / elapsed:.0f} proxies/sec ({elapsed:.2f}s)")
+    print(f"results    : { {k: len(v) for k, v in categorized.items()} }")
+
+
+async def main(args):
+    counts = {"HTTP": args.farm_size, "SOCKS5": args.farm_size, "SOCKS4": args.farm_size}
+    async with ProxyFarm(counts, latency=args.latency, drop_rate=args.drop_rate, seed=1) as farm:
+        proxy_checker.TEST_URL = farm.judge_url
+        for size in args.sizes:
+            if args.workers:
+                await run_size_sharded(farm, size, args.concurrency, args.workers)
+            else:
+                await run_size(farm, size, args.concurrency, args.trace_memory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--farm-size", type=int, default=20, help="fake proxies per protocol")
+    parser.add_argument("--concurrency", type=int, default=proxy_checker.MAX_CONCURRENCY)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="use check_all_proxies_sharded with this many processes")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="report tracemalloc peak (slows the run down)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+"""Concurrent client connections through the asyncio ProxyGateway, rotating over a fake proxy farm.
+
+Everything runs on one event loop on localhost:
+    python -m benchmarks.bench_gateway --clients 2000 --requests 5 --proxies 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.bench_tunnel import _handle_origin
+from proxy_gateway import PER_CONNECTION, PER_REQUEST, ProxyGateway
+from utils.proxy_farm import ProxyFarm, server_port
+from utils.proxy_record import Proxy
+from utils.proxy_rotator import AsyncProxyRotator
+from utils.upstream_pool import POOL_MAX_IDLE_PER_KEY
+
+
+async def client(gateway_port, origin, requests, latencies, size):
+    reader, writer = await asyncio.open_connection("127.0.0.1", gateway_port)
+    request = f"GET http://{origin}/bytes/{size} HTTP/1.1\r\nHost: {origin}\r\n\r\n".encode()
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            assert head.startswith(b"HTTP/1.1 200"), head[:40]
+            length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+            await reader.readexactly(length)
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        writer.close()
+
+
+async def run(gateway, origin, args):
+    latencies = []
+    peak = 0
+
+    async def watch():
+        nonlocal peak
+        while True:
+            peak = max(peak, gateway.connections)
+            await asyncio.sleep(0.01)
+
+    watcher = asyncio.create_task(watch())
+    start = time.perf_counter()
+    results = await asyncio.gather(*[client(gateway.port, origin, args.requests, latencies, args.size)
+                                     for _ in range(args.clients)], return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    watcher.cancel()
+    errors = [r for r in results if isinstance(r, BaseException)]
+    latencies.sort()
+    return len(latencies) / elapsed, latencies, peak, errors
+
+
+async def main(args):
+    async with ProxyFarm({"SOCKS5": args.proxies}) as farm:
+        origin_server = await asyncio.start_server(_handle_origin, "127.0.0.1", 0, backlog=4096)
+        origin = f"127.0.0.1:{server_port(origin_server)}"
+        for mode in (PER_REQUEST, PER_CONNECTION):
+            pool = [Proxy(p["ip"], p["port"], type="SOCKS5") for p in farm.proxies]
+            rotator = AsyncProxyRotator({"SOCKS5": pool}, strategy="p2c")
+            gateway = ProxyGateway(rotator, port=0, rotate_per=mode)
+            gateway.pool.max_idle_per_key = args.pool_per_key
+            gateway.pool.max_idle = max(gateway.pool.max_idle, args.clients)
+            async with gateway:
+                rate, latencies, peak, errors = await run(gateway, origin, args)
+            used = [rotator.health.get(p).requests for p in pool if rotator.health.get(p)]
+            print(f"rotate per {mode:>10}: {rate:8,.0f} req/s, p50 {statistics.median(latencies):7.1f} ms, "
+                  f"p99 {latencies[int(0.99 * len(latencies))]:7.1f} ms, {peak} concurrent connections, "
+                  f"{len(used)}/{len(pool)} upstreams used ({min(used)}-{max(used)} requests each), "
+                  f"{gateway.pool.hits} pool hits / {gateway.pool.misses} dials, {len(errors)} failed clients")
+        origin_server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=2000, help="concurrent client connections")
+    parser.add_argument("--requests", type=int, default=5, help="keep-alive requests per client")
+    parser.add_argument("--proxies", type=int, default=20, help="fake SOCKS5 upstreams")
+    parser.add_argument("--size", type=int, default=512, help="response body bytes")
+    parser.add_argument("--pool-per-key", type=int, default=POOL_MAX_IDLE_PER_KEY,
+                        help="idle upstream connections kept per proxy and destination")
+    asyncio.run(main(parser.parse_args()))
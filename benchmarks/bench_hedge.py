@@ -0,0 +1,105 @@
+"""Tail latency with and without hedged requests, through ProxyGateway and HedgedClient.
+
+The local origin answers most requests in ``--fast-ms`` but a
+``--slow-share`` of them only after ``--slow-ms``, standing in for the
+long tail of public proxies:
+    python -m benchmarks.bench_hedge --requests 2000 --clients 20
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from benchmarks.bench_gateway import client
+from proxy_checker import ProxySessionManager
+from proxy_gateway import ProxyGateway
+from utils.hedging import HedgedClient, HedgePolicy
+from utils.proxy_farm import ProxyFarm, server_port
+from utils.proxy_record import Proxy
+from utils.proxy_rotator import AsyncProxyRotator
+
+
+def tail_origin(args):
+    rng = random.Random(args.seed)
+
+    async def handle(reader, writer):
+        try:
+            while await reader.readuntil(b"\r\n\r\n"):
+                slow = rng.random() < args.slow_share
+                await asyncio.sleep((args.slow_ms if slow else args.fast_ms) * rng.uniform(0.5, 1.5) / 1000)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 512\r\n\r\n" + bytes(512))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+def summary(label, latencies, elapsed, policy):
+    latencies.sort()
+    stats = policy.to_dict() if policy else {"extra_load": 0, "wins": 0}
+    print(f"{label:>22}: p50 {statistics.median(latencies):7.1f} ms, p90 {latencies[int(0.9 * len(latencies))]:7.1f} ms, "
+          f"p99 {latencies[int(0.99 * len(latencies))]:7.1f} ms, {len(latencies) / elapsed:6.0f} req/s, "
+          f"{stats['extra_load']:.1%} extra requests, {stats['wins']} hedges won")
+
+
+def make_rotator(farm):
+    return AsyncProxyRotator({"SOCKS5": [Proxy(p["ip"], p["port"], type="SOCKS5") for p in farm.proxies]})
+
+
+async def through_gateway(farm, origin, args, policy):
+    latencies = []
+    async with ProxyGateway(make_rotator(farm), port=0, hedge=policy) as gateway:
+        start = time.perf_counter()
+        await asyncio.gather(*[client(gateway.port, origin, args.requests // args.clients, latencies, 512)
+                               for _ in range(args.clients)])
+    return latencies, time.perf_counter() - start
+
+
+async def through_client(farm, origin, args, policy):
+    latencies = []
+    async with ProxySessionManager() as sessions:
+        hedged = HedgedClient(make_rotator(farm), sessions, policy=policy)
+
+        async def worker():
+            for _ in range(args.requests // args.clients):
+                started = time.perf_counter()
+                result = await hedged.get(f"http://{origin}/")
+                assert result["status"] == 200
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.clients)])
+    return latencies, time.perf_counter() - start
+
+
+async def main(args):
+    async with ProxyFarm({"SOCKS5": args.proxies}) as farm:
+        origin_server = await asyncio.start_server(tail_origin(args), "127.0.0.1", 0)
+        origin = f"127.0.0.1:{server_port(origin_server)}"
+        for label, run in (("gateway", through_gateway), ("client", through_client)):
+            for hedged in (False, True):
+                # Without hedging the budget never allows one, so the code path is the same
+                policy = HedgePolicy(percentile=args.percentile, budget_ratio=args.budget if hedged else 0,
+                                     burst=args.burst if hedged else 0)
+                latencies, elapsed = await run(farm, origin, args, policy)
+                summary(f"{label}, {'hedged' if hedged else 'single'}", latencies, elapsed, policy)
+        origin_server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--proxies", type=int, default=10, help="fake SOCKS5 upstreams")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=20, help="concurrent keep-alive clients")
+    parser.add_argument("--fast-ms", type=float, default=20)
+    parser.add_argument("--slow-ms", type=float, default=1000)
+    parser.add_argument("--slow-share", type=float, default=0.05, help="share of requests that are slow")
+    parser.add_argument("--percentile", type=float, default=0.9, help="hedge after this latency percentile")
+    parser.add_argument("--budget", type=float, default=0.1, help="hedges allowed per request")
+    parser.add_argument("--burst", type=float, default=10, help="hedges that can be saved up")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
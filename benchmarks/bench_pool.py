@@ -0,0 +1,71 @@
+"""Time to first byte through ProxyGateway with and without the upstream connection pool.
+
+``--latency`` delays every new connection at the fake proxies, standing
+in for the handshake round trips a real proxy costs:
+    python -m benchmarks.bench_pool --proxies 10 --requests 500 --latency 0.02
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.bench_tunnel import _handle_origin
+from proxy_gateway import ProxyGateway
+from utils.proxy_farm import ProxyFarm, server_port
+from utils.proxy_record import Proxy
+from utils.proxy_rotator import AsyncProxyRotator
+from utils.upstream_pool import UpstreamPool
+
+
+async def client(gateway_port, origin, requests, ttfb):
+    reader, writer = await asyncio.open_connection("127.0.0.1", gateway_port)
+    request = f"GET http://{origin}/bytes/512 HTTP/1.1\r\nHost: {origin}\r\n\r\n".encode()
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            writer.write(request)
+            await reader.readexactly(1)
+            ttfb.append((time.perf_counter() - start) * 1000)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+            await reader.readexactly(length)
+    finally:
+        writer.close()
+
+
+async def run(farm, origin_host, origin_port, args, pooled, prewarm):
+    pool_proxies = [Proxy(p["ip"], p["port"], type="SOCKS5") for p in farm.proxies]
+    rotator = AsyncProxyRotator({"SOCKS5": pool_proxies}, strategy="random")
+    gateway = ProxyGateway(rotator, port=0)
+    if not pooled:
+        gateway.pool = UpstreamPool(gateway.dial, max_idle_per_key=0, refill=False)
+    async with gateway:
+        if prewarm:
+            await gateway.prewarm(origin_host, origin_port, per_proxy=args.clients)
+        ttfb = []
+        origin = f"{origin_host}:{origin_port}"
+        await asyncio.gather(*[client(gateway.port, origin, args.requests // args.clients, ttfb)
+                               for _ in range(args.clients)])
+        stats = f"{gateway.pool.hits} pool hits, {gateway.pool.misses} dials"
+    ttfb.sort()
+    return statistics.median(ttfb), ttfb[int(0.99 * len(ttfb))], statistics.mean(ttfb), stats
+
+
+async def main(args):
+    async with ProxyFarm({"SOCKS5": args.proxies}, latency=args.latency) as farm:
+        origin_server = await asyncio.start_server(_handle_origin, "127.0.0.1", 0)
+        origin_port = server_port(origin_server)
+        for label, pooled, prewarm in (("no pool", False, False), ("pool", True, False),
+                                       ("pool, prewarmed", True, True)):
+            p50, p99, mean, stats = await run(farm, "127.0.0.1", origin_port, args, pooled, prewarm)
+            print(f"{label:>16}: TTFB p50 {p50:6.2f} ms, p99 {p99:6.2f} ms, mean {mean:6.2f} ms ({stats})")
+        origin_server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--proxies", type=int, default=10, help="fake SOCKS5 upstreams")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--clients", type=int, default=4, help="concurrent keep-alive clients")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added per new proxy connection")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,71 @@
+"""Memory and access speed of proxy dicts versus Proxy records versus ProxyColumns.
+
+    python -m benchmarks.bench_records --count 1000000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from utils.proxy_record import Proxy, ProxyColumns
+
+
+def make_dicts(count, rng):
+    return [{"ip": f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+             "port": str(rng.randrange(1, 65536)), "username": None, "password": None,
+             "type": rng.choice(("HTTP", "SOCKS5", "SOCKS4")), "speed": rng.uniform(50, 3000)}
+            for _ in range(count)]
+
+
+def measure(label, build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    records = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:>14}: build {elapsed:6.2f}s, {size / 2 ** 20:8.1f} MiB ({size / max(1, len(records)):.0f} B/proxy)")
+    return records
+
+
+def time_scan(label, records, pick):
+    start = time.perf_counter()
+    total = 0.0
+    for record in records:
+        total += record.get("speed") or 0
+    get_elapsed = time.perf_counter() - start
+
+    # The rotator's "everything but the current proxy" filter
+    start = time.perf_counter()
+    [r for r in records if r != pick]
+    eq_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    [r for r in records if r is not pick]
+    is_elapsed = time.perf_counter() - start
+    print(f"{label:>14}: get('speed') {get_elapsed:.3f}s, != scan {eq_elapsed:.3f}s, "
+          f"'is not' scan {is_elapsed:.3f}s")
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    source = make_dicts(args.count, rng)
+
+    dicts = measure("dict", lambda: [dict(d) for d in source])
+    records = measure("Proxy", lambda: [Proxy.from_dict(d) for d in source])
+    columns = measure("ProxyColumns", lambda: ProxyColumns(source))
+    print(f"{'':>14}  packed columns alone: {columns.nbytes / 2 ** 20:.1f} MiB")
+
+    time_scan("dict", dicts, dicts[-1])
+    time_scan("Proxy", records, records[-1])
+    start = time.perf_counter()
+    columns.fastest(100)
+    print(f"{'ProxyColumns':>14}: fastest(100) {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=1)
+    main(parser.parse_args())
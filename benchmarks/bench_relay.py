@@ -0,0 +1,110 @@
+"""Throughput and CPU cost of the CONNECT tunnel relays in utils/relay.py against a naive copy loop.
+
+A local origin streams ``--size`` MiB through each relay into a sink:
+    python -m benchmarks.bench_relay --size 512
+"""
+import argparse
+import asyncio
+import select
+import socket
+import threading
+import time
+
+from utils.relay import SPLICE_AVAILABLE, relay, relay_async
+
+CHUNK = 1 << 20
+
+
+def socket_pair():
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        client = socket.create_connection(server.getsockname())
+        accepted, _ = server.accept()
+    return client, accepted
+
+
+def copy_relay(a, b, idle_timeout):
+    """Naive copy loop for reference: a fresh bytes object per recv, then sendall."""
+    sockets = [a, b]
+    while sockets:
+        readable, _, _ = select.select(sockets, [], [], idle_timeout)
+        if not readable:
+            return
+        for src in readable:
+            dst = b if src is a else a
+            data = src.recv(65536)
+            if not data:
+                sockets.remove(src)
+                dst.shutdown(socket.SHUT_WR)
+            else:
+                dst.sendall(data)
+
+
+def async_relay(**kwargs):
+    def run(a, b, idle_timeout):
+        asyncio.run(relay_async(a, b, idle_timeout, **kwargs))
+    return run
+
+
+def originate(sock, size):
+    payload = memoryview(bytes(CHUNK))
+    left = size
+    while left:
+        left -= sock.send(payload[:min(left, CHUNK)])
+    sock.shutdown(socket.SHUT_WR)
+
+
+def sink(sock, received):
+    buffer = bytearray(CHUNK)
+    while True:
+        count = sock.recv_into(buffer)
+        if not count:
+            break
+        received[0] += count
+    sock.close()
+
+
+def measure(run_relay, size):
+    origin, relay_in = socket_pair()
+    relay_out, client = socket_pair()
+    received = [0]
+    cpu = [0.0]
+
+    def relay_thread():
+        start = time.thread_time()
+        run_relay(relay_in, relay_out, 10)
+        cpu[0] = time.thread_time() - start
+
+    threads = [threading.Thread(target=relay_thread), threading.Thread(target=sink, args=(client, received))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    originate(origin, size)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    for sock in (origin, relay_in, relay_out):
+        sock.close()
+    assert received[0] == size, received[0]
+    return size / elapsed / 1e6, cpu[0] / (size / (1 << 30))
+
+
+def main(args):
+    relays = [("recv + sendall", copy_relay),
+              ("recv_into/memoryview", lambda a, b, t: relay(a, b, t, use_splice=False)),
+              ("asyncio, memoryview", async_relay(use_splice=False))]
+    if SPLICE_AVAILABLE:
+        relays += [("splice", lambda a, b, t: relay(a, b, t, use_splice=True)),
+                   ("asyncio, splice", async_relay(use_splice=True))]
+    size = args.size << 20
+    for label, run_relay in relays:
+        results = [measure(run_relay, size) for _ in range(args.rounds)]
+        rate = max(r[0] for r in results)
+        cpu = min(r[1] for r in results)
+        print(f"{label:>22}: {rate:8,.0f} MB/s, {cpu:6.3f} relay CPU seconds per GiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=512, help="MiB streamed per round")
+    parser.add_argument("--rounds", type=int, default=3, help="best of this many rounds")
+    main(parser.parse_args())
@@ -0,0 +1,86 @@
+"""Selection throughput of the ProxyRotator strategies on a large pool.
+
+    python -m benchmarks.bench_rotator --pool 100000
+"""
+import argparse
+import random
+import threading
+import time
+
+from utils.proxy_record import Proxy
+from utils.proxy_rotator import ProxyRotator
+from utils.selection import STRATEGIES
+
+
+def make_pool(size, rng):
+    return [Proxy(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 1080, speed=rng.uniform(50, 3000))
+            for i in range(size)]
+
+
+def bench_baseline(pool, rounds, rng):
+    # What _rotate_proxy used to do: rebuild the candidate list, then random.choice
+    current = pool[0]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        available = [p for p in pool if p is not current]
+        current = rng.choice(available)
+    return rounds / (time.perf_counter() - start)
+
+
+def bench_strategy(name, pool, rounds, rng):
+    start = time.perf_counter()
+    strategy = STRATEGIES[name](pool, rng=random.Random(rng.random()))
+    build = time.perf_counter() - start
+
+    current = None
+    start = time.perf_counter()
+    for _ in range(rounds):
+        current = strategy.select(exclude=current)
+    selects = rounds / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for proxy in rng.sample(pool, min(rounds, len(pool))):
+        strategy.update(proxy, rng.uniform(50, 3000))
+    updates = min(rounds, len(pool)) / (time.perf_counter() - start)
+    return build, selects, updates
+
+
+def bench_threads(pool, threads, seconds, strategy):
+    # Hundreds of consumers, each with its own sticky session, pulling at once
+    rotator = ProxyRotator({"SOCKS5": pool}, interval_seconds=1, max_uses=20, strategy=strategy)
+    counts = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def consumer(index):
+        while time.perf_counter() < deadline:
+            rotator.acquire(index, "SOCKS5")
+            counts[index] += 1
+
+    workers = [threading.Thread(target=consumer, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(counts) / seconds
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    pool = make_pool(args.pool, rng)
+    baseline_rounds = max(1, args.rounds // 1000)
+    print(f"{'list + choice':>14}: {bench_baseline(pool, baseline_rounds, rng):12,.0f} selects/sec")
+    for name in STRATEGIES:
+        build, selects, updates = bench_strategy(name, pool, args.rounds, rng)
+        print(f"{name:>14}: {selects:12,.0f} selects/sec, {updates:10,.0f} updates/sec, built in {build:.2f}s")
+    acquires = bench_threads(pool, args.threads, args.seconds, "p2c")
+    print(f"{args.threads} threads with sticky sessions (p2c): {acquires:,.0f} acquires/sec")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pool", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=100_000)
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,53 @@
+"""Probes/sec with a session per probe versus one shared ProxySessionManager.
+
+Runs entirely against a local fake proxy farm:
+    python -m benchmarks.bench_sessions
+"""
+import argparse
+import asyncio
+import time
+
+import proxy_checker
+from proxy_checker import ProxySessionManager, test_proxy_speed
+from utils.proxy_farm import ProxyFarm
+
+
+async def run_probes(proxies, rounds, concurrency, shared):
+    semaphore = asyncio.Semaphore(concurrency)
+    ok = 0
+
+    async def probe(proxy, sessions):
+        nonlocal ok
+        async with semaphore:
+            if await test_proxy_speed(proxy, proxy["expected_type"], sessions) is not None:
+                ok += 1
+
+    start = time.perf_counter()
+    if shared:
+        async with ProxySessionManager(limit=concurrency) as sessions:
+            # Two probes per proxy mirrors the liveness check followed by the speed test.
+            for _ in range(rounds):
+                await asyncio.gather(*[probe(p, sessions) for p in proxies for _ in range(2)])
+            for proxy in proxies:
+                await sessions.release(proxy)
+    else:
+        for _ in range(rounds):
+            await asyncio.gather(*[probe(p, None) for p in proxies for _ in range(2)])
+    elapsed = time.perf_counter() - start
+    return ok, elapsed
+
+
+async def main(args):
+    async with ProxyFarm({"HTTP": args.proxies, "SOCKS5": args.proxies}) as farm:
+        proxy_checker.TEST_URL = farm.judge_url
+        for label, shared in (("session per probe", False), ("shared sessions", True)):
+            ok, elapsed = await run_probes(farm.proxies, args.rounds, args.concurrency, shared)
+            print(f"{label:>18}: {ok} probes in {elapsed:.2f}s -> {ok / elapsed:.0f} probes/sec")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--proxies", type=int, default=50, help="fake proxies per protocol")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,169 @@
+"""Latency and throughput of the local forward proxy (proxy_tunnel) against a local origin.
+
+Traffic goes client -> tunnel -> fake SOCKS5 proxy -> origin, all on localhost:
+    python -m benchmarks.bench_tunnel --requests 2000 --megabytes 200
+"""
+import argparse
+import asyncio
+import http.client
+import statistics
+import threading
+import time
+
+import proxy_tunnel
+from utils.proxy_farm import ProxyFarm, server_port
+
+CHUNK = b"x" * 65536
+
+
+async def _handle_origin(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    # GET /bytes/<n>, GET /chunked/<n> and POST /upload (answers with the byte count)
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            method, path = head.split(b" ", 2)[:2]
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            if method == b"POST":
+                received = 0
+                if b"transfer-encoding: chunked" in head.lower():
+                    while True:
+                        size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                        await reader.readexactly(size + 2)
+                        if not size:
+                            break
+                        received += size
+                while received < length:
+                    received += len(await reader.read(min(length - received, 1 << 20)))
+                body = str(received).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            else:
+                size = int(path.rsplit(b"/", 1)[1])
+                chunked = path.startswith(b"/chunked/")
+                writer.write(b"HTTP/1.1 200 OK\r\n" + (b"Transfer-Encoding: chunked\r\n\r\n" if chunked
+                                                       else b"Content-Length: %d\r\n\r\n" % size))
+                while size > 0:
+                    piece = CHUNK[:min(size, len(CHUNK))]
+                    writer.write(b"%X\r\n%s\r\n" % (len(piece), piece) if chunked else piece)
+                    size -= len(piece)
+                    await writer.drain()
+                if chunked:
+                    writer.write(b"0\r\n\r\n")
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError, IndexError):
+        pass
+    finally:
+        writer.close()
+
+
+class Backend:
+    """Origin server and fake SOCKS5 proxy running on an event loop in a background thread."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        self.farm = self._run(ProxyFarm({"SOCKS5": 1}).start())
+        self.origin = self._run(asyncio.start_server(_handle_origin, "127.0.0.1", 0, backlog=1024))
+        self.origin_port = server_port(self.origin)
+        return self
+
+    def __exit__(self, *exc):
+        self.origin.close()
+        self._run(self.farm.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+def bench_requests(tunnel_port, origin, count):
+    conn = http.client.HTTPConnection("127.0.0.1", tunnel_port)
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        conn.request("GET", f"http://{origin}/bytes/512")
+        response = conn.getresponse()
+        assert len(response.read()) == 512
+        latencies.append((time.perf_counter() - start) * 1000)
+    conn.close()
+    latencies.sort()
+    return count / (sum(latencies) / 1000), statistics.median(latencies), latencies[int(0.99 * len(latencies))]
+
+
+def bench_concurrent(tunnel_port, origin, clients, count):
+    threads = [threading.Thread(target=bench_requests, args=(tunnel_port, origin, count)) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return clients * count / (time.perf_counter() - start)
+
+
+def bench_download(conn, path, size):
+    start = time.perf_counter()
+    conn.request("GET", path)
+    response = conn.getresponse()
+    received = 0
+    while True:
+        data = response.read(1 << 20)
+        if not data:
+            break
+        received += len(data)
+    assert received == size, (received, size)
+    return size / 2 ** 20 / (time.perf_counter() - start)
+
+
+def bench_upload(conn, path, size):
+    def body():
+        sent = 0
+        while sent < size:
+            piece = CHUNK[:min(size - sent, len(CHUNK))]
+            sent += len(piece)
+            yield piece
+
+    start = time.perf_counter()
+    conn.request("POST", path, body=body(), headers={"Content-Length": str(size)})
+    assert int(conn.getresponse().read()) == size
+    return size / 2 ** 20 / (time.perf_counter() - start)
+
+
+def main(args):
+    with Backend() as backend:
+        proxy = dict(backend.farm.proxies[0], type="SOCKS5")
+        proxy_tunnel.start_proxy_tunnel(proxy, args.port)
+        origin = f"127.0.0.1:{backend.origin_port}"
+        size = args.megabytes * 2 ** 20
+        try:
+            rate, p50, p99 = bench_requests(args.port, origin, args.requests)
+            print(f"keep-alive GETs: {rate:8,.0f} req/s, p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+            rate = bench_concurrent(args.port, origin, args.clients, args.requests // args.clients)
+            print(f"{args.clients} concurrent clients: {rate:8,.0f} req/s")
+
+            conn = http.client.HTTPConnection("127.0.0.1", args.port)
+            print(f"download: {bench_download(conn, f'http://{origin}/bytes/{size}', size):8,.0f} MB/s")
+            print(f"chunked download: {bench_download(conn, f'http://{origin}/chunked/{size}', size):8,.0f} MB/s")
+            print(f"upload: {bench_upload(conn, f'http://{origin}/upload', size):8,.0f} MB/s")
+            conn.close()
+
+            conn = http.client.HTTPConnection("127.0.0.1", args.port)
+            conn.set_tunnel(origin)
+            print(f"CONNECT tunnel download: {bench_download(conn, f'/bytes/{size}', size):8,.0f} MB/s")
+            conn.close()
+        finally:
+            proxy_tunnel.stop_proxy_tunnel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=18888, help="local port for the tunnel")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--megabytes", type=int, default=200)
+    main(parser.parse_args())
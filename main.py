@@ -1,7 +1,8 @@
 import asyncio
 import os
-from proxy_loader import load_proxies
-from proxy_checker import check_all_proxies
+from utils.proxy_dedup import ProxyIndex, iter_unique_proxies
+from proxy_checker import iter_revalidated_proxies, categorize_result
+from utils.proxy_db import ProxyHealthDB
 from utils.proxy_saver import save_proxies_by_type
 from utils.proxy_utils import test_proxy_latency, format_proxy
 from utils.proxy_rotator import ProxyRotator
@@ -21,22 +22,36 @@ def print_with_latency(proxies, label):
         latency = test_proxy_latency(proxy["ip"], proxy["port"])
         logger.info(f"{format_proxy(proxy)} - {latency if latency != -1 else 'FAIL'} ms")
 
+async def check_proxies_streaming(proxy_list, db):
+    categorized = {"HTTP": [], "SOCKS5": [], "SOCKS4": [], "BAD": []}
+    reused = 0
+    async for result in iter_revalidated_proxies(proxy_list, db):
+        reused += bool(result.get("cached"))
+        proxy_type = categorize_result(categorized, result)
+        if proxy_type != "BAD":
+            proxy = result["proxy"]
+            logger.info(f"[{proxy_type}] {format_proxy(proxy)} - {proxy.get('speed')} ms")
+    if reused:
+        logger.info(f"Reused {reused} recent results from the health database.")
+    return categorized
+
 def main():
     base_dir = os.path.dirname(os.path.abspath(__file__))
     proxy_file = os.path.join(base_dir, "data", "proxies.txt")
     
     try:
-        logger.info(f"Loading proxies from: {proxy_file}")
-        proxy_list = load_proxies(proxy_file)
+        logger.info(f"Streaming proxies from: {proxy_file}. Starting check...\n")
+        index = ProxyIndex()
+        proxy_list = iter_unique_proxies([proxy_file], index)
+
+        with ProxyHealthDB() as db:
+            categorized = asyncio.run(check_proxies_streaming(proxy_list, db))
+        logger.info(f"Checked {len(index)} unique proxies, skipped {index.dropped} duplicates.")
 
-        if not proxy_list:
+        if not any(categorized.values()):
             logger.warning("No valid proxies found in file.")
             return
 
-        logger.info(f"Loaded {len(proxy_list)} proxies. Starting check...\n")
-
-        categorized = asyncio.run(check_all_proxies(proxy_list))
-
         display_summary(categorized)
         save_proxies_by_type(categorized)
 
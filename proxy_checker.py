@@ -1,130 +1,407 @@
 import asyncio
 import aiohttp
+import itertools
+import os
+import statistics
 import time
 from aiohttp_socks import ProxyConnector
-from typing import List, Dict, Optional
-from utils.ip_info import get_ip_info
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Union
+from urllib.parse import urlsplit
+from proxy_sniffer import PROTOCOL_ORDER, detect_protocol
+from utils.ip_enricher import enrich_results
+from utils.proxy_db import LOOKUP_BATCH, ProxyHealthDB
+from utils.proxy_utils import format_host
 
-TEST_URL = "http://httpbin.org/ip"
+# Judge endpoint; point PROXY_JUDGE_URL at a local judge (utils/proxy_farm.py) to check offline
+TEST_URL = os.environ.get("PROXY_JUDGE_URL", "http://httpbin.org/ip")
 TIMEOUT = 10
+MAX_CONCURRENCY = 200  # Upper bound on proxies checked at the same time
+KEEPALIVE_TIMEOUT = 2  # Seconds an idle probe connection is kept for reuse
+SHARD_SIZE = 2000  # Proxies handed to a worker process at a time in sharded mode
+SNIFF_PROTOCOLS = True  # Identify the protocol from handshake bytes before the full check
+RECORD_BATCH = 100  # Live results written to the health database per executor call
+
+def build_socks_url(proxy: Dict, version: str) -> str:
+    if proxy.get("username") and proxy.get("password"):
+        return f"{version}://{proxy['username']}:{proxy['password']}@{format_host(proxy['ip'])}:{proxy['port']}"
+    return f"{version}://{format_host(proxy['ip'])}:{proxy['port']}"
+
+
+async def _on_connection_create_start(session, ctx, params):
+    if isinstance(ctx.trace_request_ctx, dict):
+        ctx.trace_request_ctx["connect_start"] = time.perf_counter()
+
+
+async def _on_connection_create_end(session, ctx, params):
+    if isinstance(ctx.trace_request_ctx, dict):
+        ctx.trace_request_ctx["connect_end"] = time.perf_counter()
+
+
+# Records when the TCP (and SOCKS handshake) connection for a probe is set up
+_timing_trace = aiohttp.TraceConfig()
+_timing_trace.on_connection_create_start.append(_on_connection_create_start)
+_timing_trace.on_connection_create_end.append(_on_connection_create_end)
+
+
+class ProxySessionManager:
+    """Owns the aiohttp sessions used during a checking run.
+
+    HTTP proxies all go through one long-lived session whose connector keeps
+    connections alive per proxy, so consecutive probes through the same proxy
+    reuse a single TCP connection. SOCKS proxies need a connector bound to
+    the proxy itself; those sessions are cached per proxy entry and closed with
+    ``release()`` once the proxy is done.
+    """
+
+    def __init__(self, limit: int = MAX_CONCURRENCY, keepalive_timeout: float = KEEPALIVE_TIMEOUT):
+        self.limit = limit
+        self.keepalive_timeout = keepalive_timeout
+        self._http_session: Optional[aiohttp.ClientSession] = None
+        self._socks_sessions: Dict[tuple, aiohttp.ClientSession] = {}
+
+    def http_session(self) -> aiohttp.ClientSession:
+        if self._http_session is None or self._http_session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                ttl_dns_cache=300,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._http_session = aiohttp.ClientSession(connector=connector, trace_configs=[_timing_trace])
+        return self._http_session
+
+    def socks_session(self, proxy: Dict, version: str) -> aiohttp.ClientSession:
+        # Keyed by the proxy entry itself so duplicate entries checked at the
+        # same time never close each other's session.
+        key = (id(proxy), version)
+        session = self._socks_sessions.get(key)
+        if session is None or session.closed:
+            # Let SOCKS5 proxies resolve the judge host so no local DNS
+            # lookup is paid per proxy.
+            connector = ProxyConnector.from_url(
+                build_socks_url(proxy, version),
+                rdns=version == "socks5",
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            session = aiohttp.ClientSession(connector=connector, trace_configs=[_timing_trace])
+            self._socks_sessions[key] = session
+        return session
+
+    async def release(self, proxy: Dict):
+        """Close any SOCKS sessions held for ``proxy``."""
+        for version in ("socks5", "socks4"):
+            session = self._socks_sessions.pop((id(proxy), version), None)
+            if session is not None:
+                await session.close()
+
+    async def close(self):
+        sessions = list(self._socks_sessions.values())
+        self._socks_sessions.clear()
+        if self._http_session is not None:
+            sessions.append(self._http_session)
+            self._http_session = None
+        for session in sessions:
+            await session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+async def timed_get(session: aiohttp.ClientSession, proxy_url: Optional[str] = None) -> Optional[Dict]:
+    """GET ``TEST_URL`` and return connect/first-byte/total times in ms, or None on a non-200.
+
+    ``connect_ms`` is None when the request reused a kept-alive connection.
+    """
+    trace_ctx = {}
+    start_time = time.perf_counter()
+    async with session.get(TEST_URL, proxy=proxy_url, timeout=TIMEOUT,
+                           trace_request_ctx=trace_ctx) as response:
+        first_byte = time.perf_counter()
+        await response.read()
+        if response.status != 200:
+            return None
+    end_time = time.perf_counter()
+
+    connect_ms = None
+    if "connect_start" in trace_ctx and "connect_end" in trace_ctx:
+        connect_ms = round((trace_ctx["connect_end"] - trace_ctx["connect_start"]) * 1000, 2)
+    return {
+        "connect_ms": connect_ms,
+        "ttfb_ms": round((first_byte - start_time) * 1000, 2),
+        "total_ms": round((end_time - start_time) * 1000, 2),
+    }
+
+
+async def probe_proxy(proxy: Dict, proxy_type: str, sessions: ProxySessionManager) -> Optional[Dict]:
+    """Send one timed request through ``proxy`` as ``proxy_type``; None if it fails."""
+    try:
+        if proxy_type == "HTTP":
+            proxy_url = f"http://{format_host(proxy['ip'])}:{proxy['port']}"
+            return await timed_get(sessions.http_session(), proxy_url)
+        return await timed_get(sessions.socks_session(proxy, proxy_type.lower()))
+    except Exception as e:
+        print(f"[{proxy_type}] Proxy failed: {proxy['ip']}:{proxy['port']} -> {e}")
+    return None
+
 
 async def check_http_proxy(session, proxy: Dict) -> str | None:
-    proxy_url = f"http://{proxy['ip']}:{proxy['port']}"
+    proxy_url = f"http://{format_host(proxy['ip'])}:{proxy['port']}"
     try:
-        async with session.get(TEST_URL, proxy=proxy_url, timeout=TIMEOUT) as response:
-            if response.status == 200:
-                return 'HTTP'
+        if await timed_get(session, proxy_url):
+            return 'HTTP'
     except Exception as e:
         print(f"[HTTP] Proxy failed: {proxy['ip']}:{proxy['port']} -> {e}")
     return None
 
 
-async def check_socks_proxy(proxy: Dict, version: str = 'socks5') -> str | None:
-    if proxy.get("username") and proxy.get("password"):
-        socks_url = f"{version}://{proxy['username']}:{proxy['password']}@{proxy['ip']}:{proxy['port']}"
-    else:
-        socks_url = f"{version}://{proxy['ip']}:{proxy['port']}"
+async def check_socks_proxy(proxy: Dict, version: str = 'socks5',
+                            sessions: Optional[ProxySessionManager] = None) -> str | None:
+    owns_sessions = sessions is None
+    if owns_sessions:
+        sessions = ProxySessionManager()
 
     try:
-        connector = ProxyConnector.from_url(socks_url)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            async with session.get(TEST_URL, timeout=TIMEOUT) as response:
-                if response.status == 200:
-                    return version.upper()
-    except Exception as e:
-        print(f"[{version.upper()}] Proxy failed: {proxy['ip']}:{proxy['port']} -> {e}")
+        if await probe_proxy(proxy, version.upper(), sessions):
+            return version.upper()
+    finally:
+        if owns_sessions:
+            await sessions.close()
     return None
 
 
-async def test_proxy_speed(proxy: Dict, proxy_type: str) -> Optional[float]:
+async def test_proxy_speed(proxy: Dict, proxy_type: str,
+                           sessions: Optional[ProxySessionManager] = None) -> Optional[float]:
     """Measure proxy response time in milliseconds."""
+    owns_sessions = sessions is None
+    if owns_sessions:
+        sessions = ProxySessionManager()
+
+    try:
+        timings = await probe_proxy(proxy, proxy_type, sessions)
+        return timings["total_ms"] if timings else None
+    finally:
+        if owns_sessions:
+            await sessions.close()
+
+
+async def check_single_proxy(proxy: Dict, sessions: Optional[ProxySessionManager] = None,
+                             latency_samples: int = 0) -> Dict:
+    """Find the proxy's protocol with a single timed request per candidate.
+
+    Candidates come from ``detect_protocol`` unless SNIFF_PROTOCOLS is off,
+    in which case HTTP, SOCKS5 and SOCKS4 are tried in turn.
+
+    The validation request doubles as the speed test. ``latency_samples``
+    extra requests are only sent when asked for; ``speed`` then becomes
+    their median. ``check_ms`` is the wall time spent classifying the proxy.
+    """
+    result = {"proxy": proxy, "type": None, "speed": None,
+              "connect_ms": None, "ttfb_ms": None, "total_ms": None, "check_ms": None}
     start_time = time.perf_counter()
+
+    owns_sessions = sessions is None
+    if owns_sessions:
+        sessions = ProxySessionManager()
+
     try:
-        if proxy_type == "HTTP":
-            proxy_url = f"http://{proxy['ip']}:{proxy['port']}"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(TEST_URL, proxy=proxy_url, timeout=TIMEOUT) as response:
-                    if response.status == 200:
-                        elapsed = (time.perf_counter() - start_time) * 1000
-                        return round(elapsed, 2)
+        # A type from the source list (e.g. socks5://...) is trusted as-is;
+        # otherwise sniff the handshake so only the matching protocol gets a full request
+        if proxy.get("type") in PROTOCOL_ORDER:
+            candidates = [proxy["type"]]
+        elif SNIFF_PROTOCOLS:
+            judge = urlsplit(TEST_URL)
+            candidates = await detect_protocol(proxy, judge.hostname, judge.port or 80)
         else:
-            version = proxy_type.lower()
-            if proxy.get("username") and proxy.get("password"):
-                socks_url = f"{version}://{proxy['username']}:{proxy['password']}@{proxy['ip']}:{proxy['port']}"
-            else:
-                socks_url = f"{version}://{proxy['ip']}:{proxy['port']}"
-            connector = ProxyConnector.from_url(socks_url)
-            async with aiohttp.ClientSession(connector=connector) as session:
-                async with session.get(TEST_URL, timeout=TIMEOUT) as response:
-                    if response.status == 200:
-                        elapsed = (time.perf_counter() - start_time) * 1000
-                        return round(elapsed, 2)
-    except Exception:
-        pass
-    return None
-
+            candidates = PROTOCOL_ORDER
 
-async def check_single_proxy(proxy: Dict) -> Dict:
-    result = {"proxy": proxy, "type": None, "speed": None}
-
-    # HTTP check
-    async with aiohttp.ClientSession() as session:
-        proxy_type = await check_http_proxy(session, proxy)
-        if proxy_type:
-            result["type"] = proxy_type
-            result["speed"] = await test_proxy_speed(proxy, proxy_type)
-            
-            # Get IP geolocation and abuse info
-            ip_info = get_ip_info(proxy['ip'])
-            proxy.update({
-                "country": ip_info.get("country", "Unknown"),
-                "country_code": ip_info.get("country_code", "XX"),
-                "city": ip_info.get("city", "Unknown"),
-                "is_abused": ip_info.get("is_abused", False),
-                "abuse_score": ip_info.get("abuse_score", 0)
-            })
+        for proxy_type in candidates:
+            timings = await probe_proxy(proxy, proxy_type, sessions)
+            if timings:
+                break
+        else:
             return result
 
-    # SOCKS5 check
-    proxy_type = await check_socks_proxy(proxy, 'socks5')
-    if proxy_type:
-        result["type"] = proxy_type
-        result["speed"] = await test_proxy_speed(proxy, proxy_type)
-        
-        # Get IP geolocation and abuse info
-        ip_info = get_ip_info(proxy['ip'])
-        proxy.update({
-            "country": ip_info.get("country", "Unknown"),
-            "country_code": ip_info.get("country_code", "XX"),
-            "city": ip_info.get("city", "Unknown"),
-            "is_abused": ip_info.get("is_abused", False),
-            "abuse_score": ip_info.get("abuse_score", 0)
-        })
-        return result
-
-    # SOCKS4 check
-    proxy_type = await check_socks_proxy(proxy, 'socks4')
-    if proxy_type:
+        result.update(timings)
         result["type"] = proxy_type
-        result["speed"] = await test_proxy_speed(proxy, proxy_type)
-        
-        # Get IP geolocation and abuse info
-        ip_info = get_ip_info(proxy['ip'])
-        proxy.update({
-            "country": ip_info.get("country", "Unknown"),
-            "country_code": ip_info.get("country_code", "XX"),
-            "city": ip_info.get("city", "Unknown"),
-            "is_abused": ip_info.get("is_abused", False),
-            "abuse_score": ip_info.get("abuse_score", 0)
-        })
-        return result
+        result["speed"] = timings["total_ms"]
+
+        if latency_samples > 0:
+            samples = []
+            for _ in range(latency_samples):
+                speed = await test_proxy_speed(proxy, proxy_type, sessions)
+                if speed is not None:
+                    samples.append(speed)
+            result["latency_samples"] = samples
+            if samples:
+                result["speed"] = statistics.median(samples)
+    finally:
+        result["check_ms"] = round((time.perf_counter() - start_time) * 1000, 2)
+        if owns_sessions:
+            await sessions.close()
+        else:
+            await sessions.release(proxy)
 
     return result
 
 
-async def check_all_proxies(proxies: List[Dict]) -> Dict[str, List[Dict]]:
-    results = await asyncio.gather(*[check_single_proxy(proxy) for proxy in proxies])
+async def iter_checked_proxies(proxies: Union[Iterable[Dict], AsyncIterable[Dict]],
+                               concurrency: int = MAX_CONCURRENCY,
+                               latency_samples: int = 0,
+                               enrich: bool = True) -> AsyncIterator[Dict]:
+    """Check proxies through a bounded worker pool, yielding results as they finish.
+
+    At most ``concurrency`` checks are in flight at once. Proxies are pulled
+    from ``proxies`` lazily, so any iterable (including a generator) or
+    async iterable works.
+    ``latency_samples`` is passed through to ``check_single_proxy``. With
+    ``enrich``, working proxies get geolocation/abuse info from a separate
+    pipeline stage that never holds up the checks.
+    """
+    results = _iter_check_results(proxies, concurrency, latency_samples)
+    if enrich:
+        results = enrich_results(results)
+    try:
+        async for result in results:
+            yield result
+    finally:
+        await results.aclose()
+
+
+async def iter_revalidated_proxies(proxies: Iterable[Dict], db: ProxyHealthDB,
+                                   concurrency: int = MAX_CONCURRENCY,
+                                   latency_samples: int = 0,
+                                   enrich: bool = True) -> AsyncIterator[Dict]:
+    """Like ``iter_checked_proxies``, but only probes proxies whose stored health data is stale.
+
+    Proxies checked recently enough according to ``db`` are answered from
+    it (results carry ``"cached": True``) as soon as they are looked up.
+    Everything else is checked live and the outcome is recorded, so the
+    next run can skip it in turn. ``proxies`` is streamed in batches of
+    ``LOOKUP_BATCH``; the lookups and writes run off the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    out: asyncio.Queue = asyncio.Queue(maxsize=max(1, int(concurrency)) * 2)
+
+    async def stale_only():
+        source = iter(proxies)
+        while True:
+            batch = list(itertools.islice(source, LOOKUP_BATCH))
+            if not batch:
+                return
+            cached = await loop.run_in_executor(None, db.cached_results, batch)
+            for proxy, result in zip(batch, cached):
+                if result is None:
+                    yield proxy
+                else:
+                    await out.put(result)
 
+    async def check_stale():
+        results = iter_checked_proxies(stale_only(), concurrency, latency_samples, enrich)
+        unrecorded = []
+        try:
+            async for result in results:
+                unrecorded.append(result)
+                if len(unrecorded) >= RECORD_BATCH:
+                    batch, unrecorded = unrecorded, []
+                    await loop.run_in_executor(None, db.record_many, batch)
+                await out.put(result)
+            batch, unrecorded = unrecorded, []
+            await loop.run_in_executor(None, db.record_many, batch)
+            await out.put(None)
+        except Exception as e:
+            await out.put(e)
+        finally:
+            await results.aclose()
+            db.record_many(unrecorded)  # Only left over when stopped early
+
+    checker = asyncio.create_task(check_stale())
+    try:
+        while True:
+            result = await out.get()
+            if result is None:
+                break
+            if isinstance(result, Exception):
+                raise result
+            yield result
+    finally:
+        checker.cancel()
+        await asyncio.gather(checker, return_exceptions=True)
+        db.commit()
+
+
+async def _iter_check_results(proxies: Union[Iterable[Dict], AsyncIterable[Dict]], concurrency: int,
+                              latency_samples: int) -> AsyncIterator[Dict]:
+    concurrency = max(1, int(concurrency))
+    pending: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    finished: asyncio.Queue = asyncio.Queue()
+
+    async def feed():
+        try:
+            if hasattr(proxies, "__aiter__"):
+                async for proxy in proxies:
+                    await pending.put(proxy)
+            else:
+                for proxy in proxies:
+                    await pending.put(proxy)
+        except Exception:
+            # Stop the workers anyway; the error reaches the caller at ``await feeder``
+            for _ in range(concurrency):
+                await pending.put(None)
+            raise
+        for _ in range(concurrency):
+            await pending.put(None)
+
+    async def worker(sessions: ProxySessionManager):
+        while True:
+            proxy = await pending.get()
+            if proxy is None:
+                break
+            try:
+                result = await check_single_proxy(proxy, sessions, latency_samples)
+            except Exception as e:
+                print(f"[Checker] Unexpected error for {proxy.get('ip')}:{proxy.get('port')} -> {e}")
+                result = {"proxy": proxy, "type": None, "speed": None}
+            await finished.put(result)
+        await finished.put(None)
+
+    async with ProxySessionManager(limit=concurrency) as sessions:
+        feeder = asyncio.create_task(feed())
+        workers = [asyncio.create_task(worker(sessions)) for _ in range(concurrency)]
+        try:
+            remaining = len(workers)
+            while remaining:
+                result = await finished.get()
+                if result is None:
+                    remaining -= 1
+                    continue
+                yield result
+            await feeder
+        finally:
+            for task in [feeder, *workers]:
+                task.cancel()
+            await asyncio.gather(feeder, *workers, return_exceptions=True)
+
+
+def categorize_result(categorized: Dict[str, List[Dict]], result: Dict) -> str:
+    """Append the proxy from a check result to its bucket and return the bucket name."""
+    proxy = result["proxy"]
+    proxy_type = result["type"]
+    if proxy_type:
+        proxy["speed"] = result.get("speed")
+        for key in ("connect_ms", "ttfb_ms", "total_ms"):
+            proxy[key] = result.get(key)
+        categorized[proxy_type].append(proxy)
+        return proxy_type
+    categorized["BAD"].append(proxy)
+    return "BAD"
+
+
+async def check_all_proxies(proxies: Iterable[Dict],
+                            concurrency: int = MAX_CONCURRENCY,
+                            latency_samples: int = 0) -> Dict[str, List[Dict]]:
     categorized = {
         "HTTP": [],
         "SOCKS5": [],
@@ -132,44 +409,63 @@ async def check_all_proxies(proxies: List[Dict]) -> Dict[str, List[Dict]]:
         "BAD": []
     }
 
-    for result in results:
-        proxy = result["proxy"]
-        proxy_type = result["type"]
-        if proxy_type:
-            proxy["speed"] = result.get("speed")
-            categorized[proxy_type].append(proxy)
-        else:
-            categorized["BAD"].append(proxy)
+    async for result in iter_checked_proxies(proxies, concurrency, latency_samples):
+        categorize_result(categorized, result)
 
     return categorized
-async def test_proxy_speed(proxy: Dict, proxy_type: str) -> float | None:
-    """Test the speed (latency in ms) of a single proxy based on type."""
-    url = TEST_URL
-    timeout = TIMEOUT
 
-    start_time = time.time()
 
-    try:
-        if proxy_type == "HTTP":
-            proxy_url = f"http://{proxy['ip']}:{proxy['port']}"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, proxy=proxy_url, timeout=timeout) as response:
-                    if response.status == 200:
-                        return round((time.time() - start_time) * 1000, 2)
-
-        elif proxy_type in ("SOCKS4", "SOCKS5"):
-            version = proxy_type.lower()
-            if proxy.get("username") and proxy.get("password"):
-                socks_url = f"{version}://{proxy['username']}:{proxy['password']}@{proxy['ip']}:{proxy['port']}"
-            else:
-                socks_url = f"{version}://{proxy['ip']}:{proxy['port']}"
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
 
-            connector = ProxyConnector.from_url(socks_url)
-            async with aiohttp.ClientSession(connector=connector) as session:
-                async with session.get(url, timeout=timeout) as response:
-                    if response.status == 200:
-                        return round((time.time() - start_time) * 1000, 2)
 
-    except Exception as e:
-        print(f"[SpeedTest-{proxy_type}] Proxy failed: {proxy['ip']}:{proxy['port']} -> {e}")
-        return None
\ No newline at end of file
+def _init_shard_worker(test_url: str):
+    global TEST_URL, _worker_loop
+    # Spawned workers re-import this module, so carry over the judge URL
+    TEST_URL = test_url
+    _worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+
+
+def _check_shard(proxies: List[Dict], concurrency: int, latency_samples: int) -> Dict[str, List[Dict]]:
+    return _worker_loop.run_until_complete(check_all_proxies(proxies, concurrency, latency_samples))
+
+
+def check_all_proxies_sharded(proxies: Iterable[Dict], workers: Optional[int] = None,
+                              concurrency: int = MAX_CONCURRENCY, latency_samples: int = 0,
+                              shard_size: int = SHARD_SIZE) -> Dict[str, List[Dict]]:
+    """Check proxies across a process pool, one event loop per worker process.
+
+    ``proxies`` is cut into shards of ``shard_size`` that are handed to idle
+    workers, each running up to ``concurrency`` checks. Results are merged
+    into the usual categorized dict. The proxies in it are copies sent back
+    from the workers, not the input dicts.
+    """
+    workers = workers or os.cpu_count() or 1
+    categorized = {
+        "HTTP": [],
+        "SOCKS5": [],
+        "SOCKS4": [],
+        "BAD": []
+    }
+
+    def merge(future):
+        for proxy_type, shard_proxies in future.result().items():
+            categorized[proxy_type].extend(shard_proxies)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_shard_worker,
+                             initargs=(TEST_URL,)) as pool:
+        in_flight = set()
+        source = iter(proxies)
+        while True:
+            shard = list(itertools.islice(source, shard_size))
+            if shard:
+                in_flight.add(pool.submit(_check_shard, shard, concurrency, latency_samples))
+            # Keep about two shards per worker queued so input is read lazily
+            if in_flight and (not shard or len(in_flight) >= workers * 2):
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merge(future)
+            if not shard and not in_flight:
+                break
+
+    return categorized
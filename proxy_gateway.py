@@ -0,0 +1,615 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from python_socks import ProxyError, ProxyTimeoutError, ProxyType
+from python_socks.async_.asyncio import Proxy as SocksProxy
+
+from proxy_tunnel import BUFFER_SIZE, CONNECT_TIMEOUT, HOP_BY_HOP_HEADERS, IO_TIMEOUT, TUNNEL_IDLE_TIMEOUT
+from utils.circuit_breaker import OPEN
+from utils.hedging import HEDGE_METHODS, HedgePolicy, hedge
+from utils.passive_health import EJECT
+from utils.proxy_rotator import EXCLUSIVE_ATTEMPTS, AsyncProxyRotator
+from utils.relay import can_detach, detach_stream, relay_async
+from utils.upstream_pool import PooledConnection, UpstreamPool
+
+CLIENT_IDLE_TIMEOUT = 60  # Seconds a kept-alive client connection may sit between requests
+ACQUIRE_TIMEOUT = 5  # Seconds to wait for the rotator to offer an upstream
+CONNECT_ATTEMPTS = 3  # Upstreams tried for one request before a connect failure reaches the client
+CONNECT_DEADLINE = 20  # Seconds all connect attempts for one request may take together
+MAX_HEAD_BYTES = 64 * 1024  # Longest request or response head accepted
+
+PER_REQUEST = "request"  # Pick a new upstream for every request
+PER_CONNECTION = "connection"  # Keep one upstream for the life of a client connection
+
+PROXY_TYPES = {"SOCKS5": ProxyType.SOCKS5, "SOCKS4": ProxyType.SOCKS4, "HTTP": ProxyType.HTTP}
+SOCKS5_CONNECTION_REFUSED = 5  # Reply code: the proxy reached the target, which refused
+
+CHUNKED = -1  # Body framed with Transfer-Encoding: chunked
+UNTIL_CLOSE = -2  # Body runs until the sender closes the connection
+HEX_DIGITS = b"0123456789abcdefABCDEF"  # The only bytes allowed in a chunk size
+
+Headers = List[Tuple[str, str]]
+
+
+class GatewayError(Exception):
+    """A request the gateway answers itself with ``status`` instead of forwarding it."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class RequestBodyError(GatewayError):
+    """The client's request body is malformed; the upstream is not to blame."""
+
+
+def header(headers: Headers, name: str, default: str = "") -> str:
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return default
+
+
+def parse_head(head: bytes) -> Tuple[List[str], Headers]:
+    """Start line split in three, and the header fields in order."""
+    lines = head.decode("latin-1").split("\r\n")
+    start = lines[0].split(" ", 2)
+    if len(start) < 3:
+        raise GatewayError(400, "Malformed start line")
+    headers = []
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(":")
+        if not sep:
+            raise GatewayError(400, "Malformed header line")
+        headers.append((name.strip(), value.strip()))
+    return start, headers
+
+
+def body_framing(headers: Headers, default: int) -> int:
+    if "chunked" in header(headers, "Transfer-Encoding").lower():
+        return CHUNKED
+    length = header(headers, "Content-Length")
+    if length:
+        # int() would also take signs, underscores and non-ASCII digits
+        if not (length.isascii() and length.isdigit()):
+            raise GatewayError(400, "Bad Content-Length")
+        return int(length)
+    return default
+
+
+def forwarded_headers(headers: Headers, chunked: bool = False) -> Headers:
+    """End-to-end headers of a message; ``chunked`` re-frames its body as chunked."""
+    listed = {token.strip().lower() for token in header(headers, "Connection").split(",")}
+    if chunked:
+        listed.add("content-length")  # Never both (RFC 7230 section 3.3.3)
+    forwarded = [(name, value) for name, value in headers
+                 if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() not in listed]
+    if chunked:
+        forwarded.append(("Transfer-Encoding", "chunked"))
+    return forwarded
+
+
+def encode_head(start: str, headers: Headers) -> bytes:
+    return (start + "\r\n" + "".join(f"{name}: {value}\r\n" for name, value in headers) + "\r\n").encode("latin-1")
+
+
+async def read_head(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """Next message head, or None if the peer closed cleanly before sending one."""
+    try:
+        return await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise
+    except asyncio.LimitOverrunError:
+        raise GatewayError(431, "Message head too large") from None
+
+
+async def copy_body(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, framing: int) -> int:
+    """Stream a body of the given framing from ``reader`` to ``writer``; returns payload bytes."""
+    if framing == CHUNKED:
+        return await _copy_chunked(reader, writer)
+    if framing == UNTIL_CLOSE:
+        total = 0
+        while True:
+            data = await reader.read(BUFFER_SIZE)
+            if not data:
+                return total
+            total += len(data)
+            writer.write(data)
+            await writer.drain()
+    return await _copy_exact(reader, writer, framing)
+
+
+async def _copy_exact(reader, writer, remaining: int) -> int:
+    total = remaining
+    while remaining > 0:
+        data = await reader.read(min(remaining, BUFFER_SIZE))
+        if not data:
+            raise ConnectionResetError("Peer closed mid-body")
+        writer.write(data)
+        remaining -= len(data)
+        await writer.drain()
+    return total
+
+
+async def _copy_chunked(reader, writer) -> int:
+    # Chunks pass through as they are, size lines and trailers included
+    total = 0
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        digits = line.split(b";", 1)[0].strip()
+        if not digits or digits.strip(HEX_DIGITS):
+            raise GatewayError(400, "Bad chunk size")
+        writer.write(line)
+        size = int(digits, 16)
+        if size == 0:
+            while line != b"\r\n":
+                line = await reader.readuntil(b"\r\n")
+                writer.write(line)
+            await writer.drain()
+            return total
+        await _copy_exact(reader, writer, size + 2)
+        total += size
+
+
+async def open_upstream(proxy: Dict, proxy_type: str, host: str, port: int,
+                        timeout: float = CONNECT_TIMEOUT) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Stream pair to ``host:port`` through ``proxy``."""
+    upstream = SocksProxy(PROXY_TYPES[proxy_type], proxy["ip"], int(proxy["port"]),
+                          proxy.get("username"), proxy.get("password"), rdns=True)
+    sock = await upstream.connect(host, port, timeout=timeout)
+    return await asyncio.open_connection(sock=sock, limit=MAX_HEAD_BYTES)
+
+
+def _error_class(error: BaseException) -> str:
+    if isinstance(error, (asyncio.TimeoutError, ProxyTimeoutError)):
+        return "timeout"
+    if isinstance(error, ProxyError):
+        return "connect"
+    return "reset"
+
+
+class _ClientState:
+    """Per client connection: the upstream pinned to it with PER_CONNECTION, and the pooled
+    connections it holds on to between requests."""
+
+    __slots__ = ("proxy", "held")
+
+    def __init__(self):
+        self.proxy: Optional[Dict] = None
+        self.held: Dict[Tuple[str, int], PooledConnection] = {}
+
+
+class ProxyGateway:
+    """Local HTTP forward proxy on asyncio that takes its upstream from an AsyncProxyRotator.
+
+    Each request (``rotate_per="request"``) or client connection
+    (``"connection"``) gets an upstream from ``rotator.acquire``, and its
+    outcome goes back through ``release_proxy``/``report``, so proxies added,
+    rotated out or ejected by the rotator take effect on the next request
+    without restarting the gateway. CONNECT tunnels and plain-HTTP
+    methods are supported; bodies stream in both directions. One task
+    per client connection, no threads.
+
+    When an upstream fails to connect, the failure is reported against
+    it and the request moves to another upstream, up to
+    ``connect_attempts`` of them within ``connect_deadline`` seconds;
+    only then does the client get a 502 or 504.
+
+    Upstream connections come from ``pool`` (an UpstreamPool by default),
+    so a request usually skips the proxy handshake; ``prewarm`` opens
+    them before the first request to a destination.
+
+    With ``hedge`` (a HedgePolicy), a bodiless GET, HEAD or OPTIONS whose
+    upstream hasn't answered within the policy's latency percentile is
+    also sent through a second upstream, within the policy's budget; the
+    first response head wins and the other request is dropped.
+
+    Usage:
+        async with ProxyGateway(rotator, port=8888) as gateway:
+            await gateway.serve_forever()
+    """
+
+    def __init__(self, rotator: AsyncProxyRotator, host: str = "127.0.0.1", port: int = 8888,
+                 proxy_type: str = "SOCKS5", rotate_per: str = PER_REQUEST,
+                 acquire_timeout: float = ACQUIRE_TIMEOUT, pool: Optional[UpstreamPool] = None,
+                 hedge: Optional[HedgePolicy] = None, connect_attempts: int = CONNECT_ATTEMPTS,
+                 connect_deadline: float = CONNECT_DEADLINE):
+        if rotate_per not in (PER_REQUEST, PER_CONNECTION):
+            raise ValueError(f"rotate_per must be '{PER_REQUEST}' or '{PER_CONNECTION}'")
+        self.rotator = rotator
+        self.host = host
+        self.port = port
+        self.proxy_type = proxy_type.upper()
+        self.rotate_per = rotate_per
+        self.acquire_timeout = acquire_timeout
+        self.pool = pool or UpstreamPool(self.dial)
+        self.hedge = hedge
+        self.connect_attempts = connect_attempts
+        self.connect_deadline = connect_deadline
+        self.failovers = 0  # Requests moved to another upstream after a connect failure
+        self.connections = 0  # Client connections open right now
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: set = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port,
+                                                  backlog=1024, limit=MAX_HEAD_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.pool.start()
+        return self
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.pool.close()
+        self._server = None
+
+    async def dial(self, proxy: Dict, host: str, port: int):
+        return await open_upstream(proxy, self.proxy_type, host, port)
+
+    async def prewarm(self, host: str, port: int, per_proxy: int = 1) -> int:
+        """Open ``per_proxy`` idle connections to ``host:port`` through every usable upstream."""
+        proxies = [proxy for proxy in self.rotator.categorized.get(self.proxy_type, [])
+                   if self.rotator.breakers.state(proxy) != OPEN]
+        counts = await asyncio.gather(*[self.pool.prewarm(proxy, host, port, per_proxy) for proxy in proxies])
+        return sum(counts)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    # --- Client connections --------------------------------------------------
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        self.connections += 1
+        state = _ClientState()
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    head = await asyncio.wait_for(read_head(reader), CLIENT_IDLE_TIMEOUT)
+                    if head is None:
+                        break
+                    (method, target, version), headers = parse_head(head)
+                    if method == "CONNECT":
+                        await self._tunnel(state, target, reader, writer)
+                        break
+                    keep_alive = await self._forward(state, method, target, version, headers, reader, writer)
+                except GatewayError as e:
+                    await self._send_error(writer, e.status, str(e))
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        except asyncio.CancelledError:
+            pass  # Cancelled by stop(); end quietly so asyncio doesn't log it
+        finally:
+            for conn in state.held.values():
+                self.pool.release(conn)
+            if state.proxy is not None:
+                self.rotator.release_proxy(state.proxy)
+            writer.close()
+            self.connections -= 1
+            self._tasks.discard(task)
+
+    async def _send_error(self, writer: asyncio.StreamWriter, status: int, message: str):
+        body = message.encode()
+        writer.write(f"HTTP/1.1 {status} {message}\r\nContent-Type: text/plain\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def _upstream(self, state: _ClientState) -> Dict:
+        if state.proxy is not None:
+            return state.proxy
+        proxy = await self.rotator.acquire(None, self.proxy_type, timeout=self.acquire_timeout)
+        if proxy is None:
+            raise GatewayError(503, "No upstream proxy available")
+        if self.rotate_per == PER_CONNECTION:
+            state.proxy = proxy
+        return proxy
+
+    def _done_with(self, state: _ClientState, proxy: Dict, result: Dict):
+        if proxy is state.proxy:
+            verdict = self.rotator.report(proxy, proxy_type=self.proxy_type, **result)
+        else:
+            verdict = self.rotator.release_proxy(proxy, result, proxy_type=self.proxy_type)
+        if "error" in result or verdict == EJECT:
+            self.pool.evict(proxy)  # Its idle connections are as suspect as the one that failed
+
+    async def _connect(self, state: _ClientState, proxy: Dict, host: str, port: int,
+                       fresh: bool = False) -> Tuple[Dict, PooledConnection, float]:
+        """A connection to ``host:port``, through ``proxy`` or, if it fails to connect, another upstream.
+
+        Returns the upstream that worked, the connection and its connect
+        time in ms. Each attempt gets what is left of ``connect_deadline``,
+        at most CONNECT_TIMEOUT.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.connect_deadline
+        tried = set()
+        while True:
+            tried.add(id(proxy))
+            started = time.perf_counter()
+            try:
+                conn = await asyncio.wait_for(self.pool.acquire(proxy, host, port, fresh),
+                                              min(CONNECT_TIMEOUT, deadline - loop.time()))
+                return proxy, conn, (time.perf_counter() - started) * 1000
+            except asyncio.CancelledError:
+                if proxy is not state.proxy:
+                    self.rotator.release_proxy(proxy)
+                raise
+            except (ProxyError, asyncio.TimeoutError, OSError) as e:
+                error = e
+            if (isinstance(error, ProxyError) and self.proxy_type == "SOCKS5" and
+                    error.error_code == SOCKS5_CONNECTION_REFUSED):
+                # The proxy did its job; every other one would get the same answer
+                if proxy is not state.proxy:
+                    self.rotator.release_proxy(proxy)
+                raise GatewayError(502, "Target refused the connection")
+            self._done_with(state, proxy, {"error": _error_class(error)})
+            remaining = deadline - loop.time()
+            if len(tried) >= self.connect_attempts or remaining <= 0:
+                break
+            proxy = await self._failover(state, proxy, tried, remaining)
+            if proxy is None:
+                break
+        raise GatewayError(504 if _error_class(error) == "timeout" else 502, "Upstream connect failed")
+
+    async def _failover(self, state: _ClientState, failed: Dict, tried: set, timeout: float) -> Optional[Dict]:
+        """An upstream this request hasn't tried yet, or None."""
+        for _ in range(EXCLUSIVE_ATTEMPTS):
+            proxy = await self.rotator.acquire(None, self.proxy_type, timeout=min(self.acquire_timeout, timeout))
+            if proxy is None:
+                return None
+            if id(proxy) not in tried:
+                break
+            self.rotator.release_proxy(proxy)
+        else:
+            return None
+        self.failovers += 1
+        if failed is state.proxy:
+            # The client connection moves to the new upstream for good
+            self.rotator.release_proxy(failed)
+            for conn in state.held.values():
+                self.pool.release(conn, False)
+            state.held.clear()
+            state.proxy = proxy
+        return proxy
+
+    # --- CONNECT -------------------------------------------------------------
+
+    async def _tunnel(self, state: _ClientState, target: str, reader, writer):
+        host, _, port = target.rpartition(":")
+        if not host or not port.isdigit():
+            raise GatewayError(400, "CONNECT target must be host:port")
+        proxy = await self._upstream(state)
+        proxy, conn, connect_ms = await self._connect(state, proxy, host.strip("[]"), int(port), fresh=True)
+        writer.write(b"HTTP/1.1 200 Connection Established\r\n\r\n")
+        received = 0
+        try:
+            await writer.drain()
+            received = await _relay(reader, writer, conn.reader, conn.writer)
+        finally:
+            self.pool.release(conn, False)  # A tunnel's connection is never handed out again
+            self._done_with(state, proxy, {"latency_ms": connect_ms, "ok": True, "bytes_received": received})
+
+    # --- Plain HTTP ----------------------------------------------------------
+
+    async def _forward(self, state: _ClientState, method: str, target: str, version: str,
+                       headers: Headers, reader, writer) -> bool:
+        """Forward one request and stream back its response; False when the client connection must close."""
+        url = urlsplit(target)
+        if url.scheme and url.scheme != "http":
+            raise GatewayError(400, "Only http:// targets, use CONNECT for HTTPS")
+        authority = url.netloc.rpartition("@")[2] if url.scheme else header(headers, "Host")
+        path = (url.path or "/") + (f"?{url.query}" if url.query else "") if url.scheme else target
+        try:
+            parsed = urlsplit("//" + authority)
+            host, port = parsed.hostname, parsed.port or 80
+        except ValueError:
+            host = None
+        if not host:
+            raise GatewayError(400, "No target host")
+
+        request_framing = body_framing(headers, 0)
+        client_close = (version != "HTTP/1.1" or "close" in header(headers, "Connection").lower())
+
+        proxy = await self._upstream(state)
+        out_headers = forwarded_headers(headers, chunked=request_framing == CHUNKED)
+        if not header(out_headers, "Host"):
+            out_headers.insert(0, ("Host", authority))
+        request_head = encode_head(f"{method} {path} HTTP/1.1", out_headers)
+
+        if self.hedge is not None and method in HEDGE_METHODS and not request_framing:
+            proxy, conn, status, reason, response_headers, latency_ms = await self._hedged_exchange(
+                state, proxy, host, port, request_head, reader)
+        else:
+            proxy, conn, status, reason, response_headers, latency_ms = await self._exchange(
+                state, proxy, host, port, request_head, request_framing, reader)
+
+        if method == "HEAD" or status in (204, 304):
+            framing = 0
+        else:
+            framing = body_framing(response_headers, UNTIL_CLOSE)
+        keep_upstream = framing != UNTIL_CLOSE and "close" not in header(response_headers, "Connection").lower()
+        keep_client = not client_close and framing != UNTIL_CLOSE
+
+        out_headers = forwarded_headers(response_headers, chunked=framing == CHUNKED)
+        if not keep_client:
+            out_headers.append(("Connection", "close"))
+        received = 0
+        try:
+            writer.write(encode_head(f"HTTP/1.1 {status} {reason}", out_headers))
+            received = await copy_body(conn.reader, writer, framing)
+        except BaseException:
+            keep_upstream = keep_client = False
+            raise
+        finally:
+            conn.requests += 1
+            if keep_upstream and proxy is state.proxy:
+                state.held[(host, port)] = conn  # Same upstream next time; skip the pool round trip
+            else:
+                self.pool.release(conn, keep_upstream)
+            self._done_with(state, proxy, {"latency_ms": latency_ms, "status": status,
+                                           "bytes_received": received})
+        return keep_client
+
+    async def _exchange(self, state: _ClientState, proxy: Dict, host: str, port: int, request_head: bytes,
+                        request_framing: int, reader) -> Tuple[Dict, PooledConnection, int, str, Headers, float]:
+        """Send the request and read the response head; the body is left on the connection.
+
+        Returns the upstream actually used, which differs from ``proxy``
+        after a failover.
+        """
+        conn = state.held.pop((host, port), None) if proxy is state.proxy else None
+        if conn is None:
+            proxy, conn, _ = await self._connect(state, proxy, host, port)
+        try:
+            started = time.perf_counter()
+            try:
+                head = await self._send_request(conn, request_head, request_framing, reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if not conn.requests or request_framing:
+                    raise
+                # A pooled connection the origin had already given up on; the proxy is fine
+                self.pool.release(conn, False)
+                conn = None
+                proxy, conn, _ = await self._connect(state, proxy, host, port, fresh=True)
+                started = time.perf_counter()
+                head = await self._send_request(conn, request_head, request_framing, reader)
+            latency_ms = (time.perf_counter() - started) * 1000
+            (_, status, reason), response_headers = parse_head(head)
+            status = int(status)
+        except (asyncio.CancelledError, RequestBodyError):
+            if conn is not None:
+                self.pool.release(conn, False)  # Mid-request; can't carry another
+                if proxy is not state.proxy:
+                    self.rotator.release_proxy(proxy)
+            raise
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, OSError,
+                GatewayError, ValueError) as e:
+            if conn is None:
+                raise  # From _connect, which already reported it
+            self.pool.release(conn, False)
+            self._done_with(state, proxy, {"error": _error_class(e)})
+            raise GatewayError(504 if _error_class(e) == "timeout" else 502, "Upstream request failed") from None
+        if self.hedge is not None:
+            self.hedge.observe(latency_ms)
+        return proxy, conn, status, reason, response_headers, latency_ms
+
+    async def _hedged_exchange(self, state: _ClientState, proxy: Dict, host: str, port: int,
+                               request_head: bytes, reader) -> Tuple:
+        """``_exchange`` through ``proxy``, raced against a second upstream if it's slow to answer."""
+
+        async def backup():
+            for _ in range(2):
+                upstream = await self.rotator.acquire(None, self.proxy_type)
+                if upstream is None or upstream is not proxy:
+                    break
+                self.rotator.release_proxy(upstream)
+            else:
+                upstream = None
+            if upstream is None:
+                raise GatewayError(503, "No second upstream to hedge with")
+            return await self._exchange(state, upstream, host, port, request_head, 0, reader)
+
+        def discard(result):
+            upstream, conn, status, _, _, latency_ms = result
+            self.pool.release(conn, False)  # Its response is never read
+            self._done_with(state, upstream, {"latency_ms": latency_ms, "status": status})
+
+        delay = self.hedge.delay(self.rotator.health.get(proxy))
+        result, _ = await hedge(lambda: self._exchange(state, proxy, host, port, request_head, 0, reader),
+                                backup, delay, self.hedge, discard)
+        return result
+
+    async def _send_request(self, conn: PooledConnection, request_head: bytes, request_framing: int,
+                            reader: asyncio.StreamReader) -> bytes:
+        """Write the request and its body to ``conn``; returns the final response head."""
+        conn.writer.write(request_head)
+        try:
+            await copy_body(reader, conn.writer, request_framing)
+        except GatewayError as e:
+            raise RequestBodyError(e.status, str(e)) from None
+        head = await asyncio.wait_for(read_head(conn.reader), IO_TIMEOUT)
+        while head is not None and head.startswith(b"HTTP/1.1 1") and not head.startswith(b"HTTP/1.1 101"):
+            head = await asyncio.wait_for(read_head(conn.reader), IO_TIMEOUT)  # Interim 1xx
+        if head is None:
+            raise ConnectionResetError("Upstream closed before responding")
+        return head
+
+
+async def _relay(client_reader, client_writer, upstream_reader, upstream_writer) -> int:
+    """Tunnel bytes both ways; returns the bytes sent to the client.
+
+    Takes the sockets over from the streams for the zero-copy relay in
+    utils/relay.py, or falls back to copying through the streams.
+    """
+    if not (can_detach(client_writer) and can_detach(upstream_writer)):
+        last_activity = [time.monotonic()]
+        _, received = await asyncio.gather(
+            _pipe(client_reader, upstream_writer, last_activity),
+            _pipe(upstream_reader, client_writer, last_activity),
+        )
+        return received
+
+    loop = asyncio.get_running_loop()
+    client, client_early = detach_stream(client_reader, client_writer)
+    upstream, upstream_early = detach_stream(upstream_reader, upstream_writer)
+    try:
+        if client_early:
+            await loop.sock_sendall(upstream, client_early)
+        if upstream_early:
+            await loop.sock_sendall(client, upstream_early)
+        _, received = await relay_async(client, upstream, TUNNEL_IDLE_TIMEOUT)
+        return received + len(upstream_early)
+    except OSError:
+        return len(upstream_early)
+    finally:
+        client.close()
+        upstream.close()
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, last_activity: List[float]) -> int:
+    """Copy until EOF, then pass the half-close on; gives up after TUNNEL_IDLE_TIMEOUT with no traffic either way."""
+    total = 0
+    try:
+        while True:
+            try:
+                data = await asyncio.wait_for(reader.read(BUFFER_SIZE), TUNNEL_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                if time.monotonic() - last_activity[0] < TUNNEL_IDLE_TIMEOUT:
+                    continue  # The other direction is still busy
+                writer.close()
+                return total
+            if not data:
+                break
+            last_activity[0] = time.monotonic()
+            total += len(data)
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError):
+        writer.close()
+    return total
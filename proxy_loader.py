@@ -1,41 +1,120 @@
+import gzip
+import ipaddress
 import os
 import re
+from typing import Iterator, Optional
 
-def load_proxies(file_path):
+from utils.proxy_record import Proxy
+
+_OCTET = r'(?:25[0-5]|2[0-4]\d|[01]?\d?\d)'
+_HOST = (rf'(?:(?P<ipv4>{_OCTET}(?:\.{_OCTET}){{3}})'
+         r'|\[(?P<ipv6>[0-9A-Fa-f:.]+)\]'
+         r'|(?P<host>[A-Za-z0-9.-]+))')
+# host:port[:username:password], where host is IPv4, a hostname or a [bracketed] IPv6 address
+_PLAIN_PATTERN = re.compile(
+    rf'^{_HOST}:(?P<port>\d{{1,5}})(?::(?P<username>[^:\s]+):(?P<password>\S+))?$'
+)
+# scheme://[username[:password]@]host:port[/]
+_URL_PATTERN = re.compile(
+    r'^(?P<scheme>[A-Za-z][A-Za-z0-9]*)://'
+    r'(?:(?P<username>[^:@\s/]+)(?::(?P<password>[^@\s]*))?@)?'
+    rf'{_HOST}:(?P<port>\d{{1,5}})/?$'
+)
+_HOSTNAME_PATTERN = re.compile(r'^(?=.{1,253}$)[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?'
+                               r'(?:\.[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?)*$')
+
+SCHEME_TYPES = {
+    "http": "HTTP",
+    "https": "HTTP",
+    "socks4": "SOCKS4",
+    "socks4a": "SOCKS4",
+    "socks5": "SOCKS5",
+    "socks5h": "SOCKS5",
+}
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _valid_hostname(host: str) -> bool:
+    # Dotted all-numeric strings that didn't match as IPv4 are typos, not hostnames
+    if host.replace('.', '').isdigit():
+        return False
+    return bool(_HOSTNAME_PATTERN.match(host))
+
+
+def parse_proxy_line(line: str) -> Optional[Proxy]:
+    """Parse one proxy entry, or return None if the line isn't a valid proxy."""
+    if "://" in line:
+        match = _URL_PATTERN.match(line)
+    else:
+        match = _PLAIN_PATTERN.match(line)
+    if not match:
+        return None
+
+    ipv4, ipv6, host, port, username, password = match.group(
+        "ipv4", "ipv6", "host", "port", "username", "password")
+    if not 0 < int(port) <= 65535:
+        return None
+
+    if ipv4:
+        host = ipv4
+    elif ipv6:
+        try:
+            host = str(ipaddress.IPv6Address(ipv6))
+        except ValueError:
+            return None
+    elif not _valid_hostname(host):
+        return None
+
+    proxy_entry = Proxy(host, port, username, password or None)
+
+    if "://" in line:
+        proxy_type = SCHEME_TYPES.get(match.group("scheme").lower())
+        if proxy_type is None:
+            return None
+        proxy_entry.type = proxy_type
+    return proxy_entry
+
+
+def _open_text(file_path: str):
+    with open(file_path, 'rb') as f:
+        is_gzip = f.read(2) == GZIP_MAGIC
+    if is_gzip:
+        return gzip.open(file_path, 'rt', encoding='utf-8', errors='replace')
+    return open(file_path, 'r', encoding='utf-8', errors='replace')
+
+
+def iter_proxies(file_path) -> Iterator[Proxy]:
     """
-    Loads a list of proxies from a file.
+    Streams proxies from a file (plain text or gzip) one line at a time.
     Supports formats:
-        - IP:PORT
-        - IP:PORT:USERNAME:PASSWORD
+        - IP:PORT / HOSTNAME:PORT / [IPv6]:PORT
+        - any of the above followed by :USERNAME:PASSWORD
+        - SCHEME://[USERNAME:PASSWORD@]HOST:PORT (http, https, socks4, socks4a, socks5, socks5h)
+    URL-style entries also carry the proxy "type" implied by the scheme.
+    Entries are Proxy records, which can be used like the old proxy dicts.
     """
-    proxies = []
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Proxy file not found: {file_path}")
+    return _iter_proxy_lines(file_path)
+
+
+def _iter_proxy_lines(file_path) -> Iterator[Proxy]:
+    with _open_text(file_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
 
-    with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-
-    for line in lines:
-        line = line.strip()
-        if not line or line.startswith("#"):
-            continue
-
-        # Match formats
-        match = re.match(r'^(\d{1,3}(?:\.\d{1,3}){3}):(\d{2,5})(?::(\w+):(\S+))?$', line)
-        if match:
-            ip = match.group(1)
-            port = match.group(2)
-            username = match.group(3)
-            password = match.group(4)
-
-            proxy_entry = {
-                "ip": ip,
-                "port": port,
-                "username": username,
-                "password": password
-            }
-            proxies.append(proxy_entry)
-        else:
-            print(f"[!] Skipping invalid proxy format: {line}")
-
-    return proxies
+            proxy_entry = parse_proxy_line(line)
+            if proxy_entry:
+                yield proxy_entry
+            else:
+                print(f"[!] Skipping invalid proxy format: {line}")
+
+
+def load_proxies(file_path):
+    """
+    Loads a list of proxies from a file.
+    See iter_proxies for the supported formats; prefer it for very large files.
+    """
+    return list(iter_proxies(file_path))
@@ -1,5 +1,6 @@
 import subprocess
 import os
+from utils.proxy_utils import format_host
 
 def launch_app_with_proxy(proxy, proxy_type="HTTP", app_path=None):
     """
@@ -10,7 +11,7 @@ def launch_app_with_proxy(proxy, proxy_type="HTTP", app_path=None):
         print("[!] Invalid app path.")
         return
 
-    ip = proxy['ip']
+    ip = format_host(proxy['ip'])
     port = proxy['port']
     username = proxy.get('username')
     password = proxy.get('password')
@@ -0,0 +1,82 @@
+import asyncio
+import struct
+from typing import Dict, List, Optional
+
+SNIFF_TIMEOUT = 3
+PROTOCOL_ORDER = ("HTTP", "SOCKS5", "SOCKS4")
+
+
+def classify_reply(data: bytes) -> Optional[str]:
+    """Name the protocol a proxy answered with, judging by the first reply bytes."""
+    if data.startswith(b"HTTP/"):
+        return "HTTP"
+    if len(data) >= 2 and data[0] == 0x05:
+        return "SOCKS5"
+    if len(data) >= 2 and data[0] == 0x00 and 0x5A <= data[1] <= 0x5D:
+        return "SOCKS4"
+    return None
+
+
+def build_probes(proxy: Dict, target_host: str, target_port: int) -> Dict[str, bytes]:
+    """Minimal opening bytes for each protocol, asking the proxy to reach the target."""
+    authority = f"{target_host}:{target_port}"
+    http_probe = f"CONNECT {authority} HTTP/1.1\r\nHost: {authority}\r\n\r\n".encode()
+
+    # SOCKS5 greeting: offer "no auth", plus username/password when we have one
+    methods = b"\x00\x02" if proxy.get("username") and proxy.get("password") else b"\x00"
+    socks5_probe = b"\x05" + bytes([len(methods)]) + methods
+
+    # SOCKS4a CONNECT: IP 0.0.0.1 tells the proxy to resolve the hostname itself
+    userid = (proxy.get("username") or "").encode()
+    socks4_probe = (b"\x04\x01" + struct.pack("!H", target_port) + b"\x00\x00\x00\x01"
+                    + userid + b"\x00" + target_host.encode() + b"\x00")
+
+    return {"HTTP": http_probe, "SOCKS5": socks5_probe, "SOCKS4": socks4_probe}
+
+
+async def _exchange(host: str, port: int, payload: bytes, timeout: float) -> bytes:
+    """Send ``payload`` on a fresh connection and return the first reply bytes.
+
+    Raises OSError/TimeoutError when the TCP connection itself cannot be made.
+    An empty reply means the proxy closed the connection or stayed silent.
+    """
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(payload)
+        await writer.drain()
+        return await asyncio.wait_for(reader.read(16), timeout)
+    except (asyncio.TimeoutError, ConnectionError):
+        return b""
+    finally:
+        writer.close()
+
+
+async def detect_protocol(proxy: Dict, target_host: str, target_port: int,
+                          timeout: float = SNIFF_TIMEOUT) -> List[str]:
+    """Work out which protocol a proxy speaks from its handshake replies.
+
+    Returns the protocols worth a full end-to-end check:
+        []                  - the proxy could not be reached at all
+        [protocol]          - the handshake reply identified the protocol
+        PROTOCOL_ORDER      - it answered, but nothing conclusive
+    Each probe costs one TCP connect and a few bytes, and the first
+    conclusive reply ends the search. A refused connection means nothing
+    is listening; a probe that times out, connecting or waiting for a
+    reply, only moves on to the next one.
+    """
+    probes = build_probes(proxy, target_host, target_port)
+    reached = False
+    for protocol in PROTOCOL_ORDER:
+        try:
+            reply = await _exchange(proxy["ip"], int(proxy["port"]), probes[protocol], timeout)
+        except asyncio.TimeoutError:
+            continue
+        except OSError:
+            if reached:
+                continue
+            return []
+        reached = True
+        detected = classify_reply(reply)
+        if detected:
+            return [detected]
+    return list(PROTOCOL_ORDER) if reached else []
@@ -1,48 +1,366 @@
+import http.client
+import socket
 import socketserver
-from http.server import BaseHTTPRequestHandler
 import threading
+from http.server import BaseHTTPRequestHandler
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
 import socks
-import socket
+
+from utils.circuit_breaker import BreakerBoard
+from utils.relay import relay
+
+CONNECT_TIMEOUT = 10  # Seconds to reach the target through the upstream proxy
+IO_TIMEOUT = 60  # Seconds a single read or write may stall before the connection is dropped
+TUNNEL_IDLE_TIMEOUT = 300  # CONNECT tunnels with no traffic either way for this long are closed
+BUFFER_SIZE = 64 * 1024  # Bytes per read when streaming bodies and tunnels
+HEX_DIGITS = b"0123456789abcdefABCDEF"  # The only bytes allowed in a chunk size
+
+# Per-hop headers (RFC 7230 section 6.1) are not forwarded. Expect is also
+# answered here, since the server already sent the client its 100 Continue.
+HOP_BY_HOP_HEADERS = frozenset((
+    "connection", "keep-alive", "proxy-connection", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade", "expect",
+))
 
 _active_server = None
 _active_thread = None
 _active_proxy = None
 
+
+def open_upstream(upstream_proxy: Tuple, host: str, port: int, timeout: float = IO_TIMEOUT) -> socket.socket:
+    """Connect to ``host:port`` through ``upstream_proxy`` (type, ip, port, username, password)."""
+    proxy_type, ip, proxy_port, username, password = upstream_proxy
+    sock = socks.socksocket()
+    sock.set_proxy(proxy_type, ip, int(proxy_port), True, username, password)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect((host, port))
+    except BaseException:
+        sock.close()
+        raise
+    sock.settimeout(timeout)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+class BadRequest(Exception):
+    """A client request whose body framing can't be parsed; answered with a 400."""
+
+
+class UpstreamConnection(http.client.HTTPConnection):
+    """HTTPConnection to an origin that always dials through the upstream proxy."""
+
+    def __init__(self, host: str, port: int, upstream_proxy: Tuple, timeout: float = IO_TIMEOUT):
+        super().__init__(host, port, timeout=timeout)
+        self.upstream_proxy = upstream_proxy
+
+    def connect(self):
+        self.sock = open_upstream(self.upstream_proxy, self.host, self.port, self.timeout)
+
+
 class ProxyTunnelHandler(BaseHTTPRequestHandler):
+    """Forward proxy: CONNECT tunnels plus every plain-HTTP method, through one upstream proxy.
+
+    Client connections are kept alive, and each one keeps its own
+    upstream connection per origin open between requests. Bodies stream
+    through in BUFFER_SIZE pieces both ways; chunked bodies stay chunked.
+    """
+
+    protocol_version = "HTTP/1.1"  # Keep client connections open between requests
+    timeout = IO_TIMEOUT
     upstream_proxy = None  # Tuple: (type, ip, port, username, password)
+    upstream = None  # The proxy dict behind upstream_proxy, keyed in breakers
+    breakers = BreakerBoard(pool_size=lambda: 1)  # One upstream at a time
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._origins: Dict[Tuple[str, int], UpstreamConnection] = {}
+
+    def finish(self):
+        for origin in self._origins.values():
+            origin.close()
+        self._origins.clear()
+        super().finish()
+
+    def log_request(self, code="-", size="-"):
+        pass  # One line per request would dominate a busy tunnel; errors are still logged
+
+    # --- Upstream ------------------------------------------------------------
+
+    def _dial(self, host: str, port: int) -> Optional[socket.socket]:
+        """Socket to ``host:port`` through the upstream, or None once an error has been sent."""
+        upstream = ProxyTunnelHandler.upstream
+        if ProxyTunnelHandler.upstream_proxy is None:
+            self.send_error(503, "No upstream proxy configured.")
+            return None
+        if not self.breakers.allow(upstream):
+            self.send_error(503, "Upstream proxy circuit open.")
+            return None
+        try:
+            sock = open_upstream(ProxyTunnelHandler.upstream_proxy, host, port)
+        except (socks.ProxyError, OSError) as e:
+            self.breakers.record_failure(upstream)
+            self.send_error(504 if isinstance(e, socket.timeout) else 502, f"Upstream connect failed: {e}")
+            return None
+        except BaseException:
+            self.breakers.release_trial(upstream)
+            raise
+        return sock
+
+    # --- CONNECT -------------------------------------------------------------
 
     def do_CONNECT(self):
-        self.send_error(405, "CONNECT method not allowed in this tunnel.")
+        host, _, port = self.path.rpartition(":")
+        if not host or not port.isdigit():
+            self.send_error(400, "CONNECT target must be host:port.")
+            return
+        sock = self._dial(host.strip("[]"), int(port))
+        if sock is None:
+            return
+        self.breakers.record_success(ProxyTunnelHandler.upstream)
+        self.send_response(200, "Connection Established")
+        self.end_headers()
+        self.close_connection = True  # The connection is a raw tunnel from here on
+        try:
+            self._relay(sock)
+        finally:
+            sock.close()
+
+    def _buffered_input(self) -> bytes:
+        """Bytes the client already sent that sit in rfile's buffer, e.g. an eager TLS hello."""
+        self.connection.setblocking(False)
+        try:
+            pending = self.rfile.peek()
+            return self.rfile.read(len(pending)) if pending else b""
+        finally:
+            self.connection.settimeout(self.timeout)
 
-    def do_GET(self):
+    def _relay(self, upstream: socket.socket):
+        pending = self._buffered_input()
         try:
-            host_header = self.headers.get('Host')
-            if not host_header:
-                self.send_error(400, "No Host header.")
+            if pending:
+                upstream.sendall(pending)
+        except OSError:
+            return
+        relay(self.connection, upstream, TUNNEL_IDLE_TIMEOUT)
+
+    # --- Plain HTTP ----------------------------------------------------------
+
+    def _target(self) -> Optional[Tuple[str, int, str, str]]:
+        """(host, port, request target, Host header) for absolute- or origin-form requests."""
+        url = urlsplit(self.path)
+        if url.scheme:
+            if url.scheme != "http":
+                self.send_error(400, f"Unsupported scheme '{url.scheme}', use CONNECT for HTTPS.")
+                return None
+            authority = url.netloc.rpartition("@")[2]
+            path = url.path or "/"
+            if url.query:
+                path += "?" + url.query
+        else:
+            authority = self.headers.get("Host", "")
+            path = self.path
+        try:
+            parsed = urlsplit("//" + authority)
+            host, port = parsed.hostname, parsed.port or 80
+        except ValueError:
+            host = None
+        if not host:
+            self.send_error(400, "No target host.")
+            return None
+        return host, port, path, self.headers.get("Host", authority)
+
+    def _forwarded_headers(self):
+        listed = {token.strip().lower() for token in self.headers.get("Connection", "").split(",")}
+        for name, value in self.headers.items():
+            lowered = name.lower()
+            if lowered not in HOP_BY_HOP_HEADERS and lowered not in listed and lowered != "host":
+                yield name, value
+
+    def _content_length(self) -> int:
+        value = (self.headers.get("Content-Length") or "0").strip()
+        # int() would also take signs, underscores and non-ASCII digits
+        if not (value.isascii() and value.isdigit()):
+            raise BadRequest("Bad Content-Length")
+        return int(value)
+
+    def _has_body(self) -> bool:
+        return (self._content_length() > 0 or
+                "chunked" in self.headers.get("Transfer-Encoding", "").lower())
+
+    def _send_request(self, origin: UpstreamConnection, path: str, host_header: str):
+        origin.putrequest(self.command, path, skip_host=True, skip_accept_encoding=True)
+        origin.putheader("Host", host_header)
+        chunked = "chunked" in self.headers.get("Transfer-Encoding", "").lower()
+        for name, value in self._forwarded_headers():
+            if chunked and name.lower() == "content-length":
+                continue  # Chunked framing wins (RFC 7230 section 3.3.3); never send both
+            origin.putheader(name, value)
+        if chunked:
+            origin.putheader("Transfer-Encoding", "chunked")
+        origin.endheaders()
+        if chunked:
+            self._copy_chunked_body(origin)
+            return
+        remaining = self._content_length()
+        while remaining > 0:
+            data = self.rfile.read(min(remaining, BUFFER_SIZE))
+            if not data:
+                raise ConnectionError("Client closed mid-body")
+            origin.send(data)
+            remaining -= len(data)
+
+    def _copy_chunked_body(self, origin: UpstreamConnection):
+        while True:
+            line = self.rfile.readline(1024)
+            if not line:
+                raise ConnectionError("Client closed mid-body")
+            digits = line.split(b";", 1)[0].strip()
+            if not digits or digits.strip(HEX_DIGITS):
+                raise BadRequest("Bad chunk size")
+            size = int(digits, 16)
+            if size == 0:
+                # Drop any trailer section, then end the forwarded body
+                while self.rfile.readline(1024) not in (b"\r\n", b"\n", b""):
+                    pass
+                origin.send(b"0\r\n\r\n")
                 return
+            origin.send(b"%X\r\n" % size)
+            while size > 0:
+                data = self.rfile.read(min(size, BUFFER_SIZE))
+                if not data:
+                    raise ConnectionError("Client closed mid-body")
+                origin.send(data)
+                size -= len(data)
+            self.rfile.readline(1024)  # CRLF after the chunk data
+            origin.send(b"\r\n")
 
-            hostname = host_header.split(':')[0]
-            port = 80  # Default for HTTP
+    def _exchange(self, host: str, port: int, path: str, host_header: str) -> Optional[http.client.HTTPResponse]:
+        """Send the request on a kept-alive or new upstream connection and read the response head."""
+        key = (host, port)
+        origin = self._origins.get(key)
+        reused = origin is not None and origin.sock is not None
+        if not reused:
+            sock = self._dial(host, port)
+            if sock is None:
+                return None
+            origin = UpstreamConnection(host, port, ProxyTunnelHandler.upstream_proxy)
+            origin.sock = sock
+            self._origins[key] = origin
+        try:
+            self._send_request(origin, path, host_header)
+            return origin.getresponse()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            origin.close()
+            if reused and not self._has_body():
+                # The origin dropped an idle keep-alive connection; safe to resend once
+                return self._exchange(host, port, path, host_header)
+            raise
 
-            proxy_type, ip, proxy_port, username, password = ProxyTunnelHandler.upstream_proxy
+    def _forward(self):
+        target = self._target()
+        if target is None:
+            return
+        host, port, path, host_header = target
+        try:
+            self._content_length()
+        except BadRequest as e:
+            self.close_connection = True  # No telling where the body ends
+            self.send_error(400, str(e))
+            return
+        try:
+            response = self._exchange(host, port, path, host_header)
+        except BadRequest as e:
+            self._drop_origin(host, port)
+            self.breakers.release_trial(ProxyTunnelHandler.upstream)
+            self.close_connection = True
+            self.send_error(400, str(e))
+            return
+        except (http.client.HTTPException, OSError) as e:
+            self._origins.pop((host, port), None)
+            self.breakers.record_failure(ProxyTunnelHandler.upstream)
+            self.close_connection = True
+            self.send_error(504 if isinstance(e, socket.timeout) else 502, f"Upstream request failed: {e}")
+            return
+        except BaseException:
+            self._drop_origin(host, port)
+            self.breakers.release_trial(ProxyTunnelHandler.upstream)
+            raise
+        if response is None:
+            return
+        self.breakers.record_success(ProxyTunnelHandler.upstream)
+        try:
+            self._send_response(response)
+        except OSError:
+            self.close_connection = True
+        finally:
+            if response.will_close or not response.isclosed():
+                # Unread remainder or no keep-alive: this upstream connection can't be reused
+                response.close()
+                self._origins.pop((host, port)).close()
 
-            sock = socks.socksocket()
-            sock.set_proxy(proxy_type, ip, int(proxy_port), True, username, password)
-            sock.connect((hostname, port))
+    def _drop_origin(self, host: str, port: int):
+        origin = self._origins.pop((host, port), None)
+        if origin is not None:
+            origin.close()
 
-            # Send GET request manually
-            sock.sendall(f"GET {self.path} HTTP/1.1\r\nHost: {host_header}\r\n\r\n".encode())
+    def _send_response(self, response: http.client.HTTPResponse):
+        self.send_response_only(response.status, response.reason)
+        for name, value in response.getheaders():
+            if name.lower() not in HOP_BY_HOP_HEADERS:
+                self.send_header(name, value)
+
+        has_body = not (self.command == "HEAD" or response.status in (204, 304) or 100 <= response.status < 200)
+        if not has_body:
+            self._end_headers()
+            response.read()
+            return
+
+        # Re-frame only when the length is unknown: chunk for 1.1 clients, otherwise close at the end
+        chunked = response.length is None and self.request_version == "HTTP/1.1"
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        elif response.length is None:
+            self.close_connection = True
+        self._end_headers()
+
+        write = self.wfile.write
+        while True:
+            data = response.read1(BUFFER_SIZE)
+            if not data:
+                break
+            if chunked:
+                write(b"%X\r\n%s\r\n" % (len(data), data))
+            else:
+                write(data)
+        if chunked:
+            write(b"0\r\n\r\n")
+
+    def _end_headers(self):
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+
+    do_GET = do_HEAD = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = do_TRACE = _forward
 
-            response = sock.recv(8192)
-            self.send_response(200)
-            self.end_headers()
-            self.wfile.write(response)
-            sock.close()
 
-        except Exception as e:
-            self.send_error(500, f"Proxy tunnel error: {e}")
+class ProxyTunnelServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
 
-def start_proxy_tunnel(proxy, local_port=8888):
+
+def start_proxy_tunnel(proxy, local_port=8888, breakers=None):
+    """Serve a local HTTP proxy on ``local_port`` that forwards through ``proxy``.
+
+    Pass ``breakers`` (e.g. ``rotator.breakers``) to share circuit state
+    with a ProxyRotator; otherwise the tunnel starts a board of its own
+    for this upstream. While the upstream's circuit is open, requests get
+    a 503 instead of waiting on a dead proxy.
+    """
     global _active_server, _active_thread, _active_proxy
 
     proxy_type_map = {"SOCKS5": socks.SOCKS5, "SOCKS4": socks.SOCKS4, "HTTP": socks.HTTP}
@@ -58,15 +376,26 @@ def start_proxy_tunnel(proxy, local_port=8888):
     # Shut down old server if running
     if _active_server:
         print("[~] Stopping previous tunnel...")
-        _active_server.shutdown()
-        _active_thread.join()
+        stop_proxy_tunnel()
 
     ProxyTunnelHandler.upstream_proxy = new_proxy
+    ProxyTunnelHandler.upstream = proxy
+    ProxyTunnelHandler.breakers = breakers if breakers is not None else BreakerBoard(pool_size=lambda: 1)
     _active_proxy = new_proxy
 
-    _active_server = socketserver.ThreadingTCPServer(("localhost", local_port), ProxyTunnelHandler)
+    _active_server = ProxyTunnelServer(("localhost", local_port), ProxyTunnelHandler)
     _active_thread = threading.Thread(target=_active_server.serve_forever)
     _active_thread.daemon = True
     _active_thread.start()
 
     print(f"[+] Proxy tunnel running at http://127.0.0.1:{local_port} through {proxy['ip']}:{proxy['port']}")
+
+
+def stop_proxy_tunnel():
+    global _active_server, _active_thread, _active_proxy
+    if _active_server is None:
+        return
+    _active_server.shutdown()
+    _active_server.server_close()
+    _active_thread.join()
+    _active_server = _active_thread = _active_proxy = None
@@ -0,0 +1,31 @@
+import asyncio
+
+from utils import ip_info
+from utils.abuse_reputation import AbuseBlocklist
+
+
+def test_verdict_uses_min_score(tmp_path):
+    blocklist = AbuseBlocklist(str(tmp_path / "blacklist.txt"), min_score=50)
+    blocklist.save({"10.0.0.1": 90, "10.0.0.2": 40})
+
+    assert blocklist.verdict("10.0.0.1")[:2] == (True, 90)
+    assert blocklist.verdict("10.0.0.2")[:2] == (False, 40)
+    assert blocklist.verdict("10.0.0.3")[:2] == (False, 0)
+
+
+def test_missing_snapshot_is_read_once_per_refresh(tmp_path, monkeypatch):
+    path = tmp_path / "blacklist.txt"
+    blocklist = AbuseBlocklist(str(path))
+    reads = []
+    load = blocklist.load
+    monkeypatch.setattr(blocklist, "load", lambda: reads.append(1) or load())
+    monkeypatch.setattr(ip_info, "ABUSEIPDB_API_KEY", "")
+
+    for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+        assert blocklist.verdict(ip) == (False, 0, "Blacklist snapshot not available")
+    assert len(reads) == 1
+
+    path.write_text("10.0.0.1 100\n")
+    asyncio.run(blocklist.ensure_fresh(None))
+    assert len(reads) == 2
+    assert blocklist.verdict("10.0.0.1")[:2] == (True, 100)
@@ -0,0 +1,61 @@
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, BreakerBoard
+
+
+def _proxies(count):
+    return [{"ip": "10.0.0.%d" % i, "port": "1080"} for i in range(count)]
+
+
+def test_opens_after_consecutive_failures():
+    proxy, = _proxies(1)
+    board = BreakerBoard(failure_threshold=3)
+    assert board.record_failure(proxy) == CLOSED
+    board.record_success(proxy)
+    for _ in range(2):
+        assert board.record_failure(proxy) == CLOSED
+    assert board.record_failure(proxy) == OPEN
+    assert not board.allow(proxy)
+    assert board.ejected == 1
+
+
+def test_half_open_trials_close_the_circuit():
+    proxy, = _proxies(1)
+    board = BreakerBoard(cooldown=10, success_threshold=2)
+    board.trip(proxy, now=100)
+    assert not board.allow(proxy, now=105)
+    assert board.due_for_trial(now=111) == [proxy]
+    assert board.state(proxy) == HALF_OPEN
+
+    assert board.allow(proxy, now=111)
+    assert not board.allow(proxy, now=111)  # One trial at a time
+    assert board.record_success(proxy) == HALF_OPEN
+    assert board.allow(proxy, now=112)
+    assert board.record_success(proxy) == CLOSED
+    assert board.ejected == 0
+
+
+def test_failed_trial_doubles_the_cooldown():
+    proxy, = _proxies(1)
+    board = BreakerBoard(cooldown=10)
+    board.trip(proxy, now=100)
+    assert board.allow(proxy, now=111)
+    assert board.record_failure(proxy, now=111) == OPEN
+    assert not board.allow(proxy, now=125)
+    assert board.allow(proxy, now=132)
+
+
+def test_release_trial_frees_the_slot():
+    proxy, = _proxies(1)
+    board = BreakerBoard(cooldown=10)
+    board.trip(proxy, now=100)
+    assert board.allow(proxy, now=111)
+    board.release_trial(proxy)
+    assert board.allow(proxy, now=111)
+    assert board.state(proxy) == HALF_OPEN
+
+
+def test_ejection_cap():
+    proxies = _proxies(4)
+    board = BreakerBoard(max_ejection_percent=50, pool_size=lambda: len(proxies))
+    assert [board.trip(proxy) for proxy in proxies] == [OPEN, OPEN, CLOSED, CLOSED]
+    board.forget(proxies[0])
+    assert board.trip(proxies[2]) == OPEN
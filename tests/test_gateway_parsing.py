@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from proxy_gateway import (CHUNKED, UNTIL_CLOSE, GatewayError, body_framing, copy_body, forwarded_headers,
+                           parse_head)
+
+
+def test_parse_head():
+    start, headers = parse_head(b"GET http://example.com/ HTTP/1.1\r\nHost: example.com\r\n"
+                                b"X-Thing:  spaced \r\n\r\n")
+    assert start == ["GET", "http://example.com/", "HTTP/1.1"]
+    assert headers == [("Host", "example.com"), ("X-Thing", "spaced")]
+
+
+def test_parse_head_keeps_the_reason_phrase_whole():
+    start, _ = parse_head(b"HTTP/1.1 404 Not Found\r\n\r\n")
+    assert start == ["HTTP/1.1", "404", "Not Found"]
+
+
+@pytest.mark.parametrize("head", [b"GET /\r\n\r\n", b"GET / HTTP/1.1\r\nno colon here\r\n\r\n"])
+def test_parse_head_rejects_malformed_heads(head):
+    with pytest.raises(GatewayError) as error:
+        parse_head(head)
+    assert error.value.status == 400
+
+
+def test_body_framing():
+    assert body_framing([("Transfer-Encoding", "gzip, Chunked")], 0) == CHUNKED
+    assert body_framing([("content-length", "42")], 0) == 42
+    assert body_framing([], 0) == 0
+    assert body_framing([], UNTIL_CLOSE) == UNTIL_CLOSE
+    with pytest.raises(GatewayError) as error:
+        body_framing([("Content-Length", "forty-two")], 0)
+    assert error.value.status == 400
+
+
+@pytest.mark.parametrize("length", ["-1", "-2", "+5", "1_0", "0x10", "\u0665"])
+def test_body_framing_rejects_anything_but_digits(length):
+    with pytest.raises(GatewayError) as error:
+        body_framing([("Content-Length", length)], 0)
+    assert error.value.status == 400
+
+
+def test_forwarded_headers_drop_hop_by_hop_fields():
+    headers = [("Host", "example.com"), ("Connection", "keep-alive, X-Secret"),
+               ("Proxy-Authorization", "Basic abc"), ("X-Secret", "1"), ("Accept", "*/*")]
+    assert forwarded_headers(headers) == [("Host", "example.com"), ("Accept", "*/*")]
+
+
+def test_forwarded_headers_never_send_content_length_with_chunked():
+    headers = [("Host", "example.com"), ("Content-Length", "3"), ("Transfer-Encoding", "chunked")]
+    assert forwarded_headers(headers, chunked=True) == [("Host", "example.com"),
+                                                         ("Transfer-Encoding", "chunked")]
+
+
+class _Sink:
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+
+def _copy_chunked(body: bytes):
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(body)
+        reader.feed_eof()
+        sink = _Sink()
+        return await copy_body(reader, sink, CHUNKED), sink.data
+    return asyncio.run(main())
+
+
+def test_copy_chunked_body():
+    body = b"5;ext=1\r\nhello\r\nA\r\n0123456789\r\n0\r\nX-Trailer: 1\r\n\r\n"
+    assert _copy_chunked(body) == (15, body)
+
+
+@pytest.mark.parametrize("size", [b"-5", b"+5", b"5_0", b"0x5", b"", b"zz"])
+def test_copy_chunked_rejects_bad_sizes(size):
+    with pytest.raises(GatewayError) as error:
+        _copy_chunked(size + b"\r\nhello\r\n0\r\n\r\n")
+    assert error.value.status == 400
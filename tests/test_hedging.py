@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from utils.hedging import HedgeBudget, HedgePolicy, hedge
+from utils.passive_health import ProxyHealth
+
+
+def test_budget_earns_a_fraction_per_request():
+    budget = HedgeBudget(ratio=0.5, burst=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == 1  # Never more than the burst
+    assert (budget.requests, budget.hedges) == (12, 2)
+
+
+def test_delay_follows_the_latency_percentile():
+    policy = HedgePolicy(percentile=0.9, min_delay_ms=20, default_delay_ms=1000, min_samples=5)
+    assert policy.delay() == 1.0
+    for latency in range(1, 101):
+        policy.observe(latency)
+    assert policy.delay() == pytest.approx(0.091)
+
+    health = ProxyHealth()
+    health.latencies.extend([500] * 5)
+    assert policy.delay(health) == pytest.approx(0.5)
+    health.latencies.clear()
+    health.latencies.extend([5] * 5)
+    assert policy.delay(health) == pytest.approx(0.02)  # min_delay_ms
+
+
+async def _after(delay, value):
+    await asyncio.sleep(delay)
+    if isinstance(value, Exception):
+        raise value
+    return value
+
+
+def test_fast_primary_never_hedges():
+    policy = HedgePolicy()
+    result = asyncio.run(hedge(lambda: _after(0, "primary"), lambda: _after(0, "backup"), 0.5, policy))
+    assert result == ("primary", False)
+    assert policy.budget.hedges == 0
+
+
+def test_backup_wins_over_a_slow_primary():
+    policy = HedgePolicy()
+    result = asyncio.run(hedge(lambda: _after(1, "primary"), lambda: _after(0, "backup"), 0.01, policy))
+    assert result == ("backup", True)
+    assert policy.to_dict()["wins"] == 1
+
+
+def test_backup_wins_when_the_primary_fails_late():
+    policy = HedgePolicy()
+    result = asyncio.run(hedge(lambda: _after(0.05, ValueError("primary")),
+                               lambda: _after(0.1, "backup"), 0.01, policy))
+    assert result == ("backup", True)
+
+
+def test_primary_error_is_raised_when_both_fail():
+    policy = HedgePolicy()
+    with pytest.raises(ValueError, match="primary"):
+        asyncio.run(hedge(lambda: _after(0.05, ValueError("primary")),
+                          lambda: _after(0.02, KeyError("backup")), 0.01, policy))
+
+
+def test_no_hedge_without_budget():
+    policy = HedgePolicy(budget_ratio=0, burst=0)
+    started = []
+
+    async def backup():
+        started.append(True)
+        return "backup"
+
+    result = asyncio.run(hedge(lambda: _after(0.05, "primary"), backup, 0.01, policy))
+    assert result == ("primary", False)
+    assert not started
+
+
+def test_finished_loser_is_discarded():
+    policy = HedgePolicy()
+    discarded = []
+    result = asyncio.run(hedge(lambda: _after(0.02, 1), lambda: _after(0.02, 2), 0, policy, discarded.append))
+    assert result[0] in (1, 2)
+    assert discarded in ([], [3 - result[0]])
@@ -0,0 +1,68 @@
+import json
+import time
+
+from utils.ip_cache import IPInfoCache
+
+LOCATION = {"country": "Testland", "country_code": "TT", "city": "Testville"}
+
+
+def test_geo_and_abuse_expire_separately(tmp_path, monkeypatch):
+    cache = IPInfoCache(str(tmp_path / "cache.json"), geo_ttl=100, abuse_ttl=10)
+    cache.set_geo("1.2.3.4", LOCATION)
+    cache.set_abuse("1.2.3.4", (True, 90, "reported"))
+    assert cache.get_geo("1.2.3.4") == LOCATION
+    assert cache.get_abuse("1.2.3.4") == (True, 90, "reported")
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 50)
+    assert cache.get_geo("1.2.3.4") == LOCATION
+    assert cache.get_abuse("1.2.3.4") is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = IPInfoCache(str(tmp_path / "cache.json"), max_entries=2)
+    cache.set_geo("10.0.0.1", LOCATION)
+    cache.set_geo("10.0.0.2", LOCATION)
+    assert cache.get_geo("10.0.0.1") == LOCATION  # Now the most recent
+    cache.set_geo("10.0.0.3", LOCATION)
+    assert cache.get_geo("10.0.0.2") is None
+    assert cache.get_geo("10.0.0.1") == LOCATION
+    assert cache.get_geo("10.0.0.3") == LOCATION
+
+
+def test_round_trip_through_the_file(tmp_path):
+    path = str(tmp_path / "data" / "cache.json")
+    cache = IPInfoCache(path)
+    cache.set_geo("1.2.3.4", LOCATION)
+    cache.save()
+
+    reloaded = IPInfoCache(path)
+    assert reloaded._entries is None  # Nothing read until first use
+    assert reloaded.get_geo("1.2.3.4") == LOCATION
+
+
+def test_save_merges_with_other_processes(tmp_path):
+    path = str(tmp_path / "cache.json")
+    first, second = IPInfoCache(path), IPInfoCache(path)
+    first.load()
+    second.load()
+    first.set_geo("10.0.0.1", LOCATION)
+    second.set_abuse("10.0.0.2", (False, 0, "clean"))
+    first.save()
+    second.save()
+
+    merged = IPInfoCache(path)
+    assert merged.get_geo("10.0.0.1") == LOCATION
+    assert merged.get_abuse("10.0.0.2") == (False, 0, "clean")
+
+
+def test_unreadable_or_empty_records_are_ignored(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text(json.dumps({"10.0.0.1": {}, "10.0.0.2": "junk",
+                                "10.0.0.3": {"geo": [time.time(), LOCATION]}}))
+    cache = IPInfoCache(str(path))
+    cache.load()
+    assert list(cache._entries) == ["10.0.0.3"]
+
+    path.write_text("{not json")
+    assert IPInfoCache(str(path)).get_geo("10.0.0.3") is None
@@ -0,0 +1,63 @@
+import asyncio
+
+from utils.ip_enricher import enrich_results
+
+
+class _FakeEnricher:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+        self.closed = False
+
+    async def lookup_many(self, ips):
+        self.batches.append(list(ips))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("backend down")
+        return {ip: {"country": "Testland", "country_code": "TT", "abuse_score": 7} for ip in ips}
+
+    async def close(self):
+        self.closed = True
+
+
+async def _results(count, bad_every=0):
+    for i in range(count):
+        yield {"proxy": {"ip": "10.0.0.%d" % i}, "type": None if bad_every and i % bad_every == 0 else "HTTP"}
+
+
+def _collect(results, enricher, **kwargs):
+    async def main():
+        return [result async for result in enrich_results(results, enricher, **kwargs)]
+    return asyncio.run(main())
+
+
+def test_working_proxies_get_ip_info_in_batches():
+    enricher = _FakeEnricher()
+    results = _collect(_results(25, bad_every=5), enricher, batch_size=8, flush_interval=0.01)
+    assert len(results) == 25
+    for result in results:
+        if result["type"]:
+            assert result["proxy"]["country_code"] == "TT" and result["proxy"]["abuse_score"] == 7
+        else:
+            assert "country" not in result["proxy"]  # BAD results are never looked up
+    assert sum(len(batch) for batch in enricher.batches) == 20
+    assert all(len(batch) <= 8 for batch in enricher.batches)
+    assert not enricher.closed  # Passed in, so the caller closes it
+
+
+def test_slow_lookups_do_not_hold_back_bad_results():
+    async def main():
+        arrivals = []
+        async for result in enrich_results(_results(6, bad_every=2), _FakeEnricher(delay=0.5),
+                                           flush_interval=0.01):
+            arrivals.append(result["type"])
+        return arrivals
+
+    assert asyncio.run(main()) == [None, None, None, "HTTP", "HTTP", "HTTP"]
+
+
+def test_failed_lookups_fall_back_to_defaults():
+    results = _collect(_results(3), _FakeEnricher(fail=True), flush_interval=0.01)
+    assert [result["proxy"]["country"] for result in results] == ["Unknown"] * 3
+    assert all(result["proxy"]["is_abused"] is False for result in results)
@@ -0,0 +1,64 @@
+import pytest
+
+from utils.passive_health import EJECT, OK, THROTTLE, HealthTracker, is_failure
+
+PROXY = {"ip": "10.0.0.1", "port": "1080"}
+
+
+@pytest.mark.parametrize("outcome, failed", [
+    ({"status": 200}, False), ({"status": 404}, False), ({"status": 407}, True), ({"status": 502}, True),
+    ({"error": "timeout"}, True), ({"status": 503, "ok": True}, False), ({"status": 200, "ok": False}, True),
+])
+def test_what_counts_as_a_failure(outcome, failed):
+    assert is_failure(**outcome) is failed
+
+
+def test_latency_and_throughput_are_decayed_averages():
+    tracker = HealthTracker(alpha=0.5)
+    tracker.record(PROXY, latency_ms=100, status=200, bytes_received=1000)
+    tracker.record(PROXY, latency_ms=300, status=200, bytes_received=1000)
+    tracker.record(PROXY, latency_ms=5000, error="timeout")  # Failed requests don't skew latency
+    health = tracker.get(PROXY)
+    assert health.latency_ms == 200
+    assert health.bytes_per_sec == pytest.approx((10000 + 3333.33) / 2, rel=1e-3)
+    assert health.success_rate == 0.5
+    assert health.last_error == "timeout"
+    assert health.effective_latency() == 400
+
+
+def test_percentiles_cover_the_recent_window():
+    tracker = HealthTracker(window=10)
+    for latency in range(1, 21):
+        tracker.record(PROXY, latency_ms=latency, status=200)
+    health = tracker.get(PROXY)
+    assert health.percentile(0.5) == 16 and health.percentile(0.9) == 20
+    assert health.to_dict()["p90_ms"] == 20
+
+
+def test_consecutive_failures_eject_at_once():
+    tracker = HealthTracker(eject_consecutive_failures=3)
+    # Success rate 0.8, then 0.64 (below the throttle line), then the third failure in a row
+    assert [tracker.record(PROXY, error="connect") for _ in range(3)] == [OK, THROTTLE, EJECT]
+    # Back on probation: one more failure doesn't eject it, a bad spell does
+    assert tracker.get(PROXY).consecutive_failures == 0
+    assert tracker.record(PROXY, error="connect") != EJECT
+
+
+def test_low_success_rate_ejects_after_enough_requests():
+    tracker = HealthTracker(alpha=0.3, min_requests=5, eject_consecutive_failures=100)
+    verdicts = []
+    for _ in range(4):
+        verdicts.append(tracker.record(PROXY, status=200))
+        verdicts.append(tracker.record(PROXY, status=502))
+        verdicts.append(tracker.record(PROXY, status=502))
+    assert verdicts[:2] == [OK, THROTTLE]
+    assert EJECT not in verdicts[:4] and EJECT in verdicts  # Not before min_requests
+
+
+def test_steady_proxy_stays_ok():
+    tracker = HealthTracker()
+    verdicts = {tracker.record(PROXY, latency_ms=150, status=200) for _ in range(100)}
+    verdicts.add(tracker.record(PROXY, status=404))  # The site's answer, not the proxy's fault
+    assert verdicts == {OK}
+    tracker.forget(PROXY)
+    assert tracker.get(PROXY) is None
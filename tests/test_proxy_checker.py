@@ -0,0 +1,138 @@
+import asyncio
+import threading
+
+import pytest
+
+import proxy_checker
+from proxy_checker import (categorize_result, check_all_proxies_sharded, check_single_proxy, iter_checked_proxies,
+                           iter_revalidated_proxies)
+from utils.ip_cache import ip_cache
+from utils.proxy_db import ProxyHealthDB
+from utils.proxy_farm import ProxyFarm
+
+DEAD = {"ip": "127.0.0.1", "port": "1", "expected_type": None}  # Nothing listens on port 1
+
+
+def test_single_proxy_protocols(monkeypatch):
+    async def main():
+        async with ProxyFarm({"HTTP": 1, "SOCKS5": 1, "SOCKS4": 1}) as farm:
+            monkeypatch.setattr(proxy_checker, "TEST_URL", farm.judge_url)
+            return [(proxy["expected_type"], await check_single_proxy(dict(proxy)))
+                    for proxy in farm.proxies]
+
+    for expected, result in asyncio.run(main()):
+        assert result["type"] == expected
+        assert result["speed"] is not None and result["speed"] >= 0
+        assert result["connect_ms"] is not None
+
+
+def test_check_run_classifies_the_farm(monkeypatch):
+    async def main():
+        categorized = {"HTTP": [], "SOCKS5": [], "SOCKS4": [], "BAD": []}
+        async with ProxyFarm({"HTTP": 3, "SOCKS5": 3, "SOCKS4": 3}, seed=1) as farm:
+            monkeypatch.setattr(proxy_checker, "TEST_URL", farm.judge_url)
+            proxies = [dict(proxy) for proxy in farm.proxies] + [dict(DEAD)]
+            async for result in iter_checked_proxies(proxies, concurrency=4, enrich=False):
+                categorize_result(categorized, result)
+        return categorized
+
+    categorized = asyncio.run(main())
+    for bucket, proxies in categorized.items():
+        assert len(proxies) == (1 if bucket == "BAD" else 3)
+        assert all(proxy["expected_type"] == (None if bucket == "BAD" else bucket) for proxy in proxies)
+
+
+def test_revalidation_answers_fresh_proxies_from_the_db(monkeypatch):
+    async def run(proxies, db):
+        return [result async for result in iter_revalidated_proxies(proxies, db, concurrency=4, enrich=False)]
+
+    async def main():
+        async with ProxyFarm({"HTTP": 2, "SOCKS5": 2}) as farm:
+            monkeypatch.setattr(proxy_checker, "TEST_URL", farm.judge_url)
+            with ProxyHealthDB(":memory:") as db:
+                first = await run([dict(proxy) for proxy in farm.proxies] + [dict(DEAD)], db)
+                second = await run([dict(proxy) for proxy in farm.proxies] + [dict(DEAD)], db)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert not any(result.get("cached") for result in first)
+    assert all(result.get("cached") for result in second)
+    assert sorted(str(result["type"]) for result in second) == ["HTTP", "HTTP", "None", "SOCKS5", "SOCKS5"]
+
+
+def test_source_errors_reach_the_caller(monkeypatch):
+    def broken_source(farm):
+        yield dict(farm.proxies[0])
+        raise OSError("corrupt gzip stream")
+
+    async def main():
+        results = []
+        async with ProxyFarm({"HTTP": 1}) as farm:
+            monkeypatch.setattr(proxy_checker, "TEST_URL", farm.judge_url)
+            with pytest.raises(OSError, match="corrupt"):
+                async for result in iter_checked_proxies(broken_source(farm), concurrency=4, enrich=False):
+                    results.append(result)
+        return results
+
+    results = asyncio.run(asyncio.wait_for(main(), 10))
+    assert [result["type"] for result in results] == ["HTTP"]
+
+
+def test_revalidation_streams_the_source(monkeypatch):
+    monkeypatch.setattr(proxy_checker, "LOOKUP_BATCH", 2)
+    pulled = []
+
+    def source():
+        for port in range(1000, 1010):
+            pulled.append(port)
+            yield {"ip": "10.0.0.1", "port": str(port)}
+
+    async def main():
+        with ProxyHealthDB(":memory:") as db:
+            for port in range(1000, 1010):
+                db.record({"proxy": {"ip": "10.0.0.1", "port": str(port)}, "type": "HTTP", "speed": 1.0})
+            results = iter_revalidated_proxies(source(), db, concurrency=1, enrich=False)
+            first = await results.__anext__()
+            pulled_at_first = len(pulled)
+            rest = [result async for result in results]
+        return first, pulled_at_first, rest
+
+    first, pulled_at_first, rest = asyncio.run(main())
+    assert first["cached"] and first["proxy"]["port"] == "1000"
+    assert pulled_at_first <= 2 * 2  # A batch or two read ahead, not the whole source
+    assert len(rest) == 9
+
+
+def test_revalidation_records_live_results(monkeypatch):
+    async def main():
+        async with ProxyFarm({"SOCKS5": 3}) as farm:
+            monkeypatch.setattr(proxy_checker, "TEST_URL", farm.judge_url)
+            with ProxyHealthDB(":memory:") as db:
+                results = [result async for result in
+                           iter_revalidated_proxies((dict(p) for p in farm.proxies), db, enrich=False)]
+                return results, db.count(), [db.history(proxy)["uptime"] for proxy in farm.proxies]
+
+    results, count, uptimes = asyncio.run(main())
+    assert [result["type"] for result in results] == ["SOCKS5"] * 3
+    assert count == 3 and uptimes == [1.0, 1.0, 1.0]
+
+
+def test_sharded_check_merges_worker_results(monkeypatch, tmp_path):
+    monkeypatch.setattr(ip_cache, "path", str(tmp_path / "ip_cache.json"))
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    farm = asyncio.run_coroutine_threadsafe(ProxyFarm({"HTTP": 3, "SOCKS5": 3}, seed=2).start(), loop).result()
+    try:
+        monkeypatch.setattr(proxy_checker, "TEST_URL", farm.judge_url)
+        proxies = (dict(proxy) for proxy in farm.proxies + [DEAD])  # A generator, read shard by shard
+        categorized = check_all_proxies_sharded(proxies, workers=2, concurrency=4, shard_size=2)
+    finally:
+        asyncio.run_coroutine_threadsafe(farm.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    assert {bucket: len(proxies) for bucket, proxies in categorized.items()} == {
+        "HTTP": 3, "SOCKS5": 3, "SOCKS4": 0, "BAD": 1}
+    for bucket in ("HTTP", "SOCKS5"):
+        assert all(proxy["expected_type"] == bucket and "country" in proxy for proxy in categorized[bucket])
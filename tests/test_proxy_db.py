@@ -0,0 +1,46 @@
+import sqlite3
+
+from utils.proxy_db import ProxyHealthDB
+
+
+def _proxy(username=None, password=None):
+    return {"ip": "10.0.0.1", "port": "1080", "username": username, "password": password}
+
+
+def test_logins_on_one_endpoint_are_kept_apart():
+    with ProxyHealthDB(":memory:") as db:
+        db.record({"proxy": _proxy("alice", "right"), "type": "SOCKS5", "speed": 120.0})
+        db.record({"proxy": _proxy("alice", "wrong"), "type": None})
+
+        good, bad, unknown = db.cached_results([_proxy("alice", "right"), _proxy("alice", "wrong"), _proxy()])
+        assert (good["type"], good["speed"]) == ("SOCKS5", 120.0)
+        assert bad["type"] is None and bad["cached"]
+        assert unknown is None
+        assert db.cached_result(_proxy("alice", "right"))["type"] == "SOCKS5"
+        assert db.history(_proxy("alice", "wrong"))["failure_streak"] == 1
+        assert db.count() == 2
+
+
+def test_tables_keyed_by_endpoint_only_are_migrated(tmp_path):
+    path = str(tmp_path / "health.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE proxies (
+            ip TEXT NOT NULL, port INTEGER NOT NULL, username TEXT, password TEXT, type TEXT,
+            speed REAL, connect_ms REAL, ttfb_ms REAL, total_ms REAL, country TEXT, country_code TEXT,
+            city TEXT, is_abused INTEGER, abuse_score INTEGER, samples TEXT NOT NULL DEFAULT '[]',
+            first_seen REAL NOT NULL, last_checked REAL, last_alive REAL,
+            failure_streak INTEGER NOT NULL DEFAULT 0, checks INTEGER NOT NULL DEFAULT 0,
+            successes INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (ip, port)
+        ) WITHOUT ROWID;
+        CREATE INDEX proxies_last_checked ON proxies (last_checked);
+        INSERT INTO proxies (ip, port, username, password, type, speed, first_seen, last_checked, checks, successes)
+        VALUES ('10.0.0.1', 1080, 'alice', 'right', 'SOCKS5', 99.0, strftime('%s'), strftime('%s'), 1, 1);
+    """)
+    conn.close()
+
+    with ProxyHealthDB(path) as db:
+        assert db.cached_result(_proxy("alice", "right"))["speed"] == 99.0
+        assert db.cached_result(_proxy("alice", "other")) is None
+        db.record({"proxy": _proxy("alice", "other"), "type": "SOCKS5", "speed": 50.0})
+        assert db.count() == 2
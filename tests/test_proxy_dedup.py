@@ -0,0 +1,48 @@
+from utils.proxy_dedup import ProxyIndex, endpoint_key, normalize_host
+
+
+def test_normalize_host():
+    assert normalize_host("010.001.002.003") == "10.1.2.3"
+    assert normalize_host("[2001:DB8:0:0::1]") == "2001:db8::1"
+    assert normalize_host("Proxy.Example.COM.") == "proxy.example.com"
+    assert normalize_host("1.2.3.256") is None
+
+
+def test_endpoint_keys_are_packed():
+    assert len(endpoint_key("1.2.3.4", 80)) == 7
+    assert len(endpoint_key("2001:db8::1", 80)) == 19
+    assert endpoint_key("1.2.3.4", 80) != endpoint_key("1.2.3.4", 81)
+
+
+def test_first_occurrence_passes_through_unchanged():
+    first = {"ip": "1.2.3.4", "port": "80", "source": "a.txt"}
+    second = {"ip": "001.002.003.004", "port": " 80", "source": "b.txt"}
+    index = ProxyIndex()
+
+    assert list(index.dedup([first, second])) == [first]
+    assert first["source"] == "a.txt"
+    assert "alt_credentials" not in first
+    assert index.dropped == 1
+    assert len(index) == 1
+
+
+def test_other_credentials_are_a_separate_candidate():
+    index = ProxyIndex()
+    proxies = [
+        {"ip": "1.2.3.4", "port": "80"},
+        {"ip": "1.2.3.4", "port": "80", "username": "user", "password": "one"},
+        {"ip": "1.2.3.4", "port": "80", "username": "user", "password": "two"},
+        {"ip": "1.2.3.4", "port": "80", "username": "user", "password": "one"},
+    ]
+
+    assert list(index.dedup(proxies)) == proxies[:3]
+    assert index.dropped == 1
+    assert {"ip": "1.2.3.4", "port": 80, "username": "user", "password": "two"} in index
+
+
+def test_invalid_entries_are_counted():
+    index = ProxyIndex()
+    assert not index.add({"ip": "1.2.3.4", "port": "99999"})
+    assert not index.add({"ip": "1.2.3.4", "port": "http"})
+    assert index.invalid == 2
+    assert len(index) == 0
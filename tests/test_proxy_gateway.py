@@ -0,0 +1,148 @@
+import asyncio
+import socket
+import time
+
+from proxy_gateway import ProxyGateway, open_upstream
+from utils.hedging import HedgePolicy
+from utils.proxy_farm import ProxyFarm, server_port
+from utils.proxy_record import Proxy
+from utils.proxy_rotator import AsyncProxyRotator
+from utils.upstream_pool import UpstreamPool
+
+
+async def _handle_origin(reader, writer):
+    """Keep-alive origin: "/slow" answers after 300 ms, anything else at once."""
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            if head.split(b" ", 2)[1].endswith(b"/slow"):
+                await asyncio.sleep(0.3)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _get(port: int, url: str, requests: int = 1):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    statuses = []
+    try:
+        for _ in range(requests):
+            writer.write(f"GET {url} HTTP/1.1\r\nHost: origin\r\n\r\n".encode())
+            head = await reader.readuntil(b"\r\n\r\n")
+            statuses.append(int(head.split(b" ", 2)[1]))
+            length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+            await reader.readexactly(length)
+    finally:
+        writer.close()
+    return statuses
+
+
+def _upstreams(farm):
+    return [Proxy(proxy["ip"], proxy["port"], type="SOCKS5") for proxy in farm.proxies]
+
+
+def test_pool_reuses_connections():
+    async def main():
+        async with ProxyFarm({"SOCKS5": 1}) as farm:
+            origin = await asyncio.start_server(_handle_origin, "127.0.0.1", 0)
+            proxy = farm.proxies[0]
+            pool = UpstreamPool(lambda proxy, host, port: open_upstream(proxy, "SOCKS5", host, port),
+                                refill=False)
+            first = await pool.acquire(proxy, "127.0.0.1", server_port(origin))
+            pool.release(first)
+            second = await pool.acquire(proxy, "127.0.0.1", server_port(origin))
+            fresh = await pool.acquire(proxy, "127.0.0.1", server_port(origin), fresh=True)
+            pool.release(second)
+            pool.release(fresh)
+            evicted = pool.evict(proxy)
+            stats = (second is first, fresh is not first, pool.hits, pool.misses, evicted, len(pool))
+            await pool.close()
+            origin.close()
+            return stats
+
+    assert asyncio.run(main()) == (True, True, 1, 2, 2, 0)
+
+
+def test_failover_hides_dead_upstreams():
+    async def main():
+        async with ProxyFarm({"SOCKS5": 2}) as farm:
+            origin = await asyncio.start_server(_handle_origin, "127.0.0.1", 0)
+            url = f"http://127.0.0.1:{server_port(origin)}/"
+            dead = [Proxy("127.0.0.1", 1, type="SOCKS5"), Proxy("127.0.0.1", 2, type="SOCKS5")]
+            rotator = AsyncProxyRotator({"SOCKS5": _upstreams(farm) + dead})
+            async with ProxyGateway(rotator, port=0) as gateway:
+                statuses = await asyncio.gather(*[_get(gateway.port, url, 5) for _ in range(8)])
+                failovers = gateway.failovers
+            origin.close()
+            return statuses, failovers, rotator._in_flight
+
+    statuses, failovers, in_flight = asyncio.run(main())
+    assert all(status == 200 for client in statuses for status in client)
+    assert failovers > 0
+    assert in_flight == {}
+
+
+def test_connect_deadline():
+    black_hole = socket.socket()  # Accepts connections and never answers
+    black_hole.bind(("127.0.0.1", 0))
+    black_hole.listen(16)
+
+    async def main():
+        upstreams = [Proxy("127.0.0.1", black_hole.getsockname()[1], type="SOCKS5"),
+                     Proxy("127.0.0.1", 1, type="SOCKS5")]
+        rotator = AsyncProxyRotator({"SOCKS5": upstreams})
+        async with ProxyGateway(rotator, port=0, connect_deadline=0.5) as gateway:
+            start = time.monotonic()
+            statuses = await _get(gateway.port, "http://127.0.0.1:9/")
+            return statuses, time.monotonic() - start
+
+    try:
+        statuses, elapsed = asyncio.run(main())
+    finally:
+        black_hole.close()
+    assert statuses[0] in (502, 504)
+    assert elapsed < 2
+
+
+def test_hedging_sends_a_backup_and_releases_both():
+    async def main():
+        async with ProxyFarm({"SOCKS5": 3}) as farm:
+            origin = await asyncio.start_server(_handle_origin, "127.0.0.1", 0)
+            url = f"http://127.0.0.1:{server_port(origin)}"
+            policy = HedgePolicy(budget_ratio=1, burst=10, default_delay_ms=50)
+            rotator = AsyncProxyRotator({"SOCKS5": _upstreams(farm)})
+            async with ProxyGateway(rotator, port=0, hedge=policy) as gateway:
+                statuses = await _get(gateway.port, f"{url}/slow", 3)
+                statuses += await _get(gateway.port, f"{url}/fast", 3)
+                await asyncio.sleep(0.05)
+                stats = policy.to_dict(), rotator._in_flight, dict(gateway.pool._in_use)
+            origin.close()
+            return statuses, stats
+
+    statuses, (hedging, in_flight, in_use) = asyncio.run(main())
+    assert statuses == [200] * 6
+    assert hedging["requests"] == 6
+    # The first "/slow" request outlives the 50 ms default delay; later ones
+    # are measured against the latencies seen so far
+    assert 1 <= hedging["hedges"] <= 3
+    assert in_flight == {} and in_use == {}
+
+
+def test_bad_chunk_size_gets_400_without_blaming_the_upstream():
+    async def main():
+        async with ProxyFarm({"SOCKS5": 1}) as farm:
+            origin = await asyncio.start_server(_handle_origin, "127.0.0.1", 0)
+            rotator = AsyncProxyRotator({"SOCKS5": _upstreams(farm)})
+            async with ProxyGateway(rotator, port=0) as gateway:
+                reader, writer = await asyncio.open_connection("127.0.0.1", gateway.port)
+                writer.write(f"POST http://127.0.0.1:{server_port(origin)}/ HTTP/1.1\r\nHost: origin\r\n"
+                             "Transfer-Encoding: chunked\r\n\r\n-5\r\nhello\r\n0\r\n\r\n".encode())
+                head = await reader.readuntil(b"\r\n\r\n")
+                writer.close()
+            origin.close()
+            return int(head.split(b" ", 2)[1]), rotator.breakers.ejected, dict(rotator._in_flight)
+
+    assert asyncio.run(main()) == (400, 0, {})
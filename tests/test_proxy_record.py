@@ -0,0 +1,62 @@
+import pickle
+
+from utils.proxy_record import Proxy, ProxyColumns
+
+
+def test_copy_is_equal_and_independent():
+    proxy = Proxy("1.2.3.4", "80", speed=5, type="HTTP", expected_type="HTTP")
+    copy = proxy.copy()
+
+    assert copy == proxy
+    assert copy is not proxy
+
+    copy["speed"] = 9
+    copy["expected_type"] = "SOCKS5"
+    del copy["type"]
+    assert proxy["speed"] == 5
+    assert proxy["expected_type"] == "HTTP"
+    assert proxy["type"] == "HTTP"
+
+
+def test_equality_compares_every_field():
+    assert Proxy("1.2.3.4", "80", speed=1) != Proxy("1.2.3.4", "80", speed=2)
+    assert Proxy("1.2.3.4", "80", speed=1) == Proxy("1.2.3.4", 80, speed=1)
+    assert Proxy("1.2.3.4", "80", speed=1).key() == Proxy("1.2.3.4", "80", speed=2).key()
+
+
+def test_equality_with_dicts():
+    proxy = Proxy("1.2.3.4", "80", speed=1)
+    assert proxy == {"ip": "1.2.3.4", "port": "80", "username": None, "password": None, "speed": 1}
+    assert proxy != {"ip": "1.2.3.4", "port": "80", "username": None, "password": None, "speed": 2}
+    assert proxy != ("1.2.3.4", "80")
+
+
+def test_dict_interface():
+    proxy = Proxy.from_dict({"ip": "1.2.3.4", "port": 80, "speed": 12.5, "source": "list.txt"})
+
+    assert proxy["port"] == "80"
+    assert proxy.get("country") is None
+    assert "country" not in proxy
+    assert "source" in proxy
+    assert dict(proxy)["source"] == "list.txt"
+    assert proxy.pop("source") == "list.txt"
+    assert proxy.pop("source", "gone") == "gone"
+    proxy.update({"country": "NL"}, city="Amsterdam")
+    assert proxy.setdefault("country", "DE") == "NL"
+    assert proxy["city"] == "Amsterdam"
+
+
+def test_pickle_round_trip():
+    proxy = Proxy("::1", "1080", type="SOCKS5", expected_type="SOCKS5")
+    assert pickle.loads(pickle.dumps(proxy)) == proxy
+
+
+def test_columns_round_trip():
+    columns = ProxyColumns()
+    columns.extend([{"ip": "1.2.3.4", "port": "80", "speed": 120.0, "type": "HTTP"},
+                    {"ip": "2001:db8::1", "port": "1080", "type": "SOCKS5"}])
+
+    assert len(columns) == 2
+    first, second = list(columns)
+    assert (first["ip"], first["port"], first["speed"], first["type"]) == ("1.2.3.4", "80", 120.0, "HTTP")
+    assert (second["ip"], second["type"], second.get("speed")) == ("2001:db8::1", "SOCKS5", None)
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+
+from utils.circuit_breaker import OPEN
+from utils.proxy_rotator import AsyncProxyRotator, ProxyRotator
+
+
+def _ejected_rotator(cooldown):
+    proxy = {"ip": "10.0.0.1", "port": "1080"}
+    rotator = AsyncProxyRotator({"SOCKS5": [proxy]})
+    rotator.breakers.cooldown = cooldown
+    while rotator.breakers.state(proxy) != OPEN:
+        rotator.report(proxy, error="connect", proxy_type="SOCKS5")
+    return rotator, proxy
+
+
+def test_async_acquire_wakes_when_cooldown_ends():
+    rotator, proxy = _ejected_rotator(cooldown=0.2)
+
+    async def run():
+        started = time.monotonic()
+        picked = await rotator.acquire(timeout=5)
+        return picked, time.monotonic() - started
+
+    picked, waited = asyncio.run(run())
+    assert picked is proxy
+    assert waited < 2
+
+
+def test_async_acquire_times_out_while_ejected():
+    rotator, _ = _ejected_rotator(cooldown=60)
+
+    async def run():
+        return await rotator.acquire(timeout=0.1)
+
+    assert asyncio.run(run()) is None
+
+
+def test_acquire_never_hands_out_a_refused_proxy():
+    proxy = {"ip": "10.0.0.1", "port": "1080"}
+    rotator = ProxyRotator({"SOCKS5": [proxy]})
+    rotator.breakers.trip(proxy, now=time.time() - 3600)  # Cool-down long over
+
+    assert rotator.acquire() is proxy  # Takes the one trial slot
+    assert rotator.acquire() is None
+    rotator.report(proxy, latency_ms=100, status=200, proxy_type="SOCKS5")
+    assert rotator.acquire() is proxy
+
+
+def _pool(count):
+    return [{"ip": "10.0.0.%d" % i, "port": "1080", "speed": 200} for i in range(count)]
+
+
+def test_sessions_stick_until_used_up():
+    rotator = ProxyRotator({"SOCKS5": _pool(5)}, max_uses=3)
+    first = [rotator.acquire("a") for _ in range(3)]
+    assert first[0] is first[1] is first[2]
+    assert rotator.acquire("a") is not first[0]  # Fourth use rotates, never to the same proxy
+
+
+def test_sessions_rotate_on_timer_slowness_and_request(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    rotator = ProxyRotator({"SOCKS5": _pool(5)}, interval_seconds=60, speed_threshold_ms=3000)
+
+    proxy = rotator.acquire("a")
+    now[0] += 59
+    assert rotator.acquire("a") is proxy
+    now[0] += 1
+    proxy, previous = rotator.acquire("a"), proxy
+    assert proxy is not previous
+
+    assert rotator.acquire("a", current_speed=2000) is proxy
+    proxy, previous = rotator.acquire("a", current_speed=5000), proxy
+    assert proxy is not previous
+
+    rotator.rotate("a")
+    assert rotator.acquire("a") is not proxy
+
+
+def test_exclusive_sessions_spread_over_the_pool():
+    proxies = _pool(4)
+    rotator = ProxyRotator({"SOCKS5": proxies}, strategy="lru")
+    held = [rotator.acquire(session, exclusive=True) for session in range(4)]
+    assert {id(proxy) for proxy in held} == {id(proxy) for proxy in proxies}
+    assert rotator.active_sessions() == 4
+
+    rotator.end_session(0)
+    assert rotator.active_sessions() == 3
+    assert rotator.acquire("new", exclusive=True) is held[0]  # The only one nobody holds
+
+
+def test_idle_sessions_are_pruned():
+    rotator = ProxyRotator({"SOCKS5": _pool(3)}, session_idle_timeout=30)
+    rotator.acquire("old")
+    rotator.acquire("busy")
+    rotator._sessions["old"].last_used -= 60
+    assert rotator.prune_sessions() == 1
+    assert rotator.session_proxy("old") is None and rotator.session_proxy("busy") is not None
+
+
+def test_ejected_proxy_moves_its_sessions():
+    rotator = ProxyRotator({"SOCKS5": _pool(4)})
+    proxy = rotator.acquire("a")
+    while rotator.breakers.state(proxy) != OPEN:
+        rotator.report(proxy, error="connect", proxy_type="SOCKS5")
+    assert rotator.acquire("a") is not proxy
+    assert all(rotator.acquire() is not proxy for _ in range(50))
+
+
+def test_concurrent_sessions_keep_their_own_proxy():
+    rotator = ProxyRotator({"SOCKS5": _pool(20)}, max_uses=10 ** 6, interval_seconds=10 ** 6)
+    mismatches = []
+
+    def run(session):
+        mine = rotator.acquire(session)
+        for _ in range(500):
+            if rotator.acquire(session) is not mine:
+                mismatches.append(session)
+
+    threads = [threading.Thread(target=run, args=(session,)) for session in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not mismatches
+    assert rotator.active_sessions() == 16
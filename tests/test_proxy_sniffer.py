@@ -0,0 +1,35 @@
+import asyncio
+import socket
+import time
+
+from proxy_sniffer import PROTOCOL_ORDER, detect_protocol
+from utils.proxy_farm import ProxyFarm
+
+
+def test_handshake_identifies_the_protocol():
+    async def main():
+        async with ProxyFarm({"HTTP": 1, "SOCKS5": 1, "SOCKS4": 1}) as farm:
+            return [(proxy["expected_type"], await detect_protocol(proxy, "127.0.0.1", 80, 1))
+                    for proxy in farm.proxies]
+
+    for expected, detected in asyncio.run(main()):
+        assert detected == [expected]
+
+
+def test_unreachable_proxy():
+    assert asyncio.run(detect_protocol({"ip": "127.0.0.1", "port": "1"}, "127.0.0.1", 80, 1)) == []
+
+
+def test_silent_proxy_gets_every_protocol():
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(8)
+    proxy = {"ip": "127.0.0.1", "port": str(listener.getsockname()[1])}
+    try:
+        start = time.monotonic()
+        detected = asyncio.run(detect_protocol(proxy, "127.0.0.1", 80, 0.2))
+        elapsed = time.monotonic() - start
+    finally:
+        listener.close()
+    assert detected == list(PROTOCOL_ORDER)
+    assert elapsed < 0.2 * len(PROTOCOL_ORDER) + 0.5
@@ -0,0 +1,163 @@
+import asyncio
+import http.client
+import socket
+import threading
+
+import proxy_tunnel
+from utils.proxy_farm import ProxyFarm, server_port
+
+
+async def _handle_echo(reader, writer):
+    """Origin answering each request with its head and raw body as received."""
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lowered = head.lower()
+            if b"transfer-encoding: chunked" in lowered:
+                body = await reader.readuntil(b"0\r\n\r\n")  # Enough for the small bodies sent here
+            elif b"content-length:" in lowered:
+                body = await reader.readexactly(int(lowered.split(b"content-length:")[1].split(b"\r\n")[0]))
+            else:
+                body = b""
+            echoed = head + body
+            if head.split(b" ", 2)[1].endswith(b"/chunked"):
+                writer.write(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+                             b"%X\r\n%s\r\n0\r\n\r\n" % (len(echoed), echoed))
+            else:
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(echoed), echoed))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+class _Tunnel:
+    """proxy_tunnel on a free port, forwarding through a fake SOCKS5 proxy to the echo origin."""
+
+    def __enter__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.farm = self._run(ProxyFarm({"SOCKS5": 1}).start())
+        self.origin = self._run(asyncio.start_server(_handle_echo, "127.0.0.1", 0))
+        self.authority = "127.0.0.1:%d" % server_port(self.origin)
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            self.port = probe.getsockname()[1]
+        proxy_tunnel.start_proxy_tunnel(dict(self.farm.proxies[0], type="SOCKS5"), self.port)
+        return self
+
+    def __exit__(self, *exc):
+        proxy_tunnel.stop_proxy_tunnel()
+        self.origin.close()
+        self._run(self.farm.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def send(self, head: str, body: bytes = b"") -> bytes:
+        """Send one raw request (absolute-form, to the echo origin) and return the raw response."""
+        request = head.format(origin=self.authority).replace("\n", "\r\n").encode() + b"\r\n" + body
+        with socket.create_connection(("127.0.0.1", self.port), timeout=5) as sock:
+            sock.sendall(request)
+            sock.shutdown(socket.SHUT_WR)
+            response = b""
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    return response
+                response += data
+
+
+def _status(response: bytes) -> int:
+    return int(response.split(b" ", 2)[1])
+
+
+def test_chunked_request_drops_content_length():
+    with _Tunnel() as tunnel:
+        response = tunnel.send(
+            "POST http://{origin}/upload HTTP/1.1\nHost: {origin}\nContent-Length: 3\n"
+            "Transfer-Encoding: chunked\nConnection: close\n",
+            b"5\r\nhello\r\n0\r\n\r\n")
+    assert _status(response) == 200
+    echoed = response.split(b"\r\n\r\n", 1)[1].lower()
+    assert b"content-length" not in echoed
+    assert echoed.count(b"transfer-encoding: chunked") == 1
+    assert echoed.endswith(b"5\r\nhello\r\n0\r\n\r\n")
+
+
+def test_bad_framing_gets_400():
+    with _Tunnel() as tunnel:
+        for length in ("-1", "+3", "1_0", "abc"):
+            response = tunnel.send(
+                "POST http://{origin}/ HTTP/1.1\nHost: {origin}\nContent-Length: %s\n" % length, b"abc")
+            assert _status(response) == 400, length
+        for size in (b"-5", b"+5", b"5_0", b"0x5", b"zz"):
+            response = tunnel.send(
+                "POST http://{origin}/ HTTP/1.1\nHost: {origin}\nTransfer-Encoding: chunked\n",
+                size + b"\r\nhello\r\n0\r\n\r\n")
+            assert _status(response) == 400, size
+
+
+def test_keep_alive_requests_with_bodies():
+    with _Tunnel() as tunnel:
+        conn = http.client.HTTPConnection("127.0.0.1", tunnel.port, timeout=5)
+        conn.request("POST", "http://%s/form" % tunnel.authority, body=b"a=1",
+                     headers={"Proxy-Authorization": "Basic abc", "Connection": "keep-alive, X-Hop", "X-Hop": "1"})
+        echoed = conn.getresponse().read()
+        conn.request("GET", "http://%s/chunked" % tunnel.authority)
+        response = conn.getresponse()
+        chunked_echo = response.read()
+        conn.close()
+
+    assert echoed.startswith(b"POST /form HTTP/1.1\r\n") and echoed.endswith(b"\r\n\r\na=1")
+    assert b"content-length: 3" in echoed.lower()
+    for hop in (b"proxy-authorization", b"x-hop", b"connection"):
+        assert hop not in echoed.lower()
+    assert response.getheader("Transfer-Encoding") == "chunked"
+    assert chunked_echo.startswith(b"GET /chunked HTTP/1.1\r\n")
+
+
+def test_chunked_response_to_an_http_10_client_is_close_delimited():
+    with _Tunnel() as tunnel:
+        response = tunnel.send("GET http://{origin}/chunked HTTP/1.0\n")
+    head, body = response.split(b"\r\n\r\n", 1)
+    assert b"transfer-encoding" not in head.lower()
+    assert body.startswith(b"GET /chunked HTTP/1.1\r\n")
+
+
+def test_head_response_has_no_body():
+    with _Tunnel() as tunnel:
+        conn = http.client.HTTPConnection("127.0.0.1", tunnel.port, timeout=5)
+        conn.request("HEAD", "http://%s/" % tunnel.authority)
+        response = conn.getresponse()
+        assert response.read() == b""
+        conn.request("GET", "http://%s/after-head" % tunnel.authority)
+        assert conn.getresponse().read().startswith(b"GET /after-head ")  # Framing kept in step
+        conn.close()
+
+
+def test_connect_tunnel_relays_bytes():
+    with _Tunnel() as tunnel:
+        with socket.create_connection(("127.0.0.1", tunnel.port), timeout=5) as sock:
+            sock.sendall(("CONNECT %s HTTP/1.1\r\nHost: %s\r\n\r\n" % (tunnel.authority, tunnel.authority)).encode())
+            reply = b""
+            while b"\r\n\r\n" not in reply:
+                reply += sock.recv(65536)
+            assert _status(reply) == 200
+            request = b"GET /inside HTTP/1.1\r\nHost: x\r\n\r\n"
+            sock.sendall(request)
+            inner = reply.split(b"\r\n\r\n", 1)[1]
+            while not inner.endswith(request):  # The echo origin keeps the connection open
+                inner += sock.recv(65536)
+    assert _status(inner) == 200
+    assert b"GET /inside HTTP/1.1" in inner
+
+
+def test_unreachable_target_gets_502():
+    with _Tunnel() as tunnel:
+        response = tunnel.send("GET http://127.0.0.1:1/ HTTP/1.1\nHost: 127.0.0.1:1\n")
+    assert _status(response) == 502
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+from utils.rate_limiter import TokenBucket
+
+
+def test_burst_then_refill():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert 0 < bucket.delay() <= 0.1
+
+
+def test_acquire_waits_for_a_token():
+    async def main():
+        bucket = TokenBucket(rate=20, capacity=1)
+        start = time.monotonic()
+        assert await bucket.acquire()
+        assert await bucket.acquire()
+        return time.monotonic() - start
+
+    assert 0.03 <= asyncio.run(main()) < 1
+
+
+def test_acquire_gives_up_past_max_wait():
+    async def main():
+        bucket = TokenBucket(rate=5, capacity=5)
+        bucket.update_from_headers({"X-RateLimit-Remaining": "0",
+                                    "X-RateLimit-Reset": str(time.time() + 3600)})
+        start = time.monotonic()
+        acquired = await bucket.acquire(max_wait=0.5)
+        return acquired, time.monotonic() - start, bucket.tokens
+
+    acquired, elapsed, tokens = asyncio.run(main())
+    assert not acquired
+    assert elapsed < 0.1
+    assert tokens == 0
+
+
+def test_retry_after_pauses_the_bucket():
+    bucket = TokenBucket(rate=100, capacity=100)
+    bucket.update_from_headers({"Retry-After": "30"})
+    assert not bucket.try_acquire()
+    assert 29 < bucket.delay() <= 30
+    bucket.update_from_headers({"Retry-After": "soon"})  # Ignored
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import socket
+import threading
+
+import pytest
+
+from utils.relay import SPLICE_AVAILABLE, relay, relay_async
+
+SPLICE_MODES = [False] + ([True] if SPLICE_AVAILABLE else [])
+
+
+def _recv_all(sock: socket.socket) -> bytes:
+    data = b""
+    while True:
+        piece = sock.recv(65536)
+        if not piece:
+            return data
+        data += piece
+
+
+def _round_trip(run_relay, a, b, client, server):
+    client.settimeout(10)  # Fail instead of hanging if the relay dies
+    server.settimeout(10)
+    payload = os.urandom(3 * 1024 * 1024)
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(totals=run_relay(a, b)))
+    thread.start()
+    receiver = threading.Thread(target=lambda: result.update(received=_recv_all(server)))
+    receiver.start()
+    client.sendall(payload)
+    client.shutdown(socket.SHUT_WR)
+    receiver.join(10)
+    assert result["received"] == payload
+    server.sendall(b"reply")
+    server.shutdown(socket.SHUT_WR)
+    assert _recv_all(client) == b"reply"
+    thread.join(10)
+    return result["totals"], len(payload)
+
+
+@pytest.mark.parametrize("use_splice", SPLICE_MODES)
+def test_relay_round_trip(use_splice):
+    client, a = socket.socketpair()
+    b, server = socket.socketpair()
+    with client, a, b, server:
+        totals, sent = _round_trip(lambda a, b: relay(a, b, 5, use_splice=use_splice), a, b, client, server)
+    assert totals == (sent, 5)
+
+
+@pytest.mark.parametrize("use_splice", SPLICE_MODES)
+def test_relay_async_round_trip(use_splice):
+    client, a = socket.socketpair()
+    b, server = socket.socketpair()
+    with client, a, b, server:
+        totals, sent = _round_trip(lambda a, b: asyncio.run(relay_async(a, b, 5, use_splice=use_splice)),
+                                   a, b, client, server)
+    assert totals == (sent, 5)
+
+
+def test_relay_gives_up_when_idle():
+    client, a = socket.socketpair()
+    b, server = socket.socketpair()
+    with client, a, b, server:
+        a.settimeout(7)
+        assert relay(a, b, 0.2) == (0, 0)
+        assert a.gettimeout() == 7  # Blocking mode restored
+
+
+def test_relay_handles_descriptors_above_fd_setsize():
+    resource = pytest.importorskip("resource")
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    high = 2000
+    if hard != resource.RLIM_INFINITY and hard <= high + 1:
+        pytest.skip("descriptor limit too low")
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, high + 2), hard))
+    try:
+        client, low_a = socket.socketpair()
+        os.dup2(low_a.fileno(), high)
+        low_a.close()
+        a = socket.socket(fileno=high)
+        b, server = socket.socketpair()
+        with client, a, b, server:
+            totals, sent = _round_trip(lambda a, b: relay(a, b, 5, use_splice=False), a, b, client, server)
+        assert totals == (sent, 5)
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+
+import proxy_checker
+from utils import revalidator
+from utils.proxy_db import ProxyHealthDB
+from utils.proxy_farm import ProxyFarm
+from utils.revalidator import RevalidationScheduler
+
+
+def test_adds_from_another_thread_are_never_lost():
+    scheduler = RevalidationScheduler()
+    proxies = [{"ip": "10.0.0.1", "port": str(port)} for port in range(1, 5001)]
+    popped = []
+
+    def add_all():
+        for proxy in proxies:
+            scheduler.add(proxy, due=0.0)
+
+    adder = threading.Thread(target=add_all)
+    adder.start()
+    while adder.is_alive() or scheduler.next_due() is not None:
+        entry = scheduler._pop_due(now=1.0)
+        if entry is not None:
+            popped.append(entry.proxy)
+    adder.join()
+
+    assert len(popped) == len(proxies)
+    assert {id(proxy) for proxy in popped} == {id(proxy) for proxy in proxies}
+
+
+def _entry(scheduler, proxy, ewma_ms=None, jitter_ms=0.0, failures=0):
+    scheduler.add(proxy)
+    entry = scheduler._entries[id(proxy)]
+    entry.ewma_ms, entry.jitter_ms, entry.failures = ewma_ms, jitter_ms, failures
+    return entry
+
+
+def test_intervals_follow_speed_stability_and_failures(monkeypatch):
+    monkeypatch.setattr(revalidator.random, "uniform", lambda low, high: 1.0)
+    scheduler = RevalidationScheduler()
+
+    def interval(**history):
+        return scheduler.interval_for(_entry(scheduler, {"ip": "10.0.0.1", "port": "1"}, **history))
+
+    assert interval() == revalidator.MIN_INTERVAL  # No history yet
+    fast, slow = interval(ewma_ms=200), interval(ewma_ms=3000)
+    assert revalidator.MIN_INTERVAL <= fast < revalidator.BASE_INTERVAL < slow <= revalidator.MAX_INTERVAL
+    assert interval(ewma_ms=1000, jitter_ms=500) > interval(ewma_ms=1000)
+
+    backoff = [interval(failures=failures) for failures in (1, 2, 3)]
+    assert backoff == [revalidator.DEAD_BASE_INTERVAL * 2 ** n for n in range(3)]
+    assert interval(failures=40) == revalidator.MAX_BACKOFF
+
+
+def test_fresh_results_wait_a_full_interval():
+    working = {"ip": "10.0.0.1", "port": "1", "speed": 500}
+    bad = {"ip": "10.0.0.2", "port": "1"}
+    scheduler = RevalidationScheduler({"HTTP": [working], "BAD": [bad]})
+
+    assert scheduler._pop_due(time.time()) is not None and scheduler._pop_due(time.time()) is None
+    assert scheduler.next_due() >= time.time() + revalidator.MIN_INTERVAL * 0.9
+
+
+def test_removed_proxies_are_never_popped():
+    scheduler = RevalidationScheduler()
+    kept, removed = {"ip": "10.0.0.1", "port": "1"}, {"ip": "10.0.0.2", "port": "1"}
+    scheduler.add(removed)
+    scheduler.add(kept)
+    scheduler.remove(removed)
+    assert len(scheduler) == 1
+    assert scheduler._pop_due(time.time()).proxy is kept
+    assert scheduler._pop_due(time.time()) is None
+
+
+def test_results_move_proxies_between_buckets():
+    proxy = {"ip": "10.0.0.1", "port": "1"}
+    categorized = {"HTTP": [], "SOCKS5": [], "SOCKS4": [], "BAD": [proxy]}
+    seen = []
+    scheduler = RevalidationScheduler(categorized, on_result=seen.append)
+    entry = scheduler._entries[id(proxy)]
+
+    scheduler._apply(entry, {"proxy": proxy, "type": "SOCKS5", "speed": 300, "total_ms": 300})
+    assert categorized["BAD"] == [] and categorized["SOCKS5"] == [proxy]
+    assert proxy["speed"] == 300 and entry.failures == 0
+
+    scheduler._apply(entry, {"proxy": proxy, "type": None})
+    assert categorized["SOCKS5"] == [] and categorized["BAD"] == [proxy]
+    assert entry.failures == 1 and len(seen) == 2
+
+
+def test_run_revalidates_against_live_proxies(monkeypatch):
+    async def main():
+        async with ProxyFarm({"HTTP": 2, "SOCKS5": 2}) as farm:
+            monkeypatch.setattr(proxy_checker, "TEST_URL", farm.judge_url)
+            categorized = {"HTTP": [], "SOCKS5": [], "SOCKS4": [],
+                           "BAD": [dict(proxy) for proxy in farm.proxies]}
+            with ProxyHealthDB(":memory:") as db:
+                scheduler = RevalidationScheduler(categorized, db=db, max_rate=100)
+                task = asyncio.create_task(scheduler.run())
+                while scheduler.checks < len(farm.proxies):
+                    await asyncio.sleep(0.05)
+                scheduler.stop()
+                await task
+                recorded = [db.lookup(proxy) for proxy in farm.proxies]
+            return categorized, recorded
+
+    categorized, recorded = asyncio.run(main())
+    assert [len(categorized[bucket]) for bucket in ("HTTP", "SOCKS5", "BAD")] == [2, 2, 0]
+    assert all(proxy["expected_type"] == bucket for bucket in ("HTTP", "SOCKS5") for proxy in categorized[bucket])
+    assert all(record is not None for record in recorded)
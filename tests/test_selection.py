@@ -0,0 +1,94 @@
+import random
+from collections import Counter
+
+import pytest
+
+from utils.selection import (STRATEGIES, EWMAStrategy, LRUStrategy, PowerOfTwoStrategy, WeightedLatencyStrategy,
+                             make_strategy)
+
+
+def _proxies(*speeds):
+    return [{"ip": "10.0.0.%d" % i, "port": "1080", "speed": speed} for i, speed in enumerate(speeds)]
+
+
+@pytest.mark.parametrize("name", sorted(STRATEGIES))
+def test_pool_changes_while_in_use(name):
+    proxies = _proxies(*range(100, 3100, 100))
+    strategy = make_strategy(name, proxies)
+    for proxy in proxies[::2]:
+        strategy.remove(proxy)
+    strategy.remove(proxies[0])  # Already gone
+    assert len(strategy) == 15
+    assert all(strategy.select() in proxies[1::2] for _ in range(200))
+
+    for proxy in proxies[1::2]:
+        strategy.remove(proxy)
+    assert strategy.select() is None
+    strategy.add(proxies[0])
+    assert strategy.select() is proxies[0]
+
+
+@pytest.mark.parametrize("name", sorted(STRATEGIES))
+def test_exclude_is_avoided_unless_alone(name):
+    proxies = _proxies(100, 200, 300)
+    strategy = make_strategy(name, proxies)
+    assert all(strategy.select(exclude=proxies[0]) is not proxies[0] for _ in range(100))
+    strategy.remove(proxies[1])
+    strategy.remove(proxies[2])
+    assert strategy.select(exclude=proxies[0]) is proxies[0]
+
+
+def test_unknown_strategy_name():
+    with pytest.raises(ValueError):
+        make_strategy("fastest")
+
+
+def test_weighted_picks_in_proportion_to_inverse_latency():
+    fast, slow = _proxies(100, 1000)
+    strategy = WeightedLatencyStrategy([fast, slow], rng=random.Random(1))
+    picks = Counter(id(strategy.select()) for _ in range(11000))
+    assert 9 < picks[id(fast)] / picks[id(slow)] < 11
+
+    strategy.update(slow, 100)
+    picks = Counter(id(strategy.select()) for _ in range(10000))
+    assert 0.8 < picks[id(fast)] / picks[id(slow)] < 1.25
+
+
+def test_weighted_grows_past_its_initial_slots():
+    proxies = _proxies(*[100] * 200)
+    strategy = WeightedLatencyStrategy(proxies)
+    assert len({id(strategy.select()) for _ in range(5000)}) == 200
+
+
+def test_p2c_favors_the_faster_of_two():
+    proxies = _proxies(100, 200, 300, 5000)
+    strategy = PowerOfTwoStrategy(proxies, rng=random.Random(2))
+    picks = Counter(id(strategy.select()) for _ in range(4000))
+    # The slowest only wins when drawn twice (1/16), the fastest whenever drawn (7/16)
+    assert picks[id(proxies[3])] < 400
+    assert picks[id(proxies[0])] > 1500
+
+
+def test_ewma_follows_measured_latency():
+    fast, slow, untimed = _proxies(100, 500, None)
+    strategy = EWMAStrategy([fast, slow, untimed])
+    assert strategy.select() is untimed  # Gets tried first
+    strategy.update(untimed, 2000, smoothed=True)
+    assert strategy.select() is fast
+
+    for _ in range(10):
+        strategy.update(fast, 1000)
+    assert strategy.score(fast) > 500
+    assert strategy.select() is slow
+    assert strategy.select(exclude=slow) is fast
+
+
+def test_lru_cycles_through_the_pool():
+    proxies = _proxies(100, 200, 300)
+    strategy = LRUStrategy(proxies)
+    first_round = [strategy.select() for _ in range(3)]
+    assert {id(proxy) for proxy in first_round} == {id(proxy) for proxy in proxies}
+    newcomer, = _proxies(400)
+    strategy.add(newcomer)
+    assert strategy.select() is newcomer  # Never used, so first in line
+    assert [strategy.select() for _ in range(3)] == first_round
@@ -12,8 +12,12 @@ from utils.proxy_rotator import ProxyRotator
 from proxy_router import launch_app_with_proxy 
 from utils.logger import get_logger
 from proxy_loader import load_proxies
-from proxy_checker import check_all_proxies
+from proxy_checker import iter_revalidated_proxies, categorize_result
+from utils.proxy_db import ProxyHealthDB
+from utils.revalidator import RevalidationScheduler
 from utils.proxy_saver import save_proxies_by_type
+from utils.proxy_dedup import ProxyIndex
+from utils.proxy_utils import format_host
 
 logger = get_logger("dashboard")
 
@@ -71,6 +75,7 @@ class ProxyAppGUI:
         self.proxy_file = tk.StringVar()
         self.categorized = {}
         self.rotator = None
+        self.revalidator = None
         self.selected_proxy_type = tk.StringVar(value="SOCKS5")
         self.selected_proxy = tk.StringVar()
         self.app_path = tk.StringVar()
@@ -376,15 +381,38 @@ class ProxyAppGUI:
         self.launch_proxy(proxy)
 
     async def check_and_launch(self):
-        proxy_list = load_proxies(self.proxy_file.get())
+        index = ProxyIndex()
+        proxy_list = list(index.dedup(load_proxies(self.proxy_file.get())))
         if not proxy_list:
             messagebox.showerror("No Proxies", "No proxies found in file.")
             return
+        if index.dropped:
+            self.log(f"🔄 Skipped {index.dropped} duplicate proxies.")
+
+        proxy_type = self.selected_proxy_type.get()
+        self.categorized = {"HTTP": [], "SOCKS5": [], "SOCKS4": [], "BAD": []}
+        self.current_proxy = None
+
+        # Results stream in as they finish, so the first fast proxy becomes
+        # usable while slower ones are still being checked.
+        reused = 0
+        with ProxyHealthDB() as db:
+            async for result in iter_revalidated_proxies(proxy_list, db):
+                reused += bool(result.get("cached"))
+                if categorize_result(self.categorized, result) != proxy_type:
+                    continue
+                if self.current_proxy is None:
+                    first_proxy = result["proxy"]
+                    self.selected_proxy.set(f"{format_host(first_proxy['ip'])}:{first_proxy['port']}")
+                    self.current_proxy = first_proxy
+                    self.log(f"✅ First working {proxy_type} proxy ready: {first_proxy['ip']}:{first_proxy['port']}")
+                    self.app_entry.config(state='normal')
+                    self.browse_app_btn.config(state='normal')
+        if reused:
+            self.log(f"💾 Reused {reused} recent results from the health database.")
 
-        self.categorized = await check_all_proxies(proxy_list)
         save_proxies_by_type(self.categorized)
 
-        proxy_type = self.selected_proxy_type.get()
         proxies = self.categorized.get(proxy_type, [])
         if not proxies:
             messagebox.showerror("Unavailable", f"No working {proxy_type} proxies found.")
@@ -393,16 +421,38 @@ class ProxyAppGUI:
         self.display_proxies_in_table(proxies)
         self.populate_proxy_selector(proxies)
 
-        self.rotator = ProxyRotator(self.categorized, interval_seconds=90, max_uses=3)
-        first_proxy = proxies[0]
-        self.selected_proxy.set(f"{first_proxy['ip']}:{first_proxy['port']}")
-        self.current_proxy = first_proxy
+        self.rotator = ProxyRotator(self.categorized, interval_seconds=90, max_uses=3, strategy="p2c")
+        self.start_revalidation()
 
         self.log(f"✅ Validated {len(proxies)} {proxy_type} proxies.")
         self.app_entry.config(state='normal')
         self.browse_app_btn.config(state='normal')
 
+    def start_revalidation(self):
+        """Keep the validated pool fresh in the background; dead proxies are retried with backoff."""
+        self.stop_revalidation()
+        db = ProxyHealthDB()
+        rotator = self.rotator
+        scheduler = RevalidationScheduler(self.categorized, db=db,
+                                          on_result=rotator.on_check_result if rotator else None,
+                                          lock=rotator.lock if rotator else None)
+        self.revalidator = scheduler
+
+        def run():
+            try:
+                asyncio.run(scheduler.run())
+            finally:
+                db.close()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def stop_revalidation(self):
+        if self.revalidator is not None:
+            self.revalidator.stop()
+            self.revalidator = None
+
     def stop_routing(self):
+        self.stop_revalidation()
         self.rotator = None
         self.browser_launched = False
         self.current_proxy = None
@@ -487,7 +537,7 @@ class ProxyAppGUI:
             self.country_filter.set("All Countries")
 
     def populate_proxy_selector(self, proxies):
-        proxy_list = [f"{p['ip']}:{p['port']}" for p in proxies]
+        proxy_list = [f"{format_host(p['ip'])}:{p['port']}" for p in proxies]
         self.proxy_selector['values'] = proxy_list
         if proxy_list:
             self.selected_proxy.set(proxy_list[0])
@@ -499,7 +549,8 @@ class ProxyAppGUI:
 
     def switch_proxy(self, event):
         selected = self.selected_proxy.get()
-        ip, port = selected.split(":")
+        ip, _, port = selected.rpartition(":")
+        ip = ip.strip("[]")
         for proxy in self.categorized.get(self.selected_proxy_type.get(), []):
             if proxy["ip"] == ip and str(proxy["port"]) == port:
                 country = proxy.get("country", "Unknown")
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+
+from utils import ip_info as ip_info_module
+from utils.ip_cache import ip_cache
+from utils.ip_info import abuse_headers, abuse_params, parse_abuse_response
+from utils.rate_limiter import TokenBucket
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ABUSE_BLOCKLIST_PATH = os.path.join(BASE_DIR, 'data', 'abuse_blacklist.txt')
+ABUSE_BLOCKLIST_TTL = 24 * 3600  # Re-download the snapshot once a day
+ABUSE_BLOCKLIST_MIN_SCORE = 25  # Same cut-off check_ip_abuse uses for "abused"
+ABUSE_BLOCKLIST_LIMIT = 10000  # Entries per download (free-tier maximum)
+
+ABUSEIPDB_RATE = 5  # Per-IP checks per second
+ABUSEIPDB_BURST = 10
+ABUSEIPDB_MAX_WAIT = 5  # Seconds a check may wait on the rate limit before reporting the quota exhausted
+
+
+class AbuseBlocklist:
+    """Local snapshot of the AbuseIPDB blacklist, checked in memory.
+
+    The snapshot is a text file of ``ip score`` lines. ``verdict`` answers
+    without any network traffic; IPs missing from the list count as clean.
+    """
+
+    def __init__(self, path: str = ABUSE_BLOCKLIST_PATH, ttl: float = ABUSE_BLOCKLIST_TTL,
+                 min_score: int = ABUSE_BLOCKLIST_MIN_SCORE, limit: int = ABUSE_BLOCKLIST_LIMIT):
+        self.path = path
+        self.ttl = ttl
+        self.min_score = min_score
+        self.limit = limit
+        self.scores: Optional[Dict[str, int]] = None
+        self._load_failed = False  # No snapshot on disk; not retried until the next ensure_fresh
+
+    def is_stale(self) -> bool:
+        try:
+            return time.time() - os.path.getmtime(self.path) > self.ttl
+        except OSError:
+            return True
+
+    def load(self) -> bool:
+        """Read the snapshot from disk; False if there is none."""
+        scores = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    ip, _, score = line.strip().partition(' ')
+                    if ip:
+                        scores[ip] = int(score or 100)
+        except OSError:
+            self._load_failed = True
+            return False
+        self.scores = scores
+        self._load_failed = False
+        return True
+
+    def save(self, scores: Dict[str, int]):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for ip, score in scores.items():
+                f.write(f"{ip} {score}\n")
+        os.replace(tmp_path, self.path)
+        self.scores = scores
+
+    async def download(self, session: aiohttp.ClientSession, timeout: float = 30) -> bool:
+        params = {'confidenceMinimum': self.min_score, 'limit': self.limit}
+        try:
+            async with session.get(ip_info_module.ABUSEIPDB_BLACKLIST_URL, headers=abuse_headers(),
+                                   params=params, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if response.status != 200:
+                    print(f"[AbuseBlocklist] Download failed: HTTP {response.status}")
+                    return False
+                payload = await response.json()
+        except Exception as e:
+            print(f"[AbuseBlocklist] Download failed: {e}")
+            return False
+
+        scores = {entry['ipAddress']: int(entry.get('abuseConfidenceScore', 100))
+                  for entry in payload.get('data', [])}
+        await asyncio.get_running_loop().run_in_executor(None, self.save, scores)
+        print(f"[AbuseBlocklist] Downloaded {len(scores)} blacklisted IPs")
+        return True
+
+    async def ensure_fresh(self, session: aiohttp.ClientSession):
+        """Download a new snapshot when the current one is missing or stale."""
+        self._load_failed = False
+        if self.is_stale() and ip_info_module.ABUSEIPDB_API_KEY:
+            if await self.download(session):
+                return
+        if self.scores is None:
+            await asyncio.get_running_loop().run_in_executor(None, self.load)
+
+    def verdict(self, ip: str) -> Tuple[bool, int, str]:
+        if self.scores is None and (self._load_failed or not self.load()):
+            return False, 0, "Blacklist snapshot not available"
+        score = self.scores.get(ip)
+        if score is None:
+            return False, 0, "Not on AbuseIPDB blacklist"
+        is_abused = score > self.min_score
+        return is_abused, score, f"Abuse score: {score}% (blacklist)"
+
+
+class AbuseIPDBClient:
+    """Per-IP AbuseIPDB checks over one pooled session, paced by a token bucket.
+
+    Quota headers on every response feed the bucket, so the client slows
+    down or pauses before hitting the daily limit; a 429 is retried once
+    after the server's ``Retry-After``. A check that would wait longer
+    than ``max_wait`` for the bucket (e.g. until tomorrow's quota reset)
+    answers "quota exhausted" at once, uncached.
+    """
+
+    def __init__(self, rate: float = ABUSEIPDB_RATE, burst: float = ABUSEIPDB_BURST,
+                 timeout: float = ip_info_module.ABUSEIPDB_TIMEOUT, limit: int = 20,
+                 max_wait: float = ABUSEIPDB_MAX_WAIT):
+        self.bucket = TokenBucket(rate, burst)
+        self.timeout = timeout
+        self.max_wait = max_wait
+        self.limit = limit
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def check(self, ip: str) -> Tuple[bool, int, str]:
+        await ip_cache.load_async()
+        cached = ip_cache.get_abuse(ip)
+        if cached is not None:
+            return cached
+
+        for attempt in range(2):
+            if not await self.bucket.acquire(max_wait=self.max_wait):
+                return False, 0, "AbuseIPDB quota exhausted"
+            try:
+                async with self.session.get(ip_info_module.ABUSEIPDB_API_URL, headers=abuse_headers(),
+                                            params=abuse_params(ip),
+                                            timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+                    self.bucket.update_from_headers(response.headers)
+                    if response.status == 429 and attempt == 0:
+                        continue
+                    payload = await response.json() if response.status == 200 else None
+            except Exception as e:
+                return False, 0, f"Error checking abuse status: {e}"
+
+            verdict = parse_abuse_response(response.status, payload)
+            if payload is not None:
+                ip_cache.set_abuse(ip, verdict)
+            return verdict
+        return False, 0, "API error: 429"
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+# Shared snapshot used by both the sync and async lookup paths
+abuse_blocklist = AbuseBlocklist()
@@ -0,0 +1,196 @@
+import heapq
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+FAILURE_THRESHOLD = 5  # Consecutive failures that open the circuit
+COOLDOWN_SECONDS = 30  # Open time before the first trial request
+MAX_COOLDOWN_SECONDS = 3600  # Cool-down doubles each time a trial fails, up to this
+HALF_OPEN_TRIALS = 1  # Trial requests allowed at once while half-open
+SUCCESS_THRESHOLD = 2  # Successful trials needed to close the circuit again
+MAX_EJECTION_PERCENT = 50  # Never open circuits for more than this share of the pool
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """State of one upstream proxy: closed (in use), open (ejected) or half-open (on trial)."""
+
+    __slots__ = ("state", "failures", "successes", "trials", "opened_at", "cooldown", "trips")
+
+    def __init__(self, cooldown: float = COOLDOWN_SECONDS):
+        self.state = CLOSED
+        self.failures = 0
+        self.successes = 0
+        self.trials = 0
+        self.opened_at = 0.0
+        self.cooldown = cooldown
+        self.trips = 0
+
+    def retry_at(self) -> float:
+        return self.opened_at + self.cooldown
+
+
+class BreakerBoard:
+    """Per-proxy circuit breakers with a cap on how much of the pool can be ejected.
+
+    ``record_failure`` opens a proxy's circuit after ``failure_threshold``
+    consecutive failures (``trip`` opens it at once). After the cool-down
+    ``allow`` lets ``half_open_trials`` requests through at a time;
+    ``success_threshold`` successes close the circuit, while a failure
+    re-opens it with twice the cool-down. No circuit opens while open and
+    half-open ones already make up ``max_ejection_percent`` of
+    ``pool_size()`` (always allowing one); the proxy then keeps serving,
+    as with outlier detection in load balancers.
+    """
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN_SECONDS,
+                 max_cooldown: float = MAX_COOLDOWN_SECONDS, half_open_trials: int = HALF_OPEN_TRIALS,
+                 success_threshold: int = SUCCESS_THRESHOLD,
+                 max_ejection_percent: float = MAX_EJECTION_PERCENT,
+                 pool_size: Optional[Callable[[], int]] = None):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.half_open_trials = half_open_trials
+        self.success_threshold = success_threshold
+        self.max_ejection_percent = max_ejection_percent
+        self.pool_size = pool_size
+        self.ejected = 0  # Open or half-open circuits
+        self._breakers: Dict[int, CircuitBreaker] = {}
+        self._proxies: Dict[int, Dict] = {}
+        self._reopen: List = []  # Heap of (retry_at, trips, id(proxy))
+        self._lock = threading.Lock()
+
+    def _breaker(self, proxy: Dict) -> CircuitBreaker:
+        breaker = self._breakers.get(id(proxy))
+        if breaker is None:
+            breaker = self._breakers[id(proxy)] = CircuitBreaker(self.cooldown)
+            self._proxies[id(proxy)] = proxy
+        return breaker
+
+    def state(self, proxy: Dict) -> str:
+        breaker = self._breakers.get(id(proxy))
+        return breaker.state if breaker else CLOSED
+
+    def max_ejected(self) -> int:
+        size = self.pool_size() if self.pool_size else len(self._breakers)
+        # At least one, or a single-upstream setup could never open its circuit
+        return max(1, int(size * self.max_ejection_percent / 100))
+
+    def allow(self, proxy: Dict, now: Optional[float] = None) -> bool:
+        """Whether a request may go through ``proxy`` now (taking a trial slot if half-open)."""
+        breaker = self._breakers.get(id(proxy))
+        if breaker is None or breaker.state == CLOSED:
+            return True
+        now = now or time.time()
+        with self._lock:
+            if breaker.state == OPEN:
+                if now < breaker.retry_at():
+                    return False
+                self._half_open(breaker, now)
+            elif now - breaker.opened_at > breaker.cooldown:
+                # Trials that never reported back must not block the proxy forever
+                breaker.trials = 0
+                breaker.opened_at = now
+            if breaker.trials >= self.half_open_trials:
+                return False
+            breaker.trials += 1
+            return True
+
+    def release_trial(self, proxy: Dict):
+        """Give back a trial slot taken by ``allow`` when the request ended without a verdict."""
+        breaker = self._breakers.get(id(proxy))
+        if breaker is None:
+            return
+        with self._lock:
+            if breaker.state == HALF_OPEN:
+                breaker.trials = max(0, breaker.trials - 1)
+
+    def _half_open(self, breaker: CircuitBreaker, now: float):
+        breaker.state = HALF_OPEN
+        breaker.successes = 0
+        breaker.trials = 0
+        breaker.opened_at = now
+
+    def record_success(self, proxy: Dict) -> str:
+        breaker = self._breakers.get(id(proxy))
+        if breaker is None:
+            return CLOSED
+        with self._lock:
+            if breaker.state == CLOSED:
+                breaker.failures = 0
+            elif breaker.state == HALF_OPEN:
+                breaker.trials = max(0, breaker.trials - 1)
+                breaker.successes += 1
+                if breaker.successes >= self.success_threshold:
+                    breaker.state = CLOSED
+                    breaker.failures = 0
+                    breaker.cooldown = self.cooldown
+                    self.ejected -= 1
+            return breaker.state
+
+    def record_failure(self, proxy: Dict, now: Optional[float] = None) -> str:
+        now = now or time.time()
+        with self._lock:
+            breaker = self._breaker(proxy)
+            if breaker.state == HALF_OPEN:
+                breaker.cooldown = min(self.max_cooldown, breaker.cooldown * 2)
+                self._open(breaker, proxy, now, already_ejected=True)
+            elif breaker.state == CLOSED:
+                breaker.failures += 1
+                if breaker.failures >= self.failure_threshold:
+                    self._open(breaker, proxy, now)
+            return breaker.state
+
+    def trip(self, proxy: Dict, now: Optional[float] = None) -> str:
+        """Open the circuit right away (e.g. on a passive-health ejection), within the ejection cap."""
+        now = now or time.time()
+        with self._lock:
+            breaker = self._breaker(proxy)
+            if breaker.state == CLOSED:
+                self._open(breaker, proxy, now)
+            elif breaker.state == HALF_OPEN:
+                breaker.cooldown = min(self.max_cooldown, breaker.cooldown * 2)
+                self._open(breaker, proxy, now, already_ejected=True)
+            return breaker.state
+
+    def _open(self, breaker: CircuitBreaker, proxy: Dict, now: float, already_ejected: bool = False):
+        if not already_ejected:
+            if self.ejected >= self.max_ejected():
+                return  # Ejection cap reached; keep the proxy in service
+            self.ejected += 1
+        breaker.state = OPEN
+        breaker.trips += 1
+        breaker.trials = 0
+        breaker.opened_at = now
+        heapq.heappush(self._reopen, (breaker.retry_at(), breaker.trips, id(proxy)))
+
+    def next_trial_at(self) -> Optional[float]:
+        """Earliest time (``time.time()``) an open circuit's cool-down may end, or None."""
+        with self._lock:
+            return self._reopen[0][0] if self._reopen else None
+
+    def due_for_trial(self, now: Optional[float] = None) -> List[Dict]:
+        """Proxies whose cool-down just ended; open ones move to half-open."""
+        now = now or time.time()
+        due = []
+        with self._lock:
+            while self._reopen and self._reopen[0][0] <= now:
+                _, trips, key = heapq.heappop(self._reopen)
+                breaker = self._breakers.get(key)
+                if breaker is None or breaker.trips != trips or breaker.state == CLOSED:
+                    continue  # Forgotten, re-opened since, or already closed by its trials
+                if breaker.state == OPEN:
+                    self._half_open(breaker, now)
+                due.append(self._proxies[key])
+        return due
+
+    def forget(self, proxy: Dict):
+        with self._lock:
+            breaker = self._breakers.pop(id(proxy), None)
+            self._proxies.pop(id(proxy), None)
+            if breaker is not None and breaker.state != CLOSED:
+                self.ejected -= 1
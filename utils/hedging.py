@@ -0,0 +1,214 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import aiohttp
+from python_socks import ProxyError, ProxyTimeoutError
+
+from proxy_checker import TIMEOUT, ProxySessionManager
+from utils.passive_health import ProxyHealth
+from utils.proxy_rotator import AsyncProxyRotator
+from utils.proxy_utils import format_host
+
+HEDGE_PERCENTILE = 0.9  # Latency percentile of the first upstream after which a second one is tried
+HEDGE_MIN_SAMPLES = 5  # Latencies a proxy needs before its own percentile is trusted
+HEDGE_WINDOW = 500  # Recent latencies across all proxies, the fallback for new proxies
+HEDGE_DEFAULT_DELAY_MS = 1000  # Hedge delay before any latency has been seen
+HEDGE_MIN_DELAY_MS = 20  # Never hedge sooner than this
+HEDGE_BUDGET_RATIO = 0.1  # Hedges earned per request, so at most ~10% extra load
+HEDGE_BUDGET_BURST = 10  # Hedges that can be saved up and spent at once
+
+HEDGE_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))  # Safe to send twice; only bodiless requests are hedged
+
+T = TypeVar("T")
+
+
+class HedgeBudget:
+    """Token bucket for extra requests: every request earns ``ratio`` of a hedge, up to ``burst`` saved."""
+
+    __slots__ = ("ratio", "burst", "tokens", "requests", "hedges")
+
+    def __init__(self, ratio: float = HEDGE_BUDGET_RATIO, burst: float = HEDGE_BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self.requests = 0
+        self.hedges = 0
+
+    def deposit(self):
+        self.requests += 1
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        self.hedges += 1
+        return True
+
+
+class HedgePolicy:
+    """When to send a second copy of a request, and how many extra copies are allowed.
+
+    ``delay(health)`` is the ``percentile`` latency of the first upstream
+    (from its ProxyHealth) or, while it has fewer than ``min_samples``
+    requests behind it, of the latencies the policy has ``observe``-d
+    across all upstreams. A ``HedgeBudget`` caps hedges at
+    ``budget_ratio`` of all requests, so a slow pool can't double the
+    load on itself.
+    """
+
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, budget_ratio: float = HEDGE_BUDGET_RATIO,
+                 burst: float = HEDGE_BUDGET_BURST, min_delay_ms: float = HEDGE_MIN_DELAY_MS,
+                 default_delay_ms: float = HEDGE_DEFAULT_DELAY_MS, min_samples: int = HEDGE_MIN_SAMPLES,
+                 window: int = HEDGE_WINDOW):
+        self.percentile = percentile
+        self.budget = HedgeBudget(budget_ratio, burst)
+        self.min_delay_ms = min_delay_ms
+        self.default_delay_ms = default_delay_ms
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.wins = 0  # Hedges that answered before the request they backed up
+
+    def observe(self, latency_ms: float):
+        self.latencies.append(latency_ms)
+
+    def delay(self, health: Optional[ProxyHealth] = None) -> float:
+        """Seconds to give the first upstream before hedging."""
+        if health is not None and len(health.latencies) >= self.min_samples:
+            delay_ms = health.percentile(self.percentile)
+        elif self.latencies:
+            ordered = sorted(self.latencies)
+            delay_ms = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+        else:
+            delay_ms = self.default_delay_ms
+        return max(delay_ms, self.min_delay_ms) / 1000
+
+    def to_dict(self) -> Dict:
+        return {
+            "requests": self.budget.requests,
+            "hedges": self.budget.hedges,
+            "wins": self.wins,
+            "extra_load": round(self.budget.hedges / max(self.budget.requests, 1), 3),
+        }
+
+
+async def hedge(primary: Callable[[], Awaitable[T]], backup: Callable[[], Awaitable[T]], delay: float,
+                policy: HedgePolicy, discard: Optional[Callable[[T], None]] = None) -> Tuple[T, bool]:
+    """Run ``primary()``; if it's still going after ``delay`` seconds and the budget allows, run ``backup()`` too.
+
+    Returns the first successful result and whether it came from the
+    backup. The slower attempt is cancelled, or handed to ``discard`` if
+    it finished anyway. If both fail, or the primary fails before the
+    backup starts, the primary's exception is raised.
+    """
+    policy.budget.deposit()
+    tasks = [asyncio.ensure_future(primary())]
+    winner = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done and policy.budget.withdraw():
+            tasks.append(asyncio.ensure_future(backup()))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in tasks if task in done and task.exception() is None), None)
+            if winner is not None:
+                break
+        else:
+            return tasks[0].result(), False  # Raises the primary's error
+        if winner is not tasks[0]:
+            policy.wins += 1
+        return winner.result(), winner is not tasks[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for task in tasks:
+            # A loser that finished before it could be cancelled
+            if task is not winner and not task.cancelled() and task.exception() is None and discard:
+                discard(task.result())
+
+
+def _error_class(error: BaseException) -> str:
+    if isinstance(error, (asyncio.TimeoutError, ProxyTimeoutError)):
+        return "timeout"
+    if isinstance(error, (ProxyError, aiohttp.ClientConnectorError)):
+        return "connect"
+    return "reset"
+
+
+class HedgedClient:
+    """Hedged GET/HEAD/OPTIONS requests through proxies from an AsyncProxyRotator.
+
+    The client-side counterpart of ProxyGateway's ``hedge`` option, for
+    code that fetches through proxies itself. Each attempt gets its own
+    proxy from the rotator and reports its outcome back; other methods
+    are sent once.
+
+    Usage:
+        async with ProxySessionManager() as sessions:
+            client = HedgedClient(rotator, sessions)
+            result = await client.get("http://example.com/")
+    """
+
+    def __init__(self, rotator: AsyncProxyRotator, sessions: ProxySessionManager, proxy_type: str = "SOCKS5",
+                 policy: Optional[HedgePolicy] = None, timeout: float = TIMEOUT):
+        self.rotator = rotator
+        self.sessions = sessions
+        self.proxy_type = proxy_type.upper()
+        self.policy = policy or HedgePolicy()
+        self.timeout = timeout
+
+    async def get(self, url: str, **kwargs) -> Dict:
+        return await self.request("GET", url, **kwargs)
+
+    async def request(self, method: str, url: str, **kwargs) -> Dict:
+        """Send the request; returns status, headers, body, the proxy that answered, latency_ms and hedged."""
+        method = method.upper()
+        proxy = await self._acquire()
+        if method not in HEDGE_METHODS or kwargs.get("data") is not None or kwargs.get("json") is not None:
+            return await self._attempt(proxy, method, url, kwargs)
+
+        async def backup():
+            return await self._attempt(await self._acquire(exclude=proxy), method, url, kwargs)
+
+        result, hedged = await hedge(lambda: self._attempt(proxy, method, url, kwargs), backup,
+                                     self.policy.delay(self.rotator.health.get(proxy)), self.policy)
+        result["hedged"] = hedged
+        return result
+
+    async def _acquire(self, exclude: Optional[Dict] = None) -> Dict:
+        for _ in range(2):
+            proxy = await self.rotator.acquire(None, self.proxy_type)
+            if proxy is None:
+                break
+            if proxy is not exclude:
+                return proxy
+            self.rotator.release_proxy(proxy)
+        raise ConnectionError("No upstream proxy available")
+
+    def _session(self, proxy: Dict) -> Tuple[aiohttp.ClientSession, Optional[str]]:
+        if self.proxy_type == "HTTP":
+            return self.sessions.http_session(), f"http://{format_host(proxy['ip'])}:{proxy['port']}"
+        return self.sessions.socks_session(proxy, self.proxy_type.lower()), None
+
+    async def _attempt(self, proxy: Dict, method: str, url: str, kwargs: Dict) -> Dict:
+        session, proxy_url = self._session(proxy)
+        started = time.perf_counter()
+        try:
+            async with session.request(method, url, proxy=proxy_url, timeout=self.timeout, **kwargs) as response:
+                latency_ms = (time.perf_counter() - started) * 1000
+                body = await response.read()
+        except asyncio.CancelledError:
+            self.rotator.release_proxy(proxy)  # Lost the race; says nothing about the proxy
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            self.rotator.release_proxy(proxy, {"error": _error_class(e)}, proxy_type=self.proxy_type)
+            raise
+        self.rotator.release_proxy(proxy, {"latency_ms": latency_ms, "status": response.status,
+                                     "bytes_received": len(body)}, proxy_type=self.proxy_type)
+        self.policy.observe(latency_ms)
+        return {"status": response.status, "headers": dict(response.headers), "body": body,
+                "proxy": proxy, "latency_ms": latency_ms, "hedged": False}
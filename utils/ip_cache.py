@@ -0,0 +1,131 @@
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# On-disk cache for IP geolocation and abuse lookups, so IPs seen on earlier
+# runs skip the GeoLite2 read and the AbuseIPDB call.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IP_CACHE_PATH = os.path.join(BASE_DIR, 'data', 'ip_cache.json')
+GEO_TTL = 30 * 24 * 3600  # Locations rarely change
+ABUSE_TTL = 24 * 3600  # Abuse scores move faster and the API quota is small
+IP_CACHE_MAX_ENTRIES = 200_000
+
+
+class IPInfoCache:
+    """IP -> {"geo": [timestamp, location], "abuse": [timestamp, verdict]} with TTLs and LRU eviction.
+
+    The file is read on first use, or ahead of it with ``load()``; code on
+    an event loop should ``await load_async()`` first so the read never
+    runs on the loop. ``save()`` merges with whatever is on disk, so
+    several processes (e.g. sharded checks) can share one file.
+    """
+
+    def __init__(self, path: str = IP_CACHE_PATH, geo_ttl: float = GEO_TTL,
+                 abuse_ttl: float = ABUSE_TTL, max_entries: int = IP_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttls = {"geo": geo_ttl, "abuse": abuse_ttl}
+        self.max_entries = max_entries
+        self._entries: Optional[OrderedDict] = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _read_file(self) -> Dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            # Records without a single timestamped lookup are useless; drop them
+            return {ip: entry for ip, entry in entries.items() if isinstance(entry, dict) and entry}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"[IPCache] Ignoring unreadable cache {self.path}: {e}")
+            return {}
+
+    def _ensure_loaded(self) -> OrderedDict:
+        if self._entries is None:
+            # Oldest first, so eviction drops the least recently refreshed IPs
+            self._entries = OrderedDict(sorted(self._read_file().items(), key=_refreshed_at))
+        return self._entries
+
+    def load(self):
+        with self._lock:
+            self._ensure_loaded()
+
+    async def load_async(self):
+        """``load()`` in a worker thread, unless it already happened."""
+        if self._entries is None:
+            await asyncio.get_running_loop().run_in_executor(None, self.load)
+
+    def _get(self, ip: str, kind: str):
+        with self._lock:
+            entries = self._ensure_loaded()
+            entry = entries.get(ip)
+            if not entry or kind not in entry:
+                return None
+            stored_at, value = entry[kind]
+            if time.time() - stored_at > self.ttls[kind]:
+                return None
+            entries.move_to_end(ip)
+            return value
+
+    def _set(self, ip: str, kind: str, value):
+        with self._lock:
+            entries = self._ensure_loaded()
+            entry = entries.setdefault(ip, {})
+            entry[kind] = [time.time(), value]
+            entries.move_to_end(ip)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._dirty = True
+
+    def get_geo(self, ip: str) -> Optional[Dict]:
+        return self._get(ip, "geo")
+
+    def set_geo(self, ip: str, location: Dict):
+        self._set(ip, "geo", location)
+
+    def get_abuse(self, ip: str) -> Optional[Tuple[bool, int, str]]:
+        value = self._get(ip, "abuse")
+        return tuple(value) if value is not None else None
+
+    def set_abuse(self, ip: str, verdict: Tuple[bool, int, str]):
+        self._set(ip, "abuse", list(verdict))
+
+    def save(self):
+        """Write the cache to disk if anything changed, keeping the newer of each record."""
+        with self._lock:
+            if not self._dirty or self._entries is None:
+                return
+            merged = self._read_file()
+            for ip, entry in self._entries.items():
+                current = merged.setdefault(ip, {})
+                for kind, record in entry.items():
+                    if kind not in current or current[kind][0] < record[0]:
+                        current[kind] = record
+            if len(merged) > self.max_entries:
+                newest = sorted(merged.items(), key=_refreshed_at)
+                merged = dict(newest[-self.max_entries:])
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(merged, f, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except OSError as e:
+                print(f"[IPCache] Could not save cache to {self.path}: {e}")
+
+
+def _refreshed_at(item: Tuple[str, Dict]) -> float:
+    return max((record[0] for record in item[1].values()), default=0)
+
+
+# Singleton instance
+ip_cache = IPInfoCache()
+atexit.register(ip_cache.save)
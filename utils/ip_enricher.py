@@ -0,0 +1,144 @@
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional
+
+from utils import ip_info as ip_info_module
+from utils.abuse_reputation import AbuseBlocklist, AbuseIPDBClient, abuse_blocklist
+from utils.ip_cache import ip_cache
+from utils.ip_info import build_ip_info, demo_abuse, ip_info
+
+ENRICH_CONCURRENCY = 20  # AbuseIPDB connections open at once
+ENRICH_BATCH_SIZE = 50  # IPs looked up together
+ENRICH_FLUSH_INTERVAL = 0.2  # Seconds to wait for a batch to fill up
+ENRICH_TIMEOUT = 5  # Seconds before a single abuse lookup is abandoned
+
+_DONE = object()
+
+
+def apply_ip_info(proxy: Dict, info: Dict):
+    """Attach geolocation and abuse info to a proxy."""
+    proxy.update({
+        "country": info.get("country", "Unknown"),
+        "country_code": info.get("country_code", "XX"),
+        "city": info.get("city", "Unknown"),
+        "is_abused": info.get("is_abused", False),
+        "abuse_score": info.get("abuse_score", 0)
+    })
+
+
+class IPEnricher:
+    """Looks up geolocation and abuse data for batches of IPs without blocking the event loop.
+
+    GeoLite2 reads for a batch run together in a worker thread. Abuse
+    verdicts come from the local blacklist snapshot when
+    ABUSEIPDB_USE_BLOCKLIST is set, otherwise from a rate-limited
+    ``AbuseIPDBClient`` (at most ``concurrency`` connections, each call cut
+    off after ``timeout`` seconds).
+    """
+
+    def __init__(self, concurrency: int = ENRICH_CONCURRENCY, timeout: float = ENRICH_TIMEOUT,
+                 client: Optional[AbuseIPDBClient] = None, blocklist: AbuseBlocklist = abuse_blocklist):
+        self.client = client or AbuseIPDBClient(timeout=timeout, limit=concurrency)
+        self.blocklist = blocklist
+        self._blocklist_ready = False
+
+    def _locate_batch(self, ips: List[str]) -> Dict[str, Dict]:
+        return {ip: ip_info.get_ip_location(ip) for ip in ips}
+
+    async def _abuse(self, ip: str):
+        # Read the settings at call time so they can be configured after import
+        if not ip_info_module.ABUSEIPDB_API_KEY:
+            return demo_abuse(ip)
+        if ip_info_module.ABUSEIPDB_USE_BLOCKLIST:
+            return self.blocklist.verdict(ip)
+        return await self.client.check(ip)
+
+    async def lookup_many(self, ips: List[str]) -> Dict[str, Dict]:
+        unique = list(dict.fromkeys(ips))
+        if ip_info_module.ABUSEIPDB_USE_BLOCKLIST and not self._blocklist_ready:
+            await self.blocklist.ensure_fresh(self.client.session)
+            self._blocklist_ready = True
+        await ip_cache.load_async()
+        loop = asyncio.get_running_loop()
+        locations = await loop.run_in_executor(None, self._locate_batch, unique)
+        abuse = await asyncio.gather(*(self._abuse(ip) for ip in unique))
+        return {ip: build_ip_info(locations[ip], verdict) for ip, verdict in zip(unique, abuse)}
+
+    async def close(self):
+        await self.client.close()
+        await asyncio.get_running_loop().run_in_executor(None, ip_cache.save)
+
+
+async def enrich_results(results: AsyncIterator[Dict], enricher: Optional[IPEnricher] = None,
+                         batch_size: int = ENRICH_BATCH_SIZE,
+                         flush_interval: float = ENRICH_FLUSH_INTERVAL) -> AsyncIterator[Dict]:
+    """Pipeline stage that adds IP info to working proxies from a stream of check results.
+
+    ``results`` is drained by its own task, so checking never waits on
+    lookups. Working proxies are grouped into batches of up to
+    ``batch_size`` IPs; BAD results pass straight through.
+    """
+    owns_enricher = enricher is None
+    if owns_enricher:
+        enricher = IPEnricher()
+
+    to_enrich: asyncio.Queue = asyncio.Queue()
+    output: asyncio.Queue = asyncio.Queue()
+
+    async def intake():
+        try:
+            async for result in results:
+                await (to_enrich if result["type"] else output).put(result)
+        finally:
+            await to_enrich.put(_DONE)
+
+    async def process(batch: List[Dict]):
+        try:
+            infos = await enricher.lookup_many([result["proxy"]["ip"] for result in batch])
+        except Exception as e:
+            print(f"[Enricher] Lookup failed for {len(batch)} IPs -> {e}")
+            infos = {}
+        for result in batch:
+            apply_ip_info(result["proxy"], infos.get(result["proxy"]["ip"], {}))
+            await output.put(result)
+
+    async def batcher():
+        batches = set()
+        finished = False
+        while not finished:
+            item = await to_enrich.get()
+            if item is _DONE:
+                break
+            batch = [item]
+            for attempt in range(2):
+                while len(batch) < batch_size and not to_enrich.empty():
+                    item = to_enrich.get_nowait()
+                    if item is _DONE:
+                        finished = True
+                        break
+                    batch.append(item)
+                if finished or len(batch) >= batch_size or attempt:
+                    break
+                await asyncio.sleep(flush_interval)
+            task = asyncio.create_task(process(batch))
+            batches.add(task)
+            task.add_done_callback(batches.discard)
+        await asyncio.gather(*batches)
+        await output.put(_DONE)
+
+    stages = [asyncio.create_task(intake()), asyncio.create_task(batcher())]
+    try:
+        while True:
+            result = await output.get()
+            if result is _DONE:
+                break
+            yield result
+        # Surface errors from the upstream iterator
+        await stages[0]
+    finally:
+        for task in stages:
+            task.cancel()
+        await asyncio.gather(*stages, return_exceptions=True)
+        if hasattr(results, "aclose"):
+            await results.aclose()
+        if owns_enricher:
+            await enricher.close()
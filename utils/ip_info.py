@@ -1,7 +1,9 @@
+import aiohttp
 import requests
 import geoip2.database
 import os
 from typing import Dict, Optional, Tuple
+from utils.ip_cache import ip_cache
 
 # Path to the GeoLite2 database file
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -10,6 +12,10 @@ GEOIP_DB_PATH = os.path.join(BASE_DIR, 'data', 'GeoLite2-City.mmdb')
 # AbuseIPDB API settings
 ABUSEIPDB_API_KEY = ""  # Add your API key here
 ABUSEIPDB_API_URL = "https://api.abuseipdb.com/api/v2/check"
+ABUSEIPDB_BLACKLIST_URL = "https://api.abuseipdb.com/api/v2/blacklist"
+ABUSEIPDB_TIMEOUT = 10  # Seconds before an AbuseIPDB lookup is abandoned
+# Check IPs against a downloaded blacklist snapshot instead of one API call per IP
+ABUSEIPDB_USE_BLOCKLIST = False
 
 class IPInfo:
     def __init__(self):
@@ -46,6 +52,10 @@ class IPInfo:
         
         if not self.reader:
             return result
+
+        cached = ip_cache.get_geo(ip)
+        if cached is not None:
+            return cached
         
         try:
             response = self.reader.city(ip)
@@ -54,6 +64,7 @@ class IPInfo:
             result["city"] = response.city.name or "Unknown"
             result["latitude"] = response.location.latitude or 0.0
             result["longitude"] = response.location.longitude or 0.0
+            ip_cache.set_geo(ip, result)
         except Exception as e:
             print(f"Error getting location for IP {ip}: {e}")
         
@@ -68,29 +79,86 @@ class IPInfo:
         if not ABUSEIPDB_API_KEY:
             return False, 0, "API key not configured"
         
+        cached = ip_cache.get_abuse(ip)
+        if cached is not None:
+            return cached
+
         try:
-            headers = {
-                'Accept': 'application/json',
-                'Key': ABUSEIPDB_API_KEY
-            }
-            params = {
-                'ipAddress': ip,
-                'maxAgeInDays': 90,
-                'verbose': False
-            }
-            
-            response = requests.get(ABUSEIPDB_API_URL, headers=headers, params=params)
-            if response.status_code == 200:
-                data = response.json().get('data', {})
-                score = data.get('abuseConfidenceScore', 0)
-                is_abused = score > 25  # Consider IPs with score > 25% as potentially abusive
-                message = f"Abuse score: {score}%"
-                return is_abused, score, message
-            else:
-                return False, 0, f"API error: {response.status_code}"
+            response = requests.get(ABUSEIPDB_API_URL, headers=abuse_headers(), params=abuse_params(ip),
+                                    timeout=ABUSEIPDB_TIMEOUT)
+            payload = response.json() if response.status_code == 200 else None
+            verdict = parse_abuse_response(response.status_code, payload)
+            if payload is not None:
+                ip_cache.set_abuse(ip, verdict)
+            return verdict
         except Exception as e:
             return False, 0, f"Error checking abuse status: {e}"
 
+    async def check_ip_abuse_async(self, session, ip: str, timeout: float = ABUSEIPDB_TIMEOUT) -> Tuple[bool, int, str]:
+        """Same as ``check_ip_abuse`` but through an aiohttp session, with a hard timeout."""
+        if not ABUSEIPDB_API_KEY:
+            return False, 0, "API key not configured"
+
+        await ip_cache.load_async()
+        cached = ip_cache.get_abuse(ip)
+        if cached is not None:
+            return cached
+
+        try:
+            async with session.get(ABUSEIPDB_API_URL, headers=abuse_headers(), params=abuse_params(ip),
+                                   timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                payload = await response.json() if response.status == 200 else None
+                verdict = parse_abuse_response(response.status, payload)
+                if payload is not None:
+                    ip_cache.set_abuse(ip, verdict)
+                return verdict
+        except Exception as e:
+            return False, 0, f"Error checking abuse status: {e}"
+
+
+def abuse_headers() -> Dict:
+    return {
+        'Accept': 'application/json',
+        'Key': ABUSEIPDB_API_KEY
+    }
+
+
+def abuse_params(ip: str) -> Dict:
+    # Non-verbose is the API default; AbuseIPDB treats any "verbose" value as a request for it
+    return {
+        'ipAddress': ip,
+        'maxAgeInDays': 90
+    }
+
+
+def parse_abuse_response(status: int, payload: Optional[Dict]) -> Tuple[bool, int, str]:
+    if status != 200 or payload is None:
+        return False, 0, f"API error: {status}"
+    data = payload.get('data', {})
+    score = data.get('abuseConfidenceScore', 0)
+    is_abused = score > 25  # Consider IPs with score > 25% as potentially abusive
+    return is_abused, score, f"Abuse score: {score}%"
+
+
+def demo_abuse(ip: str) -> Tuple[bool, float, str]:
+    """Stand-in abuse verdict used when no AbuseIPDB key is configured."""
+    # Use a simple heuristic for demo purposes - mark some IPs as abused based on last octet
+    # In a real application, you would use the actual API
+    last_octet = int(ip.split('.')[-1]) if '.' in ip else 0
+    is_abused = last_octet > 200  # Just a demo heuristic
+    abuse_score = last_octet / 2.55 if is_abused else 0  # Scale to 0-100
+    return is_abused, abuse_score, "Demo mode - no API key configured"
+
+
+def build_ip_info(location: Dict, abuse: Tuple) -> Dict:
+    is_abused, abuse_score, abuse_message = abuse
+    return {
+        **location,
+        "is_abused": is_abused,
+        "abuse_score": abuse_score,
+        "abuse_message": abuse_message
+    }
+
 # Singleton instance
 ip_info = IPInfo()
 
@@ -99,19 +167,12 @@ def get_ip_info(ip: str) -> Dict:
     location = ip_info.get_ip_location(ip)
     
     # Only check abuse if API key is configured
-    if ABUSEIPDB_API_KEY:
-        is_abused, abuse_score, abuse_message = ip_info.check_ip_abuse(ip)
+    if ABUSEIPDB_API_KEY and ABUSEIPDB_USE_BLOCKLIST:
+        from utils.abuse_reputation import abuse_blocklist
+        abuse = abuse_blocklist.verdict(ip)
+    elif ABUSEIPDB_API_KEY:
+        abuse = ip_info.check_ip_abuse(ip)
     else:
-        # Use a simple heuristic for demo purposes - mark some IPs as abused based on last octet
-        # In a real application, you would use the actual API
-        last_octet = int(ip.split('.')[-1]) if '.' in ip else 0
-        is_abused = last_octet > 200  # Just a demo heuristic
-        abuse_score = last_octet / 2.55 if is_abused else 0  # Scale to 0-100
-        abuse_message = "Demo mode - no API key configured"
+        abuse = demo_abuse(ip)
     
-    return {
-        **location,
-        "is_abused": is_abused,
-        "abuse_score": abuse_score,
-        "abuse_message": abuse_message
-    }
\ No newline at end of file
+    return build_ip_info(location, abuse)
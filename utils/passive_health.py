@@ -0,0 +1,145 @@
+from collections import deque
+from typing import Dict, Optional
+
+HEALTH_ALPHA = 0.2  # Weight of the newest request in the decayed averages
+LATENCY_WINDOW = 50  # Recent latencies kept per proxy for percentiles
+MIN_REQUESTS = 5  # Requests seen before the success rate can eject a proxy
+EJECT_SUCCESS_RATE = 0.5  # Decayed success rate below which a proxy is ejected
+EJECT_CONSECUTIVE_FAILURES = 3  # Back-to-back failures that eject a proxy right away
+THROTTLE_SUCCESS_RATE = 0.8  # Below this the proxy is kept but picked less often
+
+# Statuses that point at the proxy (auth, bans, gateway errors) rather than the target site
+PROXY_FAILURE_STATUSES = frozenset((403, 407, 429, 502, 503, 504))
+
+OK = "ok"
+THROTTLE = "throttle"
+EJECT = "eject"
+
+
+class ProxyHealth:
+    """Decayed request statistics for one proxy."""
+
+    __slots__ = ("success_rate", "latency_ms", "bytes_per_sec", "latencies", "requests",
+                 "consecutive_failures", "last_error")
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.success_rate = 1.0
+        self.latency_ms: Optional[float] = None
+        self.bytes_per_sec: Optional[float] = None
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Latency at ``fraction`` (e.g. 0.9) over the recent window."""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def effective_latency(self) -> Optional[float]:
+        """Latency inflated by the failure rate, so flaky proxies rank behind steady ones."""
+        if self.latency_ms is None:
+            return None
+        return self.latency_ms / max(self.success_rate, 0.05)
+
+    def to_dict(self) -> Dict:
+        return {
+            "success_rate": round(self.success_rate, 3),
+            "latency_ms": self.latency_ms,
+            "p50_ms": self.percentile(0.5),
+            "p90_ms": self.percentile(0.9),
+            "bytes_per_sec": self.bytes_per_sec,
+            "requests": self.requests,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+        }
+
+
+def is_failure(ok: Optional[bool] = None, status: Optional[int] = None, error: Optional[str] = None) -> bool:
+    """Whether an outcome counts against the proxy."""
+    if ok is not None:
+        return not ok
+    return error is not None or status in PROXY_FAILURE_STATUSES
+
+
+class HealthTracker:
+    """Scores proxies from the outcome of real requests, without synthetic probes.
+
+    ``record`` takes what the caller saw (latency, bytes, HTTP status and
+    an error class such as "connect", "timeout" or "reset") and answers
+    with a verdict: ``OK``, ``THROTTLE`` (keep it, but prefer others) or
+    ``EJECT`` (stop handing it out for a while). A proxy is ejected after
+    ``EJECT_CONSECUTIVE_FAILURES`` failures in a row or when its decayed
+    success rate drops below ``EJECT_SUCCESS_RATE``. How long it stays out
+    is up to the caller; ProxyRotator hands that to a circuit breaker.
+
+    ``THROTTLE`` has no side effect of its own: ProxyRotator demotes a
+    flaky proxy by feeding ``effective_latency`` to its strategy, which
+    only the latency-aware ones ("weighted", "p2c", "ewma") act on. Under
+    "random" and "lru" a throttled proxy is picked as often as before.
+    """
+
+    def __init__(self, alpha: float = HEALTH_ALPHA, window: int = LATENCY_WINDOW,
+                 min_requests: int = MIN_REQUESTS, eject_success_rate: float = EJECT_SUCCESS_RATE,
+                 eject_consecutive_failures: int = EJECT_CONSECUTIVE_FAILURES,
+                 throttle_success_rate: float = THROTTLE_SUCCESS_RATE):
+        self.alpha = alpha
+        self.window = window
+        self.min_requests = min_requests
+        self.eject_success_rate = eject_success_rate
+        self.eject_consecutive_failures = eject_consecutive_failures
+        self.throttle_success_rate = throttle_success_rate
+        self._health: Dict[int, ProxyHealth] = {}
+
+    def get(self, proxy: Dict) -> Optional[ProxyHealth]:
+        return self._health.get(id(proxy))
+
+    def _entry(self, proxy: Dict) -> ProxyHealth:
+        health = self._health.get(id(proxy))
+        if health is None:
+            health = self._health[id(proxy)] = ProxyHealth(self.window)
+        return health
+
+    def forget(self, proxy: Dict):
+        self._health.pop(id(proxy), None)
+
+    def record(self, proxy: Dict, latency_ms: Optional[float] = None, ok: Optional[bool] = None,
+               status: Optional[int] = None, bytes_received: int = 0, error: Optional[str] = None) -> str:
+        health = self._entry(proxy)
+        failed = is_failure(ok, status, error)
+        health.requests += 1
+        health.success_rate += self.alpha * ((0.0 if failed else 1.0) - health.success_rate)
+
+        if failed:
+            health.consecutive_failures += 1
+            health.last_error = error or (f"HTTP {status}" if status else "failed")
+        else:
+            health.consecutive_failures = 0
+
+        if latency_ms is not None and not failed:
+            health.latencies.append(latency_ms)
+            if health.latency_ms is None:
+                health.latency_ms = latency_ms
+            else:
+                health.latency_ms += self.alpha * (latency_ms - health.latency_ms)
+            if bytes_received and latency_ms > 0:
+                rate = bytes_received / (latency_ms / 1000)
+                if health.bytes_per_sec is None:
+                    health.bytes_per_sec = rate
+                else:
+                    health.bytes_per_sec += self.alpha * (rate - health.bytes_per_sec)
+
+        if (health.consecutive_failures >= self.eject_consecutive_failures or
+                (health.requests >= self.min_requests and health.success_rate < self.eject_success_rate)):
+            return self._eject(health)
+        if health.success_rate < self.throttle_success_rate:
+            return THROTTLE
+        return OK
+
+    def _eject(self, health: ProxyHealth) -> str:
+        # Start over on probation once it is back: one more bad spell ejects it again
+        health.consecutive_failures = 0
+        health.success_rate = (self.eject_success_rate + self.throttle_success_rate) / 2
+        return EJECT
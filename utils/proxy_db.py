@@ -0,0 +1,257 @@
+import json
+import os
+import sqlite3
+import statistics
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.proxy_dedup import credentials_key
+
+# Per-proxy health history, so a restart only re-probes proxies whose last
+# check is too old instead of the whole source list.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROXY_DB_PATH = os.path.join(BASE_DIR, 'data', 'proxy_health.db')
+ALIVE_TTL = 15 * 60  # Working proxies are trusted for this long
+DEAD_TTL = 60 * 60  # Failed proxies are not retried before this
+MAX_LATENCY_SAMPLES = 20  # Most recent speeds kept per proxy
+COMMIT_EVERY = 500  # Recorded results per transaction
+LOOKUP_BATCH = 300  # Proxies per query in cached_results (three bound parameters each)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS proxies (
+    ip TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    login BLOB NOT NULL DEFAULT X'',
+    username TEXT,
+    password TEXT,
+    type TEXT,
+    speed REAL,
+    connect_ms REAL,
+    ttfb_ms REAL,
+    total_ms REAL,
+    country TEXT,
+    country_code TEXT,
+    city TEXT,
+    is_abused INTEGER,
+    abuse_score INTEGER,
+    samples TEXT NOT NULL DEFAULT '[]',
+    first_seen REAL NOT NULL,
+    last_checked REAL,
+    last_alive REAL,
+    failure_streak INTEGER NOT NULL DEFAULT 0,
+    checks INTEGER NOT NULL DEFAULT 0,
+    successes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (ip, port, login)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS proxies_last_checked ON proxies (last_checked);
+"""
+
+# Columns copied onto the proxy when a stored result is reused
+_PROXY_COLUMNS = ("speed", "connect_ms", "ttfb_ms", "total_ms",
+                  "country", "country_code", "city", "is_abused", "abuse_score")
+
+
+def _row_key(proxy: Dict) -> Tuple[str, int, bytes]:
+    # Same endpoint with other credentials is another candidate (see ProxyIndex)
+    return proxy["ip"], int(proxy["port"]), credentials_key(proxy)
+
+
+class ProxyHealthDB:
+    """SQLite store of per-proxy check history, keyed by endpoint and credentials.
+
+    Each row keeps the latest check (type, timings, geolocation and abuse
+    info), the last time the proxy was seen alive, its current failure
+    streak and its recent latency samples. ``cached_result`` hands back a
+    check result for proxies checked recently enough (``alive_ttl`` for
+    working ones, ``dead_ttl`` for failed ones); only the rest need probing.
+    """
+
+    def __init__(self, path: str = PROXY_DB_PATH, alive_ttl: float = ALIVE_TTL,
+                 dead_ttl: float = DEAD_TTL, max_samples: int = MAX_LATENCY_SAMPLES):
+        self.path = path
+        self.alive_ttl = alive_ttl
+        self.dead_ttl = dead_ttl
+        self.max_samples = max_samples
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(proxies)")]
+        if columns and "login" not in columns:
+            self._migrate(columns)
+        self._conn.executescript(_SCHEMA)
+
+    def _migrate(self, columns: List[str]):
+        """Rebuild a table from before credentials were part of the key."""
+        self._conn.create_function(
+            "login_key", 2, lambda username, password: credentials_key({"username": username, "password": password}))
+        names = ", ".join(columns)
+        self._conn.executescript(f"""
+            DROP INDEX IF EXISTS proxies_last_checked;
+            ALTER TABLE proxies RENAME TO proxies_old;
+            {_SCHEMA}
+            INSERT INTO proxies ({names}, login) SELECT {names}, login_key(username, password) FROM proxies_old;
+            DROP TABLE proxies_old;
+        """)
+
+    def lookup(self, proxy: Dict) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute("SELECT * FROM proxies WHERE ip = ? AND port = ? AND login = ?",
+                                      _row_key(proxy)).fetchone()
+
+    def is_fresh(self, row: sqlite3.Row, now: Optional[float] = None) -> bool:
+        if row is None or row["last_checked"] is None:
+            return False
+        ttl = self.alive_ttl if row["failure_streak"] == 0 else self.dead_ttl
+        return (now or time.time()) - row["last_checked"] < ttl
+
+    def cached_result(self, proxy: Dict) -> Optional[Dict]:
+        """A check result built from the stored row, or None if ``proxy`` needs probing.
+
+        Stored speed, timings and IP info are copied onto ``proxy``; the
+        result carries ``"cached": True``.
+        """
+        return self._result_from_row(proxy, self.lookup(proxy), time.time())
+
+    def cached_results(self, proxies: List[Dict]) -> List[Optional[Dict]]:
+        """``cached_result`` for every proxy in ``proxies``, looked up in batched queries."""
+        rows = {}
+        with self._lock:
+            for start in range(0, len(proxies), LOOKUP_BATCH):
+                keys = {_row_key(proxy) for proxy in proxies[start:start + LOOKUP_BATCH]}
+                placeholders = ", ".join(["(?, ?, ?)"] * len(keys))
+                query = f"SELECT * FROM proxies WHERE (ip, port, login) IN (VALUES {placeholders})"
+                for row in self._conn.execute(query, [value for key in keys for value in key]):
+                    rows[(row["ip"], row["port"], row["login"])] = row
+        now = time.time()
+        return [self._result_from_row(proxy, rows.get(_row_key(proxy)), now) for proxy in proxies]
+
+    def _result_from_row(self, proxy: Dict, row: Optional[sqlite3.Row], now: float) -> Optional[Dict]:
+        if not self.is_fresh(row, now):
+            return None
+
+        result = {"proxy": proxy, "type": None, "speed": None, "connect_ms": None,
+                  "ttfb_ms": None, "total_ms": None, "check_ms": 0.0, "cached": True}
+        if row["failure_streak"] == 0 and row["type"]:
+            for column in _PROXY_COLUMNS:
+                if row[column] is not None:
+                    proxy[column] = bool(row[column]) if column == "is_abused" else row[column]
+            result.update({key: row[key] for key in ("type", "speed", "connect_ms", "ttfb_ms", "total_ms")})
+        return result
+
+    def record(self, result: Dict, checked_at: Optional[float] = None):
+        """Store the outcome of a live check (cached results are ignored)."""
+        if result.get("cached"):
+            return
+        proxy = result["proxy"]
+        now = checked_at or time.time()
+        alive = bool(result.get("type"))
+        key = _row_key(proxy)
+
+        with self._lock:
+            row = self._conn.execute("SELECT samples FROM proxies WHERE ip = ? AND port = ? AND login = ?",
+                                     key).fetchone()
+            samples = json.loads(row["samples"]) if row else []
+            if alive and result.get("speed") is not None:
+                samples = (samples + [result["speed"]])[-self.max_samples:]
+
+            values = {
+                "ip": key[0], "port": key[1], "login": key[2],
+                "username": proxy.get("username"), "password": proxy.get("password"),
+                "type": result.get("type"), "speed": result.get("speed"),
+                "connect_ms": result.get("connect_ms"), "ttfb_ms": result.get("ttfb_ms"),
+                "total_ms": result.get("total_ms"),
+                "country": proxy.get("country"), "country_code": proxy.get("country_code"),
+                "city": proxy.get("city"), "is_abused": proxy.get("is_abused"),
+                "abuse_score": proxy.get("abuse_score"),
+                "samples": json.dumps(samples), "now": now, "alive": int(alive),
+            }
+            # A failed check keeps the last known type/timings/IP info for reference
+            self._conn.execute("""
+                INSERT INTO proxies (ip, port, login, username, password, type, speed, connect_ms, ttfb_ms,
+                                     total_ms, country, country_code, city, is_abused, abuse_score,
+                                     samples, first_seen, last_checked, last_alive, failure_streak,
+                                     checks, successes)
+                VALUES (:ip, :port, :login, :username, :password, :type, :speed, :connect_ms, :ttfb_ms,
+                        :total_ms, :country, :country_code, :city, :is_abused, :abuse_score,
+                        :samples, :now, :now, CASE WHEN :alive THEN :now END, 1 - :alive, 1, :alive)
+                ON CONFLICT (ip, port, login) DO UPDATE SET
+                    username = excluded.username,
+                    password = excluded.password,
+                    type = CASE WHEN :alive THEN excluded.type ELSE type END,
+                    speed = CASE WHEN :alive THEN excluded.speed ELSE speed END,
+                    connect_ms = CASE WHEN :alive THEN excluded.connect_ms ELSE connect_ms END,
+                    ttfb_ms = CASE WHEN :alive THEN excluded.ttfb_ms ELSE ttfb_ms END,
+                    total_ms = CASE WHEN :alive THEN excluded.total_ms ELSE total_ms END,
+                    country = COALESCE(excluded.country, country),
+                    country_code = COALESCE(excluded.country_code, country_code),
+                    city = COALESCE(excluded.city, city),
+                    is_abused = COALESCE(excluded.is_abused, is_abused),
+                    abuse_score = COALESCE(excluded.abuse_score, abuse_score),
+                    samples = excluded.samples,
+                    last_checked = excluded.last_checked,
+                    last_alive = CASE WHEN :alive THEN excluded.last_checked ELSE last_alive END,
+                    failure_streak = CASE WHEN :alive THEN 0 ELSE failure_streak + 1 END,
+                    checks = checks + 1,
+                    successes = successes + :alive
+            """, values)
+
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+
+    def record_many(self, results: List[Dict], checked_at: Optional[float] = None):
+        """``record`` for each result, e.g. from an executor thread."""
+        for result in results:
+            self.record(result, checked_at)
+
+    def history(self, proxy: Dict) -> Optional[Dict]:
+        """Stored health summary for ``proxy``: streaks, uptime and latency stats."""
+        row = self.lookup(proxy)
+        if row is None:
+            return None
+        samples: List[float] = json.loads(row["samples"])
+        return {
+            "last_checked": row["last_checked"],
+            "last_alive": row["last_alive"],
+            "failure_streak": row["failure_streak"],
+            "uptime": row["successes"] / row["checks"] if row["checks"] else None,
+            "samples": samples,
+            "median_ms": statistics.median(samples) if samples else None,
+            "jitter_ms": statistics.pstdev(samples) if len(samples) > 1 else None,
+        }
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM proxies").fetchone()[0]
+
+    def prune(self, max_age: float) -> int:
+        """Delete proxies not seen alive (or, if never alive, first seen) within ``max_age`` seconds."""
+        cutoff = time.time() - max_age
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM proxies WHERE COALESCE(last_alive, first_seen) < ?", (cutoff,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
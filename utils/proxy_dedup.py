@@ -0,0 +1,114 @@
+import hashlib
+import ipaddress
+import socket
+from typing import Dict, Iterable, Iterator, Optional
+from proxy_loader import iter_proxies
+
+# Key prefixes keep IPv4, IPv6 and hostname keys from ever colliding
+_IPV4_TAG = b"\x04"
+_IPV6_TAG = b"\x06"
+_NAME_TAG = b"\x00"
+
+
+def normalize_host(host: str) -> Optional[str]:
+    """Canonical form of a proxy host: no leading zeros, compressed IPv6, lowercase names."""
+    host = host.strip().strip("[]")
+    parts = host.split(".")
+    if len(parts) == 4 and all(part.isdigit() for part in parts):
+        octets = [int(part) for part in parts]
+        if any(octet > 255 for octet in octets):
+            return None
+        return ".".join(str(octet) for octet in octets)
+    if ":" in host:
+        try:
+            return str(ipaddress.IPv6Address(host))
+        except ValueError:
+            return None
+    return host.lower().rstrip(".") or None
+
+
+def endpoint_key(host: str, port: int) -> bytes:
+    """Packed address bytes plus a 2-byte port: 7 bytes for IPv4, 19 for IPv6."""
+    port_bytes = port.to_bytes(2, "big")
+    if ":" in host:
+        return _IPV6_TAG + socket.inet_pton(socket.AF_INET6, host) + port_bytes
+    try:
+        return _IPV4_TAG + socket.inet_pton(socket.AF_INET, host) + port_bytes
+    except OSError:
+        return _NAME_TAG + host.encode() + port_bytes
+
+
+def normalize_proxy(proxy: Dict) -> Optional[Dict]:
+    """Normalize host, port and credentials in place; None if the entry is unusable."""
+    host = normalize_host(str(proxy["ip"]))
+    try:
+        port = int(str(proxy["port"]).strip())
+    except ValueError:
+        return None
+    if host is None or not 0 < port <= 65535:
+        return None
+
+    proxy["ip"] = host
+    proxy["port"] = str(port)
+    for field in ("username", "password"):
+        value = proxy.get(field)
+        proxy[field] = (value.strip() or None) if isinstance(value, str) else value
+    return proxy
+
+
+def credentials_key(proxy: Dict) -> bytes:
+    """Empty without credentials, else an 8-byte digest of them, so indexes stay small."""
+    username, password = proxy.get("username"), proxy.get("password")
+    if not (username or password):
+        return b""
+    return hashlib.blake2b(f"{username or ''}\0{password or ''}".encode(), digest_size=8).digest()
+
+
+class ProxyIndex:
+    """Deduplicates proxies by endpoint (packed IP + port) and credentials as they stream past.
+
+    Only the packed keys are kept, 7-19 bytes per endpoint plus 8 for
+    credentials, never the proxy dicts. The first entry per key passes
+    through untouched; the same endpoint with other credentials is a
+    separate candidate, since the login can decide whether it works.
+    ``dropped`` counts duplicates and ``invalid`` counts entries that
+    could not be normalized.
+    """
+
+    def __init__(self):
+        self._keys: set = set()
+        self.dropped = 0
+        self.invalid = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, proxy: Dict) -> bool:
+        host = normalize_host(str(proxy["ip"]))
+        return host is not None and endpoint_key(host, int(proxy["port"])) + credentials_key(proxy) in self._keys
+
+    def add(self, proxy: Dict) -> bool:
+        """Normalize and index ``proxy``; True if it is new, False if it is a duplicate or invalid."""
+        if normalize_proxy(proxy) is None:
+            self.invalid += 1
+            return False
+
+        key = endpoint_key(proxy["ip"], int(proxy["port"])) + credentials_key(proxy)
+        if key in self._keys:
+            self.dropped += 1
+            return False
+        self._keys.add(key)
+        return True
+
+    def dedup(self, proxies: Iterable[Dict]) -> Iterator[Dict]:
+        """Yield each new proxy from ``proxies`` once, as it arrives."""
+        for proxy in proxies:
+            if self.add(proxy):
+                yield proxy
+
+
+def iter_unique_proxies(file_paths: Iterable[str], index: Optional[ProxyIndex] = None) -> Iterator[Dict]:
+    """Stream proxies from several files, each endpoint once across all of them."""
+    index = index if index is not None else ProxyIndex()
+    for file_path in file_paths:
+        yield from index.dedup(iter_proxies(file_path))
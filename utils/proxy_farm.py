@@ -0,0 +1,361 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import socket
+import struct
+import time
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+# A local stand-in for httpbin.org/ip (the "judge") plus fake HTTP/SOCKS4/SOCKS5
+# proxies that relay to it. Used to test and benchmark the checker offline:
+#
+#     python -m utils.proxy_farm --http 10 --socks5 10 --socks4 10 --latency 0.05
+#
+# then point the checker at the printed judge URL with PROXY_JUDGE_URL.
+# AbuseIPDBStub stands in for the AbuseIPDB API the same way.
+
+JUDGE_PATH = "/ip"
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _relay(client_reader, client_writer, host: str, port: int,
+                 initial: bytes = b"") -> bool:
+    try:
+        upstream_reader, upstream_writer = await asyncio.open_connection(host, port)
+    except OSError:
+        return False
+    if initial:
+        upstream_writer.write(initial)
+    await asyncio.gather(
+        _pipe(client_reader, upstream_writer),
+        _pipe(upstream_reader, client_writer),
+    )
+    return True
+
+
+async def _handle_judge(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    peer = writer.get_extra_info("peername") or ("127.0.0.1", 0)
+    body = json.dumps({"origin": peer[0]}).encode()
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            keep_alive = b"connection: close" not in head.lower()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: application/json\r\n"
+                + f"Content-Length: {len(body)}\r\n".encode()
+                + (b"\r\n" if keep_alive else b"Connection: close\r\n\r\n")
+                + body
+            )
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _handle_http_proxy(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+        method, target = head.split(b" ", 2)[:2]
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+        writer.close()
+        return
+
+    if method == b"CONNECT":
+        host, _, port = target.decode().rpartition(":")
+        writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+        if not await _relay(reader, writer, host, int(port)):
+            writer.close()
+        return
+
+    # Absolute-form request: forward it untouched, the judge accepts that form too.
+    authority = target.decode().split("://", 1)[-1].split("/", 1)[0]
+    host, _, port = authority.partition(":")
+    if not await _relay(reader, writer, host, int(port or 80), head):
+        writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+        writer.close()
+
+
+async def _handle_socks5(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        version, nmethods = await reader.readexactly(2)
+        if version != 0x05:
+            writer.close()
+            return
+        methods = await reader.readexactly(nmethods)
+        if 0x02 in methods:
+            writer.write(b"\x05\x02")
+            _, ulen = await reader.readexactly(2)
+            await reader.readexactly(ulen)
+            plen = (await reader.readexactly(1))[0]
+            await reader.readexactly(plen)
+            writer.write(b"\x01\x00")
+        else:
+            writer.write(b"\x05\x00")
+
+        _, cmd, _, atyp = await reader.readexactly(4)
+        if atyp == 0x01:
+            host = socket.inet_ntoa(await reader.readexactly(4))
+        elif atyp == 0x04:
+            host = socket.inet_ntop(socket.AF_INET6, await reader.readexactly(16))
+        else:
+            length = (await reader.readexactly(1))[0]
+            host = (await reader.readexactly(length)).decode()
+        port = struct.unpack("!H", await reader.readexactly(2))[0]
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        writer.close()
+        return
+
+    writer.write(b"\x05\x00\x00\x01\x00\x00\x00\x00\x00\x00")
+    if not await _relay(reader, writer, host, port):
+        writer.close()
+
+
+async def _handle_socks4(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        version, cmd = await reader.readexactly(2)
+        if version != 0x04:
+            writer.close()
+            return
+        port = struct.unpack("!H", await reader.readexactly(2))[0]
+        ip = await reader.readexactly(4)
+        await reader.readuntil(b"\x00")  # user id
+        if ip[:3] == b"\x00\x00\x00" and ip[3] != 0:
+            # SOCKS4a: the hostname follows the user id
+            host = (await reader.readuntil(b"\x00"))[:-1].decode()
+        else:
+            host = socket.inet_ntoa(ip)
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+        writer.close()
+        return
+
+    writer.write(b"\x00\x5a" + b"\x00" * 6)
+    if not await _relay(reader, writer, host, port):
+        writer.close()
+
+
+class AbuseIPDBStub:
+    """Stand-in for the AbuseIPDB ``check`` and ``blacklist`` endpoints.
+
+    ``scores`` maps IPs to confidence scores (unknown IPs score 0). After
+    ``quota`` requests every call gets a 429 with ``Retry-After``, and each
+    response carries ``X-RateLimit-*`` headers like the real API.
+    """
+
+    def __init__(self, scores: Dict[str, int], quota: int = 1000, retry_after: int = 1):
+        self.scores = scores
+        self.quota = quota
+        self.retry_after = retry_after
+        self.requests = 0
+
+    def _respond(self, writer, status: str, payload: Optional[Dict], extra: Dict[str, str]):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        headers = "".join(f"{name}: {value}\r\n" for name, value in extra.items())
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n{headers}\r\n".encode() + body)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                target = urlsplit(head.split(b" ", 2)[1].decode())
+                query = dict(parse_qsl(target.query))
+                self.requests += 1
+                remaining = max(0, self.quota - self.requests)
+                limits = {
+                    "X-RateLimit-Limit": str(self.quota),
+                    "X-RateLimit-Remaining": str(remaining),
+                    "X-RateLimit-Reset": str(int(time.time()) + self.retry_after),
+                }
+                if self.requests > self.quota:
+                    self._respond(writer, "429 Too Many Requests", {"errors": [{"detail": "quota"}]},
+                                  {**limits, "Retry-After": str(self.retry_after)})
+                elif target.path.endswith("/blacklist"):
+                    minimum = int(query.get("confidenceMinimum", 100))
+                    data = [{"ipAddress": ip, "abuseConfidenceScore": score}
+                            for ip, score in self.scores.items() if score >= minimum]
+                    self._respond(writer, "200 OK", {"data": data[:int(query.get("limit", 10000))]}, limits)
+                else:
+                    ip = query.get("ipAddress", "")
+                    self._respond(writer, "200 OK",
+                                  {"data": {"ipAddress": ip, "abuseConfidenceScore": self.scores.get(ip, 0)}},
+                                  limits)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, IndexError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        """Serve the stub; point ``ABUSEIPDB_API_URL``/``ABUSEIPDB_BLACKLIST_URL`` at it."""
+        return await asyncio.start_server(self.handle, host, port)
+
+
+_HANDLERS = {
+    "HTTP": _handle_http_proxy,
+    "SOCKS5": _handle_socks5,
+    "SOCKS4": _handle_socks4,
+}
+
+
+def _tracked(handler, tasks: Optional[set]):
+    if tasks is None:
+        return handler
+
+    async def run(reader, writer):
+        task = asyncio.current_task()
+        tasks.add(task)
+        try:
+            await handler(reader, writer)
+        except asyncio.CancelledError:
+            # Cancelled by ProxyFarm.stop(); end quietly so asyncio doesn't log it.
+            writer.close()
+        finally:
+            tasks.discard(task)
+
+    return run
+
+
+def _simulated(handler, latency: float, drop_rate: float, rng: random.Random):
+    """Wrap a proxy handler so it drops a share of connections and answers late."""
+    if not latency and not drop_rate:
+        return handler
+
+    async def run(reader, writer):
+        if drop_rate and rng.random() < drop_rate:
+            writer.close()
+            return
+        if latency:
+            await asyncio.sleep(latency)
+        await handler(reader, writer)
+
+    return run
+
+
+async def start_judge_server(host: str = "127.0.0.1", port: int = 0,
+                             tasks: Optional[set] = None) -> asyncio.AbstractServer:
+    return await asyncio.start_server(_tracked(_handle_judge, tasks), host, port, backlog=1024)
+
+
+async def start_fake_proxy(protocol: str, host: str = "127.0.0.1", port: int = 0,
+                           tasks: Optional[set] = None, latency: float = 0.0,
+                           drop_rate: float = 0.0,
+                           rng: Optional[random.Random] = None) -> asyncio.AbstractServer:
+    handler = _simulated(_HANDLERS[protocol.upper()], latency, drop_rate, rng or random.Random())
+    return await asyncio.start_server(_tracked(handler, tasks), host, port, backlog=1024)
+
+
+def server_port(server: asyncio.AbstractServer) -> int:
+    return server.sockets[0].getsockname()[1]
+
+
+class ProxyFarm:
+    """Starts a judge server and ``count`` fake proxies per protocol on localhost.
+
+    ``latency`` (seconds) delays every accepted connection before the
+    handshake; ``drop_rate`` is the share of connections closed on accept.
+
+    Usage:
+        async with ProxyFarm({"HTTP": 10, "SOCKS5": 10}) as farm:
+            proxy_checker.TEST_URL = farm.judge_url
+            await check_all_proxies(farm.proxies)
+    """
+
+    def __init__(self, counts: Dict[str, int], host: str = "127.0.0.1",
+                 latency: float = 0.0, drop_rate: float = 0.0, seed: Optional[int] = None):
+        self.counts = counts
+        self.host = host
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.rng = random.Random(seed)
+        self.judge: Optional[asyncio.AbstractServer] = None
+        self.servers: List[asyncio.AbstractServer] = []
+        self.proxies: List[Dict] = []
+        self._tasks: set = set()
+
+    @property
+    def judge_url(self) -> str:
+        return f"http://{self.host}:{server_port(self.judge)}{JUDGE_PATH}"
+
+    def sample_proxies(self, total: int) -> List[Dict]:
+        """``total`` proxy entries cycling over the farm, for lists larger than the farm."""
+        return [dict(proxy) for proxy in itertools.islice(itertools.cycle(self.proxies), total)]
+
+    async def start(self):
+        self.judge = await start_judge_server(self.host, tasks=self._tasks)
+        for protocol, count in self.counts.items():
+            for _ in range(count):
+                server = await start_fake_proxy(protocol, self.host, tasks=self._tasks,
+                                                latency=self.latency, drop_rate=self.drop_rate,
+                                                rng=self.rng)
+                self.servers.append(server)
+                self.proxies.append({
+                    "ip": self.host,
+                    "port": str(server_port(server)),
+                    "username": None,
+                    "password": None,
+                    "expected_type": protocol.upper(),
+                })
+        return self
+
+    async def stop(self):
+        for server in [self.judge, *self.servers]:
+            if server is not None:
+                server.close()
+        # Connections still open (e.g. idle keep-alives) would otherwise be
+        # torn down noisily when the event loop shuts down.
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.servers.clear()
+        self.proxies.clear()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+
+async def _serve(args):
+    counts = {"HTTP": args.http, "SOCKS5": args.socks5, "SOCKS4": args.socks4}
+    async with ProxyFarm(counts, args.host, args.latency, args.drop_rate, args.seed) as farm:
+        print(f"Judge: {farm.judge_url}")
+        for proxy in farm.proxies:
+            print(f"{proxy['expected_type']:<6} {proxy['ip']}:{proxy['port']}")
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local judge and fake proxy farm.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--http", type=int, default=0)
+    parser.add_argument("--socks5", type=int, default=0)
+    parser.add_argument("--socks4", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added per connection")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="share of connections dropped")
+    parser.add_argument("--seed", type=int)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,311 @@
+import math
+import socket
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Every key the loader, checker and enricher put on a proxy gets a slot;
+# anything else (e.g. the fake farm's "expected_type") lands in ``extra``.
+PROXY_FIELDS = (
+    "ip", "port", "username", "password", "type",
+    "speed", "connect_ms", "ttfb_ms", "total_ms",
+    "country", "country_code", "city", "is_abused", "abuse_score",
+)
+_FIELD_SET = frozenset(PROXY_FIELDS)
+_ENDPOINT_FIELDS = frozenset(("ip", "port"))
+_SPARSE_FIELDS = _FIELD_SET - _ENDPOINT_FIELDS
+
+
+class Proxy:
+    """Slotted proxy record that behaves like the plain proxy dicts.
+
+    ``proxy["ip"]``, ``proxy.get("speed")``, ``proxy.update(...)``, ``in``,
+    ``keys()``/``items()`` and ``dict(proxy)`` all work, so code written
+    against dicts keeps working. A key that was never set is missing, just
+    like with a dict, and ``get`` falls back to its default. Equality
+    compares every field, as it would between the dicts; ``key()`` is the
+    endpoint and credentials, for when identity is all that matters.
+    """
+
+    __slots__ = PROXY_FIELDS + ("extra",)
+
+    def __init__(self, ip: str, port, username: Optional[str] = None,
+                 password: Optional[str] = None, **fields):
+        self.ip = ip
+        self.port = str(port)
+        self.username = username
+        self.password = password
+        self.extra: Optional[Dict] = None
+        if fields:
+            self.update(fields)
+
+    @classmethod
+    def from_dict(cls, data) -> "Proxy":
+        if isinstance(data, cls):
+            return data
+        proxy = cls(data["ip"], data["port"])
+        for key, value in data.items():
+            if key in _SPARSE_FIELDS:
+                setattr(proxy, key, value)
+            elif key not in _ENDPOINT_FIELDS:
+                proxy[key] = value
+        return proxy
+
+    def to_dict(self) -> Dict:
+        return dict(self.items())
+
+    def __getitem__(self, key: str):
+        if key in _FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value):
+        if key in _FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key: str):
+        if key in _FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self.extra and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key) -> bool:
+        if key in _FIELD_SET:
+            return hasattr(self, key)
+        return bool(self.extra) and key in self.extra
+
+    def get(self, key: str, default=None):
+        if key in _FIELD_SET:
+            return getattr(self, key, default)
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+
+    def setdefault(self, key: str, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key: str, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def update(self, other=(), **fields):
+        items = other.items() if hasattr(other, "items") else other
+        for key, value in items:
+            self[key] = value
+        for key, value in fields.items():
+            self[key] = value
+
+    def keys(self) -> List[str]:
+        keys = [field for field in PROXY_FIELDS if hasattr(self, field)]
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def values(self) -> List:
+        return [self[key] for key in self.keys()]
+
+    def items(self) -> List:
+        return [(key, self[key]) for key in self.keys()]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def copy(self) -> "Proxy":
+        """Shallow copy, like ``dict.copy``."""
+        return Proxy.from_dict(self.to_dict())
+
+    def key(self) -> Tuple[str, str, Optional[str], Optional[str]]:
+        return self.ip, self.port, self.get("username"), self.get("password")
+
+    def __eq__(self, other) -> bool:
+        if self is other:
+            return True
+        if isinstance(other, (Proxy, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None  # Mutable, like the dicts it replaces
+
+    def __getstate__(self):
+        return self.items()
+
+    def __setstate__(self, state):
+        self.extra = None
+        self.update(state)
+
+    def __repr__(self) -> str:
+        return f"Proxy({self.to_dict()!r})"
+
+
+# Row layout of ProxyColumns: 16-byte address (IPv4 is stored IPv4-mapped),
+# a uint16 port, a float32 speed (NaN = untested) and a one-byte type code.
+_ADDRESS_SIZE = 16
+_NO_ADDRESS = bytes(_ADDRESS_SIZE)
+_IPV4_PREFIX = bytes(10) + b"\xff\xff"
+TYPE_CODES = {None: 0, "HTTP": 1, "SOCKS5": 2, "SOCKS4": 3}
+_TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+
+def pack_address(host: str) -> Optional[bytes]:
+    """16 packed bytes for an IPv4/IPv6 address, or None for a hostname."""
+    try:
+        return _IPV4_PREFIX + socket.inet_pton(socket.AF_INET, host)
+    except OSError:
+        pass
+    try:
+        return socket.inet_pton(socket.AF_INET6, host)
+    except OSError:
+        return None
+
+
+def unpack_address(packed: bytes) -> str:
+    if packed[:12] == _IPV4_PREFIX:
+        return socket.inet_ntop(socket.AF_INET, packed[12:])
+    return socket.inet_ntop(socket.AF_INET6, packed)
+
+
+_COLUMN_FIELDS = frozenset(("ip", "port", "speed", "type"))
+
+
+def _details(proxy) -> Dict:
+    """The fields of ``proxy`` that don't have a column of their own."""
+    return {key: value for key, value in proxy.items()
+            if value is not None and key not in _COLUMN_FIELDS}
+
+
+class ProxyColumns:
+    """Column store for very large proxy lists: addresses, ports, speeds and types in packed arrays.
+
+    A row costs about 23 bytes instead of a few hundred for a dict or
+    ``Proxy``. Hostnames and the sparse fields (credentials, timings,
+    geolocation) live in side tables keyed by row. Indexing or iterating
+    materializes ``Proxy`` records; those are copies, so write results back
+    with ``set_speed``/``set_type`` (or ``update_row``).
+    """
+
+    def __init__(self, proxies: Iterable = ()):
+        self.addresses = bytearray()
+        self.ports = array("H")
+        self.speeds = array("f")
+        self.types = bytearray()
+        self.hostnames: Dict[int, str] = {}
+        self.details: Dict[int, Dict] = {}
+        self.extend(proxies)
+
+    def __len__(self) -> int:
+        return len(self.ports)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the packed columns (side tables not included)."""
+        return (len(self.addresses) + self.ports.itemsize * len(self.ports)
+                + self.speeds.itemsize * len(self.speeds) + len(self.types))
+
+    def append(self, proxy) -> int:
+        """Add a proxy (dict or ``Proxy``) and return its row number."""
+        row = len(self.ports)
+        packed = pack_address(proxy["ip"])
+        if packed is None:
+            self.hostnames[row] = proxy["ip"]
+            packed = _NO_ADDRESS
+        self.addresses += packed
+        self.ports.append(int(proxy["port"]))
+        speed = proxy.get("speed")
+        self.speeds.append(math.nan if speed is None else speed)
+        self.types.append(TYPE_CODES.get(proxy.get("type"), 0))
+
+        details = _details(proxy)
+        if details:
+            self.details[row] = details
+        return row
+
+    def extend(self, proxies: Iterable):
+        for proxy in proxies:
+            self.append(proxy)
+
+    def host(self, row: int) -> str:
+        hostname = self.hostnames.get(row)
+        if hostname is not None:
+            return hostname
+        offset = row * _ADDRESS_SIZE
+        return unpack_address(bytes(self.addresses[offset:offset + _ADDRESS_SIZE]))
+
+    def speed(self, row: int) -> Optional[float]:
+        speed = self.speeds[row]
+        return None if math.isnan(speed) else speed
+
+    def set_speed(self, row: int, speed: Optional[float]):
+        self.speeds[row] = math.nan if speed is None else speed
+
+    def proxy_type(self, row: int) -> Optional[str]:
+        return _TYPE_NAMES[self.types[row]]
+
+    def set_type(self, row: int, proxy_type: Optional[str]):
+        self.types[row] = TYPE_CODES.get(proxy_type, 0)
+
+    def update_row(self, row: int, proxy):
+        """Copy check/enrichment results from a materialized ``proxy`` back into ``row``."""
+        self.set_speed(row, proxy.get("speed"))
+        self.set_type(row, proxy.get("type"))
+        details = _details(proxy)
+        if details:
+            self.details[row] = details
+        else:
+            self.details.pop(row, None)
+
+    def __getitem__(self, row: int) -> Proxy:
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        proxy = Proxy(self.host(row), self.ports[row])
+        proxy_type = self.proxy_type(row)
+        if proxy_type is not None:
+            proxy.type = proxy_type
+        speed = self.speed(row)
+        if speed is not None:
+            proxy.speed = speed
+        details = self.details.get(row)
+        if details:
+            proxy.update(details)
+        return proxy
+
+    def __iter__(self) -> Iterator[Proxy]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def rows_by_type(self, proxy_type: Optional[str]) -> List[int]:
+        code = TYPE_CODES.get(proxy_type, 0)
+        return [row for row, row_code in enumerate(self.types) if row_code == code]
+
+    def fastest(self, count: int, proxy_type: Optional[str] = None) -> List[int]:
+        """Rows of the ``count`` fastest tested proxies, optionally of one type."""
+        rows = range(len(self)) if proxy_type is None else self.rows_by_type(proxy_type)
+        speeds = self.speeds
+        tested = [row for row in rows if not math.isnan(speeds[row])]
+        tested.sort(key=speeds.__getitem__)
+        return tested[:count]
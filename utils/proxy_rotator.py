@@ -1,22 +1,74 @@
 import time
-import random
 import threading
 import asyncio
-from proxy_checker import test_proxy_speed 
+from typing import Dict, List, Optional
+
+from proxy_checker import ProxySessionManager, test_proxy_speed
+from utils.circuit_breaker import CLOSED, OPEN, BreakerBoard
+from utils.passive_health import EJECT, HealthTracker, is_failure
+from utils.selection import make_strategy
+
+DEFAULT_SESSION = "__default__"  # Session behind the single-consumer get_next_proxy()
+SESSION_IDLE_TIMEOUT = 600  # Seconds before an unused sticky session is forgotten
+LOCK_STRIPES = 64  # Session locks; sessions hash onto one of these
+MONITOR_INTERVAL = 10  # Seconds between health checks of leased proxies
+EXCLUSIVE_ATTEMPTS = 8  # Draws tried to find a proxy no other session holds
+
+
+class ProxyLease:
+    """One session's hold on a proxy, renewed until it is used up, expires or goes bad."""
+
+    __slots__ = ("session_id", "proxy", "proxy_type", "uses", "started", "last_used", "stale")
+
+    def __init__(self, session_id, proxy: Dict, proxy_type: str, now: float):
+        self.session_id = session_id
+        self.proxy = proxy
+        self.proxy_type = proxy_type
+        self.uses = 0
+        self.started = now
+        self.last_used = now
+        self.stale = False
+
 
 class ProxyRotator:
+    """Hands out proxies per session and rotates on a timer, after ``max_uses`` or when one gets slow.
+
+    Each caller-provided session ID gets a sticky lease on one proxy, so
+    many threads or scrapers can each keep their own proxy. Sessions are
+    guarded by striped locks, and the selection strategy by one lock held
+    only for the O(log n) pick. The health monitor never holds a lock while
+    testing proxies. ``get_next_proxy`` keeps the old single-consumer
+    behavior on a default session.
+
+    ``strategy`` picks the next proxy: "random" (default), "weighted"
+    (by inverse latency), "p2c" (power of two choices), "lru" or "ewma".
+    See utils/selection.py.
+
+    Outcomes passed to ``report`` drive a per-proxy circuit breaker
+    (``self.breakers``): an open circuit takes the proxy out of selection,
+    and after a cool-down it comes back half-open for trial requests.
+    """
+
     def __init__(self, categorized_proxies, interval_seconds=60, max_uses=10,
-                 speed_threshold_ms=3000, use_relative_threshold=False):
+                 speed_threshold_ms=3000, use_relative_threshold=False, strategy="random",
+                 session_idle_timeout=SESSION_IDLE_TIMEOUT):
         self.categorized = categorized_proxies
         self.interval = interval_seconds
         self.max_uses = max_uses
         self.speed_threshold = speed_threshold_ms
         self.use_relative = use_relative_threshold
+        self.session_idle_timeout = session_idle_timeout
+        self.strategy_name = strategy
+        self.strategies = {}
+        make_strategy(strategy)  # Fail early on a bad name
 
-        self.current_proxy = None
-        self.usage_count = 0
-        self.last_rotation_time = 0
-        self.lock = threading.Lock()
+        self.lock = threading.Lock()  # Guards the strategies and lease counts
+        self._session_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._sessions: Dict[object, ProxyLease] = {}
+        self._lease_counts: Dict[int, int] = {}
+        self.health = HealthTracker()
+        self.breakers = BreakerBoard(pool_size=self.pool_size)
+        self._ejected_proxies: Dict[int, tuple] = {}  # id(proxy) -> (proxy, proxy_type)
 
         self.average_speed = self.calculate_average_speed()
         self.monitoring = False
@@ -38,41 +90,259 @@ class ProxyRotator:
         else:
             return proxy_speed > self.speed_threshold
 
+    # --- Single-consumer API -------------------------------------------------
+
     def get_next_proxy(self, proxy_type="SOCKS5", current_speed=None):
-        with self.lock:
+        self.proxy_type = proxy_type.upper()
+        return self._acquire(DEFAULT_SESSION, proxy_type, current_speed)
+
+    @property
+    def current_proxy(self):
+        lease = self._sessions.get(DEFAULT_SESSION)
+        return lease.proxy if lease else None
+
+    @property
+    def usage_count(self):
+        lease = self._sessions.get(DEFAULT_SESSION)
+        return lease.uses if lease else 0
+
+    @property
+    def last_rotation_time(self):
+        lease = self._sessions.get(DEFAULT_SESSION)
+        return lease.started if lease else 0
+
+    # --- Sessions ------------------------------------------------------------
+
+    def _session_lock(self, session_id) -> threading.Lock:
+        return self._session_locks[hash(session_id) % LOCK_STRIPES]
+
+    def acquire(self, session_id=None, proxy_type="SOCKS5", current_speed=None, exclusive=False) -> Optional[Dict]:
+        """Proxy for ``session_id``, sticky until the lease needs rotating.
+
+        Without a session ID every call is an independent pick.
+        ``current_speed`` (ms) reported by the caller can trigger rotation;
+        ``exclusive`` prefers proxies no other session is holding.
+        """
+        return self._acquire(session_id, proxy_type, current_speed, exclusive)
+
+    def _acquire(self, session_id, proxy_type, current_speed=None, exclusive=False) -> Optional[Dict]:
+        proxy_type = proxy_type.upper()
+        if session_id is None:
             now = time.time()
-            self.proxy_type = proxy_type.upper()
-            proxies = self.categorized.get(self.proxy_type, [])
+            with self.lock:
+                self._reinstate_due(now)
+                strategy = self._strategy(proxy_type)
+                for _ in range(EXCLUSIVE_ATTEMPTS):
+                    proxy = strategy.select()
+                    if proxy is None or self.breakers.allow(proxy, now):
+                        return proxy
+                # Every draw was refused by its breaker (half-open, no trial slot left)
+                return None
+
+        with self._session_lock(session_id):
+            now = time.time()
+            lease = self._sessions.get(session_id)
+            if lease is None or self._should_rotate(lease, proxy_type, now, current_speed):
+                lease = self._renew(session_id, lease, proxy_type, now, exclusive)
+                if lease is None:
+                    return None
+            lease.uses += 1
+            lease.last_used = now
+            return lease.proxy
+
+    def rotate(self, session_id=DEFAULT_SESSION):
+        """Force a new proxy on the next ``acquire`` for ``session_id`` (e.g. after a failure)."""
+        lease = self._sessions.get(session_id)
+        if lease is not None:
+            lease.stale = True
+
+    def end_session(self, session_id=DEFAULT_SESSION):
+        """End the sticky session; its proxy is no longer counted as leased."""
+        with self._session_lock(session_id):
+            lease = self._sessions.pop(session_id, None)
+            if lease is not None:
+                with self.lock:
+                    self._count_lease(lease.proxy, -1)
 
-            if not proxies:
+    def session_proxy(self, session_id) -> Optional[Dict]:
+        lease = self._sessions.get(session_id)
+        return lease.proxy if lease else None
+
+    def active_sessions(self) -> int:
+        return len(self._sessions)
+
+    def prune_sessions(self, now: Optional[float] = None) -> int:
+        """Forget sessions idle for longer than ``session_idle_timeout``."""
+        now = now or time.time()
+        pruned = 0
+        for session_id, lease in list(self._sessions.items()):
+            if now - lease.last_used < self.session_idle_timeout:
+                continue
+            with self._session_lock(session_id):
+                current = self._sessions.get(session_id)
+                if current is lease and now - lease.last_used >= self.session_idle_timeout:
+                    del self._sessions[session_id]
+                    with self.lock:
+                        self._count_lease(lease.proxy, -1)
+                    pruned += 1
+        return pruned
+
+    def _should_rotate(self, lease: ProxyLease, proxy_type: str, now: float, current_speed) -> bool:
+        strategy = self.strategies.get(proxy_type)
+        return (
+            lease.stale or
+            lease.proxy_type != proxy_type or
+            lease.uses >= self.max_uses or
+            now - lease.started >= self.interval or
+            (current_speed is not None and self.needs_rotation(current_speed)) or
+            strategy is None or
+            lease.proxy not in strategy  # Dropped from the pool meanwhile
+        )
+
+    def _renew(self, session_id, lease: Optional[ProxyLease], proxy_type: str, now: float,
+               exclusive: bool) -> Optional[ProxyLease]:
+        previous = lease.proxy if lease else None
+        with self.lock:
+            self._reinstate_due(now)
+            strategy = self._strategy(proxy_type)
+            proxy = fallback = None
+            for _ in range(EXCLUSIVE_ATTEMPTS):
+                candidate = strategy.select(exclude=previous)
+                if candidate is None:
+                    break
+                if exclusive and self._lease_counts.get(id(candidate)):
+                    # Shared, so only worth keeping if it needs no trial slot
+                    if fallback is None and self.breakers.state(candidate) == CLOSED:
+                        fallback = candidate
+                    continue
+                # Last, since a half-open proxy spends a trial slot on a True answer
+                if self.breakers.allow(candidate, now):
+                    proxy = candidate
+                    break
+            proxy = proxy or fallback
+            if previous is not None:
+                self._count_lease(previous, -1)
+            if proxy is None:
+                self._sessions.pop(session_id, None)
                 return None
+            self._count_lease(proxy, 1)
+
+        renewed = ProxyLease(session_id, proxy, proxy_type, now)
+        self._sessions[session_id] = renewed
+        return renewed
+
+    def _count_lease(self, proxy: Dict, delta: int):
+        key = id(proxy)
+        count = self._lease_counts.get(key, 0) + delta
+        if count > 0:
+            self._lease_counts[key] = count
+        else:
+            self._lease_counts.pop(key, None)
+
+    def _expire_proxy(self, proxy: Dict):
+        """Make every session holding ``proxy`` rotate on its next acquire."""
+        for lease in list(self._sessions.values()):
+            if lease.proxy is proxy:
+                lease.stale = True
 
-            should_rotate = (
-                self.current_proxy is None or
-                self.usage_count >= self.max_uses or
-                now - self.last_rotation_time >= self.interval or
-                (current_speed is not None and self.needs_rotation(current_speed))
-            )
+    # --- Strategies ----------------------------------------------------------
 
-            if should_rotate:
-                self._rotate_proxy()
+    def _strategy(self, proxy_type):
+        strategy = self.strategies.get(proxy_type)
+        if strategy is None:
+            strategy = make_strategy(self.strategy_name, self.categorized.get(proxy_type, []))
+            self.strategies[proxy_type] = strategy
+        return strategy
 
-            self.usage_count += 1
-            return self.current_proxy
+    def report_latency(self, proxy, latency_ms, proxy_type=None):
+        """Feed a measured latency into the selection strategy."""
+        with self.lock:
+            self._strategy((proxy_type or self.proxy_type).upper()).update(proxy, latency_ms)
+
+    def report(self, proxy, latency_ms=None, ok=None, status=None, bytes_received=0,
+               error=None, proxy_type=None) -> str:
+        """Record the outcome of a real request made through ``proxy``.
+
+        ``error`` is a short class such as "connect", "timeout" or "reset";
+        ``ok`` overrides the guess made from ``status``/``error``. Flaky or
+        slow proxies are picked less often, and one that keeps failing is
+        ejected from the pool at once and its sessions move elsewhere.
+        Returns the HealthTracker verdict.
+        """
+        with self.lock:
+            verdict = self.health.record(proxy, latency_ms, ok, status, bytes_received, error)
+            if is_failure(ok, status, error):
+                state = self.breakers.record_failure(proxy)
+            else:
+                state = self.breakers.record_success(proxy)
+            if verdict == EJECT:
+                state = self.breakers.trip(proxy)
+
+            proxy_type = (proxy_type or self._type_of(proxy) or self.proxy_type).upper()
+            if state == OPEN:
+                self._eject(proxy, proxy_type)
+            else:
+                if self._ejected_proxies.pop(id(proxy), None) is not None:
+                    # Trials elsewhere (e.g. a tunnel sharing the board) closed its circuit
+                    self._strategy(proxy_type).add(proxy)
+                effective = self.health.get(proxy).effective_latency()
+                if effective is not None:
+                    # Already an EWMA; smoothing it again would only add lag
+                    self._strategy(proxy_type).update(proxy, effective, smoothed=True)
+        if state == OPEN:
+            self._expire_proxy(proxy)
+        return verdict
 
-    def _rotate_proxy(self):
-        proxies = self.categorized.get(self.proxy_type, [])
-        if not proxies:
-            self.current_proxy = None
+    def _type_of(self, proxy) -> Optional[str]:
+        for proxy_type, strategy in self.strategies.items():
+            if proxy in strategy:
+                return proxy_type
+        ejected = self._ejected_proxies.get(id(proxy))
+        return ejected[1] if ejected else None
+
+    def pool_size(self) -> int:
+        """Proxies in selection plus those currently ejected."""
+        return sum(len(strategy) for strategy in self.strategies.values()) + len(self._ejected_proxies)
+
+    def _eject(self, proxy, proxy_type):
+        if id(proxy) in self._ejected_proxies:
             return
+        self._strategy(proxy_type).remove(proxy)
+        self._ejected_proxies[id(proxy)] = (proxy, proxy_type)
 
-        available = [p for p in proxies if p != self.current_proxy]
-        if not available:
-            available = proxies
+    def _reinstate_due(self, now):
+        # Cool-down over: back into selection, half-open until trials succeed
+        for proxy in self.breakers.due_for_trial(now):
+            entry = self._ejected_proxies.pop(id(proxy), None)
+            if entry is not None:
+                self._strategy(entry[1]).add(proxy)
 
-        self.current_proxy = random.choice(available)
-        self.last_rotation_time = time.time()
-        self.usage_count = 0
+    def on_check_result(self, result):
+        """Keep the strategies in step with a (re)validation result, e.g. from RevalidationScheduler."""
+        proxy = result["proxy"]
+        new_type = result.get("type")
+        with self.lock:
+            for proxy_type, strategy in self.strategies.items():
+                if proxy_type != new_type:
+                    strategy.remove(proxy)
+            ejected = self._ejected_proxies.get(id(proxy))
+            if ejected is not None:
+                # Passing a synthetic check doesn't cut an ejection short
+                if new_type:
+                    self._ejected_proxies[id(proxy)] = (proxy, new_type)
+                else:
+                    del self._ejected_proxies[id(proxy)]
+                    self.breakers.forget(proxy)
+            elif new_type:
+                strategy = self._strategy(new_type)
+                if proxy in strategy:
+                    strategy.update(proxy, result.get("speed"))
+                else:
+                    strategy.add(proxy)
+        if not new_type:
+            self._expire_proxy(proxy)
+
+    # --- Health monitor ------------------------------------------------------
 
     def start_monitoring(self, proxy_type="SOCKS5"):
         self.proxy_type = proxy_type.upper()
@@ -85,17 +355,152 @@ class ProxyRotator:
 
     def _monitor_loop(self):
         while self.monitoring:
-            time.sleep(10)
+            time.sleep(MONITOR_INTERVAL)
             try:
-                with self.lock:
-                    current = self.current_proxy
-                    if not current:
-                        continue
-                    speed = asyncio.run(test_proxy_speed(current, self.proxy_type))
-                    if speed is None:
-                        continue
-                    if self.needs_rotation(speed):
-                        print(f"[ProxyRotator] Speed too high ({speed}ms). Rotating proxy...")
-                        self._rotate_proxy()
+                self._monitor_once()
             except Exception as e:
                 print(f"[ProxyRotator] Monitor error: {e}")
+
+    def _monitor_once(self):
+        self.prune_sessions()
+        targets = self._leased_targets()
+        if targets:
+            self._apply_speeds(targets, asyncio.run(self._measure(targets)))
+
+    def _leased_targets(self) -> List:
+        # Snapshot the leased proxies so they can be tested without holding any lock
+        leased = {}
+        for lease in list(self._sessions.values()):
+            leased[id(lease.proxy)] = (lease.proxy, lease.proxy_type)
+        return list(leased.values())
+
+    def _apply_speeds(self, targets: List, speeds: List[Optional[float]]):
+        for (proxy, proxy_type), speed in zip(targets, speeds):
+            if speed is None:
+                continue
+            with self.lock:
+                self._strategy(proxy_type).update(proxy, speed)
+            if self.needs_rotation(speed):
+                print(f"[ProxyRotator] Speed too high ({speed}ms) for {proxy['ip']}:{proxy['port']}. Rotating...")
+                self._expire_proxy(proxy)
+
+    @staticmethod
+    async def _measure(targets: List, sessions: Optional[ProxySessionManager] = None) -> List[Optional[float]]:
+        if sessions is None:
+            async with ProxySessionManager(limit=len(targets)) as sessions:
+                return await asyncio.gather(*[test_proxy_speed(proxy, proxy_type, sessions)
+                                              for proxy, proxy_type in targets])
+        try:
+            return await asyncio.gather(*[test_proxy_speed(proxy, proxy_type, sessions)
+                                          for proxy, proxy_type in targets])
+        finally:
+            for proxy, _ in targets:
+                await sessions.release(proxy)
+
+
+class AsyncProxyRotator(ProxyRotator):
+    """ProxyRotator for asyncio code: ``await acquire()``, ``release_proxy()`` and a monitor task on the caller's loop.
+
+    Same sessions, leases and strategies as ``ProxyRotator``, with no
+    extra threads. The monitor reuses one ProxySessionManager for all its
+    checks instead of starting an event loop per check. ``acquire`` can
+    wait (up to ``timeout``) for a proxy to become available. ``release_proxy``
+    passes the request's outcome to ``report``, e.g.
+    ``{"latency_ms": 180, "status": 200, "bytes_received": 5120}`` or
+    ``{"error": "timeout"}``.
+    Use it from the event loop's thread only.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._in_flight: Dict[int, int] = {}
+        self._pool_changed: Optional[asyncio.Event] = None
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    async def acquire(self, session_id=None, proxy_type="SOCKS5", current_speed=None,
+                      exclusive=False, timeout: float = 0) -> Optional[Dict]:
+        """Like ``ProxyRotator.acquire``; waits up to ``timeout`` seconds if the pool is empty.
+
+        The wait ends early when a check result adds a proxy or an ejected
+        proxy's cool-down runs out.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            proxy = self._acquire(session_id, proxy_type, current_speed, exclusive)
+            if proxy is not None:
+                self._in_flight[id(proxy)] = self._in_flight.get(id(proxy), 0) + 1
+                return proxy
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            if self._pool_changed is None:
+                self._pool_changed = asyncio.Event()
+            self._pool_changed.clear()
+            # Also look again when an ejected proxy's cool-down ends
+            wait = remaining
+            trial_at = self.breakers.next_trial_at()
+            if trial_at is not None:
+                wait = min(wait, max(0.0, trial_at - time.time()) + 0.001)
+            try:
+                await asyncio.wait_for(self._pool_changed.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def release_proxy(self, proxy: Dict, result: Optional[Dict] = None, proxy_type=None):
+        """Hand ``proxy`` back, optionally with the outcome of the request made through it.
+
+        ``result`` takes the keyword arguments of ``report``. Returns its
+        verdict, or None without a result.
+        """
+        key = id(proxy)
+        count = self._in_flight.get(key, 0) - 1
+        if count > 0:
+            self._in_flight[key] = count
+        else:
+            self._in_flight.pop(key, None)
+
+        verdict = self.report(proxy, proxy_type=proxy_type, **result) if result else None
+        if self._pool_changed is not None:
+            self._pool_changed.set()  # An exclusive lease ended or a trial may have closed a circuit
+        return verdict
+
+    def in_flight(self, proxy: Dict) -> int:
+        """Requests currently running through ``proxy``."""
+        return self._in_flight.get(id(proxy), 0)
+
+    def on_check_result(self, result):
+        super().on_check_result(result)
+        if result.get("type") and self._pool_changed is not None:
+            self._pool_changed.set()
+
+    def start_monitoring(self, proxy_type="SOCKS5"):
+        self.proxy_type = proxy_type.upper()
+        self.monitoring = True
+        if self._monitor_task is None or self._monitor_task.done():
+            self._monitor_task = asyncio.get_running_loop().create_task(self._monitor())
+
+    async def stop_monitoring(self):
+        self.monitoring = False
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+            await asyncio.gather(self._monitor_task, return_exceptions=True)
+            self._monitor_task = None
+
+    async def _monitor(self):
+        async with ProxySessionManager() as sessions:
+            while self.monitoring:
+                await asyncio.sleep(MONITOR_INTERVAL)
+                try:
+                    self.prune_sessions()
+                    targets = self._leased_targets()
+                    if targets:
+                        self._apply_speeds(targets, await self._measure(targets, sessions))
+                except Exception as e:
+                    print(f"[AsyncProxyRotator] Monitor error: {e}")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop_monitoring()
@@ -1,4 +1,5 @@
 import os
+from utils.proxy_utils import format_proxy
 
 def save_proxies_by_type(categorized_proxies, save_dir="data/validated"):
     """
@@ -18,10 +19,6 @@ def save_proxies_by_type(categorized_proxies, save_dir="data/validated"):
 
         with open(path, 'w') as f:
             for proxy in proxies:
-                if proxy["username"] and proxy["password"]:
-                    proxy_str = f"{proxy['ip']}:{proxy['port']}:{proxy['username']}:{proxy['password']}"
-                else:
-                    proxy_str = f"{proxy['ip']}:{proxy['port']}"
-                f.write(proxy_str + "\n")
+                f.write(format_proxy(proxy) + "\n")
 
     print(f"[+] Proxies saved to '{save_dir}'")
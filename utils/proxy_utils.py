@@ -31,10 +31,17 @@ def test_proxy_latency(ip: str, port: int, timeout: int = 5, attempts: int = 3)
 
     return round(statistics.mean(latencies), 2) if latencies else -1
 
+def format_host(host: str) -> str:
+    """
+    Wraps IPv6 addresses in brackets so they can be followed by :PORT.
+    """
+    return f"[{host}]" if ":" in host else host
+
 def format_proxy(proxy: dict) -> str:
     """
     Converts a proxy dict into string format.
     """
+    host = format_host(proxy['ip'])
     if proxy.get("username") and proxy.get("password"):
-        return f"{proxy['ip']}:{proxy['port']}:{proxy['username']}:{proxy['password']}"
-    return f"{proxy['ip']}:{proxy['port']}"
+        return f"{host}:{proxy['port']}:{proxy['username']}:{proxy['password']}"
+    return f"{host}:{proxy['port']}"
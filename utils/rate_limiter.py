@@ -0,0 +1,82 @@
+import asyncio
+import time
+from typing import Mapping, Optional
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, bursting up to ``capacity``.
+
+    ``update_from_headers`` applies server quota hints (``Retry-After`` and
+    ``X-RateLimit-Remaining``/``X-RateLimit-Reset``), pausing the bucket
+    until the quota resets instead of burning requests on 429s.
+    ``acquire(max_wait=...)`` gives up instead of sleeping through such
+    a pause.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, tokens: float = 1) -> float:
+        """Seconds until ``tokens`` could be taken (0 if available now)."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        if self.delay(tokens) > 0:
+            return False
+        self.tokens -= tokens
+        return True
+
+    async def acquire(self, tokens: float = 1, max_wait: Optional[float] = None) -> bool:
+        """Take ``tokens``, waiting for them; False, taking none, if that would outlast ``max_wait`` seconds."""
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        async with self._lock:
+            while True:
+                wait = self.delay(tokens)
+                if wait <= 0:
+                    self.tokens -= tokens
+                    return True
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    return False
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        retry_after = headers.get("Retry-After")
+        if retry_after:
+            try:
+                self.pause(float(retry_after))
+            except ValueError:
+                pass
+
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is None:
+            return
+        try:
+            remaining = int(remaining)
+        except ValueError:
+            return
+        self.tokens = min(self.tokens, remaining)
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining <= 0 and reset:
+            try:
+                # AbuseIPDB sends the reset time as a Unix timestamp
+                self.pause(max(0.0, float(reset) - time.time()))
+            except ValueError:
+                pass
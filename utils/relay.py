@@ -0,0 +1,274 @@
+import asyncio
+import os
+import selectors
+import socket
+import time
+from typing import List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+RELAY_CHUNK = 256 * 1024  # Bytes moved per splice or recv_into call
+RELAY_PIPE_SIZE = 1 << 20  # Kernel pipe buffer per direction when splicing (capped by fs.pipe-max-size)
+SPLICE_AVAILABLE = hasattr(os, "splice")  # Linux with Python 3.10+
+
+_SPLICE_FLAGS = (os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK) if SPLICE_AVAILABLE else 0
+
+# The relay engine behind CONNECT tunnels. Bytes from one socket go to the
+# other either through a kernel pipe with os.splice, never entering Python,
+# or through one reused bytearray per direction filled by recv_into and
+# sent from a memoryview, with no allocation per chunk. Both sockets are
+# switched to non-blocking for the duration.
+
+
+class _Direction:
+    """One way of a relay: ``src`` -> ``dst`` through a reused buffer."""
+
+    def __init__(self, src: socket.socket, dst: socket.socket):
+        self.src = src
+        self.dst = dst
+        self.pending = 0  # Bytes read from src but not yet written to dst
+        self.total = 0
+        self.open = True
+        self._setup()
+
+    def _setup(self):
+        self._buffer = bytearray(RELAY_CHUNK)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+
+    def fill(self) -> Optional[int]:
+        """Read what ``src`` has; 0 at EOF, None if nothing was ready."""
+        try:
+            count = self.src.recv_into(self._buffer)
+        except (BlockingIOError, InterruptedError):
+            return None
+        self._start = 0
+        self.pending = count
+        return count
+
+    def drain(self) -> bool:
+        """Write pending bytes to ``dst``; True once all of them are out."""
+        while self.pending:
+            try:
+                sent = self.dst.send(self._view[self._start:self._start + self.pending])
+            except (BlockingIOError, InterruptedError):
+                return False
+            self._start += sent
+            self.pending -= sent
+            self.total += sent
+        return True
+
+    def finish(self):
+        """EOF from ``src``: pass the half-close on."""
+        self.open = False
+        try:
+            self.dst.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    def close(self):
+        self._view.release()
+
+
+class _SpliceDirection(_Direction):
+    """``src`` -> pipe -> ``dst`` with os.splice; the payload stays in the kernel."""
+
+    def _setup(self):
+        self._pipe_r, self._pipe_w = os.pipe()
+        if fcntl is not None and hasattr(fcntl, "F_SETPIPE_SZ"):
+            try:
+                fcntl.fcntl(self._pipe_w, fcntl.F_SETPIPE_SZ, RELAY_PIPE_SIZE)
+            except OSError:
+                pass  # Above fs.pipe-max-size; the default 64 KiB still works
+
+    def fill(self) -> Optional[int]:
+        try:
+            count = os.splice(self.src.fileno(), self._pipe_w, RELAY_CHUNK, flags=_SPLICE_FLAGS)
+        except (BlockingIOError, InterruptedError):
+            return None
+        self.pending = count
+        return count
+
+    def drain(self) -> bool:
+        while self.pending:
+            try:
+                sent = os.splice(self._pipe_r, self.dst.fileno(), self.pending, flags=_SPLICE_FLAGS)
+            except (BlockingIOError, InterruptedError):
+                return False
+            self.pending -= sent
+            self.total += sent
+        return True
+
+    def close(self):
+        os.close(self._pipe_r)
+        os.close(self._pipe_w)
+
+
+def _directions(a: socket.socket, b: socket.socket, use_splice: Optional[bool]) -> List[_Direction]:
+    if use_splice is None:
+        use_splice = SPLICE_AVAILABLE
+    if use_splice:
+        try:
+            forward = _SpliceDirection(a, b)
+        except OSError:
+            forward = None  # Out of file descriptors for the pipes; copy through buffers instead
+        if forward is not None:
+            try:
+                return [forward, _SpliceDirection(b, a)]
+            except OSError:
+                forward.close()
+    return [_Direction(a, b), _Direction(b, a)]
+
+
+def _watch(selector: selectors.BaseSelector, sock: socket.socket, events: int):
+    """Make ``selector`` wait for ``events`` on ``sock`` (none: stop watching it)."""
+    try:
+        key = selector.get_key(sock)
+    except KeyError:
+        if events:
+            selector.register(sock, events)
+        return
+    if not events:
+        selector.unregister(sock)
+    elif key.events != events:
+        selector.modify(sock, events)
+
+
+def relay(a: socket.socket, b: socket.socket, idle_timeout: float,
+          use_splice: Optional[bool] = None) -> Tuple[int, int]:
+    """Shuttle bytes both ways until both sides close or nothing moves for ``idle_timeout``.
+
+    Blocks the calling thread. Returns the bytes sent a -> b and b -> a.
+    """
+    timeouts = a.gettimeout(), b.gettimeout()
+    a.setblocking(False)
+    b.setblocking(False)
+    directions = _directions(a, b, use_splice)
+    selector = None
+    try:
+        # Not select.select, which can't take descriptors at or above FD_SETSIZE
+        selector = selectors.DefaultSelector()
+        while any(d.open or d.pending for d in directions):
+            for sock in (a, b):
+                events = 0
+                for d in directions:
+                    if d.src is sock and d.open and not d.pending:
+                        events |= selectors.EVENT_READ
+                    if d.dst is sock and d.pending:
+                        events |= selectors.EVENT_WRITE
+                _watch(selector, sock, events)
+            ready = selector.select(idle_timeout)
+            if not ready:
+                break
+            readable = [key.fileobj for key, events in ready if events & selectors.EVENT_READ]
+            writable = [key.fileobj for key, events in ready if events & selectors.EVENT_WRITE]
+            for d in directions:
+                if d.pending and d.dst in writable:
+                    d.drain()
+                elif d.open and not d.pending and d.src in readable:
+                    count = d.fill()
+                    if count == 0:
+                        d.finish()
+                    elif count:
+                        d.drain()  # Usually goes straight out; the selector waits for the rest
+    except OSError:
+        pass  # Reset by either side; nothing left to relay
+    finally:
+        if selector is not None:
+            selector.close()
+        for d in directions:
+            d.close()
+        a.settimeout(timeouts[0])
+        b.settimeout(timeouts[1])
+    return directions[0].total, directions[1].total
+
+
+async def _ready(loop: asyncio.AbstractEventLoop, fd: int, writable: bool, timeout: float):
+    future = loop.create_future()
+
+    def wake():
+        if not future.done():
+            future.set_result(None)
+
+    (loop.add_writer if writable else loop.add_reader)(fd, wake)
+    try:
+        await asyncio.wait_for(future, timeout)
+    finally:
+        (loop.remove_writer if writable else loop.remove_reader)(fd)
+
+
+async def _pump(loop, d: _Direction, idle_timeout: float, last_activity: List[float]):
+    while d.open:
+        count = d.fill()
+        if count is None:
+            try:
+                await _ready(loop, d.src.fileno(), False, idle_timeout)
+            except asyncio.TimeoutError:
+                if time.monotonic() - last_activity[0] < idle_timeout:
+                    continue  # The other direction is still busy
+                raise
+            continue
+        if count == 0:
+            d.finish()
+            return
+        last_activity[0] = time.monotonic()
+        while not d.drain():
+            await _ready(loop, d.dst.fileno(), True, idle_timeout)
+
+
+async def relay_async(a: socket.socket, b: socket.socket, idle_timeout: float,
+                      use_splice: Optional[bool] = None) -> Tuple[int, int]:
+    """``relay`` on the running event loop, one readiness-driven pump per direction.
+
+    The sockets must not be registered with the loop (no transport
+    reading from them); see ``detach_stream`` for taking them over from
+    asyncio streams.
+    """
+    loop = asyncio.get_running_loop()
+    a.setblocking(False)
+    b.setblocking(False)
+    directions = _directions(a, b, use_splice)
+    last_activity = [time.monotonic()]
+    pumps = [loop.create_task(_pump(loop, d, idle_timeout, last_activity)) for d in directions]
+    try:
+        # A reset or idle timeout on either side ends both directions
+        await asyncio.wait(pumps, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        for pump in pumps:
+            pump.cancel()
+        await asyncio.gather(*pumps, return_exceptions=True)
+        for d in directions:
+            d.close()
+    return directions[0].total, directions[1].total
+
+
+def can_detach(writer: asyncio.StreamWriter) -> bool:
+    """Whether ``detach_stream`` can take over this stream's socket right now.
+
+    Only on a selector loop: ``relay_async`` waits with add_reader and
+    add_writer, which the Windows proactor loop doesn't implement.
+    """
+    if not isinstance(asyncio.get_running_loop(), asyncio.SelectorEventLoop):
+        return False
+    transport = writer.transport
+    return (writer.get_extra_info("socket") is not None and not transport.is_closing() and
+            not transport.get_write_buffer_size())
+
+
+def detach_stream(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Tuple[socket.socket, bytes]:
+    """Take the socket out from under an asyncio stream, for ``relay_async``.
+
+    Check ``can_detach`` first. Returns a duplicate of the stream's socket
+    plus whatever the reader had already buffered; the caller closes both
+    the duplicate and the stream's writer when done.
+    """
+    writer.transport.pause_reading()
+    sock = writer.get_extra_info("socket")
+    # A dup, because the loop refuses add_reader on a descriptor a transport owns
+    dup = socket.socket(sock.family, sock.type, sock.proto, fileno=os.dup(sock.fileno()))
+    buffered = bytes(reader._buffer)  # Read ahead by the stream before the takeover
+    reader._buffer.clear()
+    return dup, buffered
@@ -0,0 +1,244 @@
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from proxy_checker import ProxySessionManager, check_single_proxy
+from utils.proxy_db import ProxyHealthDB
+from utils.rate_limiter import TokenBucket
+
+REVALIDATE_RATE = 5  # Probes per second across the whole pool
+REVALIDATE_CONCURRENCY = 20
+BASE_INTERVAL = 300  # Seconds between checks of a typical working proxy
+REFERENCE_SPEED_MS = 1000  # Proxies this fast get BASE_INTERVAL; faster ones are checked more often
+MIN_INTERVAL = 60
+MAX_INTERVAL = 3600
+DEAD_BASE_INTERVAL = 600  # First retry after a failure, doubled per consecutive failure
+MAX_BACKOFF = 24 * 3600
+EWMA_ALPHA = 0.3  # Weight of the newest latency sample
+
+
+class _Entry:
+    __slots__ = ("proxy", "bucket", "failures", "ewma_ms", "jitter_ms", "due", "version")
+
+    def __init__(self, proxy: Dict, bucket: Optional[str]):
+        self.proxy = proxy
+        self.bucket = bucket
+        self.failures = 0
+        self.ewma_ms: Optional[float] = None
+        self.jitter_ms = 0.0
+        self.due = 0.0
+        self.version = 0
+
+
+class RevalidationScheduler:
+    """Background re-checks of a proxy pool, ordered by a heap of next-check times.
+
+    Newly added proxies are due immediately. After each check the next one
+    is scheduled from the proxy's history: fast, stable proxies come back
+    after ``MIN_INTERVAL``..``BASE_INTERVAL``, slow or jittery ones later,
+    and dead ones back off exponentially up to ``MAX_BACKOFF``. A token
+    bucket caps probes at ``max_rate`` per second however large the pool.
+
+    With ``categorized``, proxies are moved between its buckets when their
+    state changes; with ``db``, results are recorded and history from
+    earlier runs seeds the schedule. ``run`` usually lives on its own
+    thread, so ``lock`` (e.g. the rotator's) is held while the buckets
+    are changed; ``add`` and ``remove`` may be called from any thread.
+    """
+
+    def __init__(self, categorized: Optional[Dict[str, List[Dict]]] = None,
+                 db: Optional[ProxyHealthDB] = None, max_rate: float = REVALIDATE_RATE,
+                 concurrency: int = REVALIDATE_CONCURRENCY,
+                 on_result: Optional[Callable[[Dict], None]] = None,
+                 lock: Optional[threading.Lock] = None):
+        self.categorized = categorized
+        self.db = db
+        self.bucket = TokenBucket(max_rate, max(1.0, max_rate))
+        self.concurrency = concurrency
+        self.on_result = on_result
+        self.lock = lock or threading.Lock()  # Guards the lists in ``categorized``
+        self.running = False
+        self.checks = 0
+        self._entries: Dict[int, _Entry] = {}
+        self._heap: List = []
+        self._heap_lock = threading.Lock()  # Guards _heap and _entries; add() may come from any thread
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        if categorized:
+            for bucket, proxies in categorized.items():
+                for proxy in proxies:
+                    self.add(proxy, bucket=bucket, due=None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, proxy: Dict, bucket: Optional[str] = None, due: Optional[float] = 0.0):
+        """Track ``proxy``. ``due=0`` checks it before anything else; ``None`` schedules it from its history."""
+        with self._heap_lock:
+            if id(proxy) in self._entries:
+                return
+            entry = _Entry(proxy, bucket)
+            self._entries[id(proxy)] = entry
+        if due is None:
+            due = self._seed(entry)
+        self._schedule(entry, due)
+
+    def remove(self, proxy: Dict):
+        with self._heap_lock:
+            entry = self._entries.pop(id(proxy), None)
+            if entry is not None:
+                entry.version += 1  # Leaves its heap item stale
+
+    def _seed(self, entry: _Entry) -> float:
+        proxy = entry.proxy
+        history = self.db.history(proxy) if self.db else None
+        if history and history["last_checked"]:
+            entry.failures = history["failure_streak"]
+            entry.ewma_ms = history["median_ms"]
+            entry.jitter_ms = history["jitter_ms"] or 0.0
+            return history["last_checked"] + self.interval_for(entry)
+        if entry.bucket in (None, "BAD") or proxy.get("speed") is None:
+            return 0.0
+        # Just validated in this run: the first re-check can wait a full interval
+        entry.ewma_ms = proxy["speed"]
+        return time.time() + self.interval_for(entry)
+
+    def interval_for(self, entry: _Entry) -> float:
+        """Seconds until ``entry`` should be checked again."""
+        if entry.failures:
+            backoff = DEAD_BASE_INTERVAL * 2 ** min(entry.failures - 1, 20)
+            return min(MAX_BACKOFF, backoff) * random.uniform(0.9, 1.1)
+        if entry.ewma_ms is None:
+            return MIN_INTERVAL
+        slowness = min(4.0, max(0.5, entry.ewma_ms / REFERENCE_SPEED_MS))
+        instability = 1 + min(1.0, entry.jitter_ms / max(entry.ewma_ms, 1.0))
+        interval = BASE_INTERVAL * slowness * instability
+        return min(MAX_INTERVAL, max(MIN_INTERVAL, interval)) * random.uniform(0.9, 1.1)
+
+    def _schedule(self, entry: _Entry, due: float):
+        with self._heap_lock:
+            entry.version += 1
+            entry.due = due
+            heapq.heappush(self._heap, (due, next(self._counter), entry.version, id(entry.proxy)))
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                pass  # Loop already closed
+
+    def _pop_due(self, now: float) -> Optional[_Entry]:
+        """Next entry that is due, dropping stale heap items along the way."""
+        with self._heap_lock:
+            while self._heap:
+                due, _, version, key = self._heap[0]
+                entry = self._entries.get(key)
+                if entry is None or entry.version != version:
+                    heapq.heappop(self._heap)
+                    continue
+                if due > now:
+                    return None
+                heapq.heappop(self._heap)
+                return entry
+            return None
+
+    def next_due(self) -> Optional[float]:
+        with self._heap_lock:
+            while self._heap:
+                due, _, version, key = self._heap[0]
+                entry = self._entries.get(key)
+                if entry is not None and entry.version == version:
+                    return due
+                heapq.heappop(self._heap)
+            return None
+
+    def _apply(self, entry: _Entry, result: Dict):
+        proxy = entry.proxy
+        proxy_type = result.get("type")
+        if proxy_type:
+            speed = result["speed"]
+            if entry.ewma_ms is None:
+                entry.ewma_ms = speed
+            else:
+                entry.jitter_ms += EWMA_ALPHA * (abs(speed - entry.ewma_ms) - entry.jitter_ms)
+                entry.ewma_ms += EWMA_ALPHA * (speed - entry.ewma_ms)
+            entry.failures = 0
+            proxy["speed"] = speed
+            for key in ("connect_ms", "ttfb_ms", "total_ms"):
+                proxy[key] = result.get(key)
+        else:
+            entry.failures += 1
+
+        new_bucket = proxy_type or "BAD"
+        if self.categorized is not None and new_bucket != entry.bucket:
+            with self.lock:
+                if entry.bucket in self.categorized:
+                    bucket = self.categorized[entry.bucket]
+                    for index, candidate in enumerate(bucket):
+                        if candidate is proxy:
+                            del bucket[index]
+                            break
+                self.categorized.setdefault(new_bucket, []).append(proxy)
+        entry.bucket = new_bucket
+
+        if self.db is not None:
+            self.db.record(result)
+        if self.on_result is not None:
+            self.on_result(result)
+
+    async def _check(self, entry: _Entry, sessions: ProxySessionManager, slots: asyncio.Semaphore):
+        try:
+            result = await check_single_proxy(entry.proxy, sessions)
+            self.checks += 1
+            if id(entry.proxy) in self._entries:
+                self._apply(entry, result)
+                self._schedule(entry, time.time() + self.interval_for(entry))
+        except Exception as e:
+            print(f"[Revalidator] Check failed for {entry.proxy.get('ip')}:{entry.proxy.get('port')} -> {e}")
+            self._schedule(entry, time.time() + MIN_INTERVAL)
+        finally:
+            slots.release()
+
+    async def run(self):
+        """Check proxies as they fall due until ``stop()`` is called."""
+        self.running = True
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        async with ProxySessionManager(limit=self.concurrency) as sessions:
+            try:
+                while self.running:
+                    entry = self._pop_due(time.time())
+                    if entry is None:
+                        next_due = self.next_due()
+                        wait = 1.0 if next_due is None else min(1.0, max(0.0, next_due - time.time()))
+                        self._wakeup.clear()
+                        try:
+                            await asyncio.wait_for(self._wakeup.wait(), wait)
+                        except asyncio.TimeoutError:
+                            pass
+                        continue
+
+                    await slots.acquire()
+                    await self.bucket.acquire()
+                    task = asyncio.create_task(self._check(entry, sessions, slots))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                self._loop = self._wakeup = None
+                if self.db is not None:
+                    self.db.commit()
+
+    def stop(self):
+        self.running = False
+
@@ -0,0 +1,339 @@
+import heapq
+import itertools
+import random
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_SPEED_MS = 1000  # Assumed latency for proxies that have not been timed yet
+MIN_SPEED_MS = 1  # Floor so a 0 ms reading can't take all the weight
+EWMA_ALPHA = 0.3  # Weight of the newest latency sample
+
+
+def proxy_speed(proxy: Dict) -> float:
+    speed = proxy.get("speed")
+    return max(MIN_SPEED_MS, speed) if speed is not None else DEFAULT_SPEED_MS
+
+
+class SelectionStrategy:
+    """Picks the next proxy from a pool that can change while in use.
+
+    Proxies are tracked by identity, so dicts and ``Proxy`` records both
+    work. ``add``/``remove``/``update`` and ``select`` are O(1) or
+    O(log n) in every strategy.
+    """
+
+    name = "random"
+
+    def __init__(self, proxies: Iterable[Dict] = (), rng: Optional[random.Random] = None):
+        self.rng = rng or random.Random()
+        self._proxies: List[Dict] = []
+        self._positions: Dict[int, int] = {}
+        for proxy in proxies:
+            self.add(proxy)
+
+    def __len__(self):
+        return len(self._proxies)
+
+    def __contains__(self, proxy: Dict) -> bool:
+        return id(proxy) in self._positions
+
+    def add(self, proxy: Dict):
+        if id(proxy) in self._positions:
+            self.update(proxy)
+            return
+        self._positions[id(proxy)] = len(self._proxies)
+        self._proxies.append(proxy)
+        self._added(proxy)
+
+    def remove(self, proxy: Dict):
+        position = self._positions.pop(id(proxy), None)
+        if position is None:
+            return
+        # Swap with the last entry so removal stays O(1)
+        last = self._proxies.pop()
+        if last is not proxy:
+            self._proxies[position] = last
+            self._positions[id(last)] = position
+        self._removed(proxy)
+
+    def update(self, proxy: Dict, latency_ms: Optional[float] = None, smoothed: bool = False):
+        """Feed a new latency measurement (or a changed ``speed``) into the strategy.
+
+        ``smoothed`` marks ``latency_ms`` as an average already, to be taken
+        as the proxy's score rather than blended into it.
+        """
+
+    def select(self, exclude: Optional[Dict] = None) -> Optional[Dict]:
+        """Next proxy, avoiding ``exclude`` unless it is the only one left."""
+        return self._pick_uniform(exclude)
+
+    def _added(self, proxy: Dict):
+        pass
+
+    def _removed(self, proxy: Dict):
+        pass
+
+    def _pick_uniform(self, exclude: Optional[Dict] = None) -> Optional[Dict]:
+        count = len(self._proxies)
+        if count == 0:
+            return None
+        if exclude is None or count == 1 or id(exclude) not in self._positions:
+            return self._proxies[self.rng.randrange(count)]
+        # Draw from every slot but the excluded one
+        index = self.rng.randrange(count - 1)
+        if index >= self._positions[id(exclude)]:
+            index += 1
+        return self._proxies[index]
+
+
+class _FenwickTree:
+    """Prefix sums over slot weights with O(log n) point updates and weighted search."""
+
+    def __init__(self, capacity: int):
+        self.weights = [0.0] * capacity
+        self.tree = [0.0] * (capacity + 1)
+        self.total = 0.0
+
+    def __len__(self):
+        return len(self.weights)
+
+    def grow(self, capacity: int):
+        self.weights.extend([0.0] * (capacity - len(self.weights)))
+        self._rebuild()
+
+    def _rebuild(self):
+        # O(n) construction; also clears accumulated floating-point drift
+        size = len(self.weights)
+        tree = [0.0] * (size + 1)
+        for i, weight in enumerate(self.weights, 1):
+            tree[i] += weight
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self.tree = tree
+        self.total = sum(self.weights)
+
+    def set(self, index: int, weight: float):
+        delta = weight - self.weights[index]
+        self.weights[index] = weight
+        self.total += delta
+        i = index + 1
+        size = len(self.weights)
+        while i <= size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def find(self, target: float) -> int:
+        """Smallest slot whose running weight sum exceeds ``target``."""
+        position = 0
+        step = 1 << (len(self.weights).bit_length() - 1)
+        while step:
+            nxt = position + step
+            if nxt <= len(self.weights) and self.tree[nxt] <= target:
+                position = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return min(position, len(self.weights) - 1)
+
+
+class WeightedLatencyStrategy(SelectionStrategy):
+    """Random pick weighted by 1 / latency, so a 100 ms proxy is chosen 10x as often as a 1 s one."""
+
+    name = "weighted"
+
+    def __init__(self, proxies: Iterable[Dict] = (), rng: Optional[random.Random] = None):
+        self._tree = _FenwickTree(64)
+        self._slots: List[Optional[Dict]] = [None] * 64
+        self._slot_of: Dict[int, int] = {}
+        self._free: List[int] = list(range(63, -1, -1))
+        super().__init__(proxies, rng)
+
+    def _added(self, proxy: Dict):
+        if not self._free:
+            size = len(self._slots)
+            self._slots.extend([None] * size)
+            self._free = list(range(2 * size - 1, size - 1, -1))
+            self._tree.grow(2 * size)
+        slot = self._free.pop()
+        self._slots[slot] = proxy
+        self._slot_of[id(proxy)] = slot
+        self._tree.set(slot, 1.0 / proxy_speed(proxy))
+
+    def _removed(self, proxy: Dict):
+        slot = self._slot_of.pop(id(proxy))
+        self._slots[slot] = None
+        self._tree.set(slot, 0.0)
+        self._free.append(slot)
+
+    def update(self, proxy: Dict, latency_ms: Optional[float] = None, smoothed: bool = False):
+        slot = self._slot_of.get(id(proxy))
+        if slot is None:
+            return
+        speed = max(MIN_SPEED_MS, latency_ms) if latency_ms is not None else proxy_speed(proxy)
+        self._tree.set(slot, 1.0 / speed)
+
+    def select(self, exclude: Optional[Dict] = None) -> Optional[Dict]:
+        if len(self) <= 1:
+            return self._pick_uniform()
+        excluded_slot = self._slot_of.get(id(exclude)) if exclude is not None else None
+        excluded_weight = 0.0
+        if excluded_slot is not None:
+            excluded_weight = self._tree.weights[excluded_slot]
+            self._tree.set(excluded_slot, 0.0)
+        try:
+            for _ in range(3):
+                slot = self._tree.find(self.rng.random() * self._tree.total)
+                proxy = self._slots[slot]
+                if proxy is not None and slot != excluded_slot:
+                    return proxy
+            # Rounding landed on an empty slot every time; fall back to a uniform pick
+            return self._pick_uniform(exclude)
+        finally:
+            if excluded_slot is not None:
+                self._tree.set(excluded_slot, excluded_weight)
+
+
+class _ScoredStrategy(SelectionStrategy):
+    """Keeps a latency EWMA per proxy, seeded from its measured ``speed``."""
+
+    def __init__(self, proxies: Iterable[Dict] = (), rng: Optional[random.Random] = None):
+        self._scores: Dict[int, float] = {}
+        super().__init__(proxies, rng)
+
+    def _initial_score(self, proxy: Dict) -> float:
+        return proxy_speed(proxy)
+
+    def _added(self, proxy: Dict):
+        self._scores[id(proxy)] = self._initial_score(proxy)
+
+    def _removed(self, proxy: Dict):
+        self._scores.pop(id(proxy), None)
+
+    def score(self, proxy: Dict) -> Optional[float]:
+        return self._scores.get(id(proxy))
+
+    def update(self, proxy: Dict, latency_ms: Optional[float] = None, smoothed: bool = False):
+        key = id(proxy)
+        if key not in self._scores:
+            return
+        if latency_ms is None:
+            self._scores[key] = proxy_speed(proxy)
+        elif smoothed:
+            self._scores[key] = latency_ms
+        else:
+            self._scores[key] += EWMA_ALPHA * (latency_ms - self._scores[key])
+        self._rescored(proxy)
+
+    def _rescored(self, proxy: Dict):
+        pass
+
+
+class PowerOfTwoStrategy(_ScoredStrategy):
+    """Sample two proxies uniformly and take the one with the lower latency EWMA.
+
+    Nearly as good as always taking the fastest, without piling every
+    consumer onto the same proxy.
+    """
+
+    name = "p2c"
+
+    def select(self, exclude: Optional[Dict] = None) -> Optional[Dict]:
+        first = self._pick_uniform(exclude)
+        if first is None or len(self) <= 2:
+            return first
+        second = self._pick_uniform(exclude)
+        if self._scores[id(second)] < self._scores[id(first)]:
+            return second
+        return first
+
+
+class EWMAStrategy(_ScoredStrategy):
+    """Always the proxy with the lowest latency EWMA, from a lazily updated min-heap.
+
+    Proxies without a measurement start at 0 ms, so new ones get tried
+    first and then settle where their real latency puts them.
+    """
+
+    name = "ewma"
+
+    def __init__(self, proxies: Iterable[Dict] = (), rng: Optional[random.Random] = None):
+        self._heap: List = []
+        self._versions: Dict[int, int] = {}
+        self._members: Dict[int, Dict] = {}
+        self._counter = itertools.count()
+        super().__init__(proxies, rng)
+
+    def _initial_score(self, proxy: Dict) -> float:
+        return proxy["speed"] if proxy.get("speed") is not None else 0.0
+
+    def _added(self, proxy: Dict):
+        super()._added(proxy)
+        self._members[id(proxy)] = proxy
+        self._rescored(proxy)
+
+    def _removed(self, proxy: Dict):
+        super()._removed(proxy)
+        self._members.pop(id(proxy), None)
+        self._versions.pop(id(proxy), None)
+
+    def _rescored(self, proxy: Dict):
+        key = id(proxy)
+        version = self._versions.get(key, 0) + 1
+        self._versions[key] = version
+        heapq.heappush(self._heap, (self._scores[key], next(self._counter), version, key))
+        # Stale items pile up with every update; compact once they dominate
+        if len(self._heap) > 2 * len(self._members) + 64:
+            self._heap = [item for item in self._heap if self._versions.get(item[3]) == item[2]]
+            heapq.heapify(self._heap)
+
+    def _pop_stale(self):
+        while self._heap and self._versions.get(self._heap[0][3]) != self._heap[0][2]:
+            heapq.heappop(self._heap)
+
+    def select(self, exclude: Optional[Dict] = None) -> Optional[Dict]:
+        self._pop_stale()
+        if not self._heap:
+            return None
+        best = self._members[self._heap[0][3]]
+        if best is not exclude or len(self) == 1:
+            return best
+        held = heapq.heappop(self._heap)
+        try:
+            self._pop_stale()
+            return self._members[self._heap[0][3]] if self._heap else best
+        finally:
+            heapq.heappush(self._heap, held)
+
+
+class LRUStrategy(SelectionStrategy):
+    """The proxy that was handed out longest ago, spreading use evenly over the pool."""
+
+    name = "lru"
+
+    def __init__(self, proxies: Iterable[Dict] = (), rng: Optional[random.Random] = None):
+        self._order: OrderedDict = OrderedDict()
+        super().__init__(proxies, rng)
+
+    def _added(self, proxy: Dict):
+        self._order[id(proxy)] = proxy
+        self._order.move_to_end(id(proxy), last=False)  # Never used yet
+
+    def _removed(self, proxy: Dict):
+        self._order.pop(id(proxy), None)
+
+    def select(self, exclude: Optional[Dict] = None) -> Optional[Dict]:
+        for proxy in self._order.values():
+            if proxy is not exclude or len(self._order) == 1:
+                self._order.move_to_end(id(proxy))
+                return proxy
+        return None
+
+
+STRATEGIES = {strategy.name: strategy for strategy in
+              (SelectionStrategy, WeightedLatencyStrategy, PowerOfTwoStrategy, EWMAStrategy, LRUStrategy)}
+
+
+def make_strategy(name: str, proxies: Iterable[Dict] = ()) -> SelectionStrategy:
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown selection strategy '{name}', expected one of {sorted(STRATEGIES)}")
+    return STRATEGIES[name](proxies)
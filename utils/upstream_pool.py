@@ -0,0 +1,185 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+POOL_MAX_IDLE_PER_KEY = 8  # Idle connections kept per (proxy, destination)
+POOL_MAX_IDLE = 1024  # Idle connections kept in total; the longest idle go first
+POOL_IDLE_TIMEOUT = 30  # Seconds an idle connection is kept before it is closed
+POOL_SWEEP_INTERVAL = 5  # Seconds between sweeps for expired idle connections
+
+Dial = Callable[[Dict, str, int], Awaitable[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]]
+
+
+class PooledConnection:
+    """An upstream connection through ``proxy`` to one destination, with the proxy handshake done."""
+
+    __slots__ = ("key", "proxy", "reader", "writer", "requests", "idle_since")
+
+    def __init__(self, key: Tuple, proxy: Dict, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.key = key
+        self.proxy = proxy
+        self.reader = reader
+        self.writer = writer
+        self.requests = 0  # Requests served; 0 means nothing has been sent on it yet
+        self.idle_since = 0.0
+
+    def alive(self) -> bool:
+        return not (self.writer.is_closing() or self.reader.at_eof() or self.reader.exception())
+
+    def close(self):
+        self.writer.close()
+
+
+class UpstreamPool:
+    """Idle, already-handshaked upstream connections keyed by (proxy, host, port).
+
+    ``acquire`` hands out the most recently used live connection for the
+    key, or dials a new one with ``dial(proxy, host, port)``. Connections
+    that peers closed while idle, that sat longer than ``idle_timeout``
+    or whose proxy was ``evict``-ed are dropped. ``prewarm`` dials ahead
+    of demand, and with ``refill`` a key that has just handed out its
+    last idle connection gets a fresh one dialed in the background.
+    """
+
+    def __init__(self, dial: Dial, max_idle_per_key: int = POOL_MAX_IDLE_PER_KEY,
+                 max_idle: int = POOL_MAX_IDLE, idle_timeout: float = POOL_IDLE_TIMEOUT,
+                 refill: bool = True):
+        self.dial = dial
+        self.max_idle_per_key = max_idle_per_key
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.refill = refill
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._idle: Dict[Tuple, Deque[PooledConnection]] = {}
+        self._in_use: Dict[Tuple, int] = {}  # Connections handed out and not yet released, per key
+        self._lru: OrderedDict = OrderedDict()  # id(conn) -> conn, longest idle first
+        self._warming: set = set()
+        self._tasks: set = set()
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._lru)
+
+    @staticmethod
+    def key_for(proxy: Dict, host: str, port: int) -> Tuple:
+        return id(proxy), host, port
+
+    async def acquire(self, proxy: Dict, host: str, port: int, fresh: bool = False) -> PooledConnection:
+        """A live connection for the key; ``fresh`` skips ones that already carried requests (e.g. for CONNECT)."""
+        key = self.key_for(proxy, host, port)
+        idle = self._idle.get(key)
+        now = time.monotonic()
+        # Most recently used first; used ones stay put for plain requests when ``fresh``
+        for conn in [conn for conn in reversed(idle or ()) if not (fresh and conn.requests)]:
+            idle.remove(conn)
+            del self._lru[id(conn)]
+            if not idle:
+                del self._idle[key]
+            if conn.alive() and now - conn.idle_since < self.idle_timeout:
+                self.hits += 1
+                self._checked_out(key, 1)
+                self._maybe_refill(key, proxy, host, port)
+                return conn
+            conn.close()
+            self.evicted += 1
+        self.misses += 1
+        reader, writer = await self.dial(proxy, host, port)
+        self._checked_out(key, 1)
+        return PooledConnection(key, proxy, reader, writer)
+
+    def _checked_out(self, key: Tuple, delta: int):
+        count = self._in_use.get(key, 0) + delta
+        if count > 0:
+            self._in_use[key] = count
+        else:
+            self._in_use.pop(key, None)
+
+    def release(self, conn: PooledConnection, reusable: bool = True):
+        """Return ``conn`` for reuse, or close it if it can't carry another request."""
+        self._checked_out(conn.key, -1)
+        if not reusable or not conn.alive() or self.max_idle_per_key <= 0:
+            conn.close()
+            return
+        self._keep(conn)
+
+    def _keep(self, conn: PooledConnection):
+        idle = self._idle.setdefault(conn.key, deque())
+        if len(idle) >= self.max_idle_per_key:
+            oldest = idle.popleft()
+            del self._lru[id(oldest)]
+            oldest.close()
+            self.evicted += 1
+        conn.idle_since = time.monotonic()
+        idle.append(conn)
+        self._lru[id(conn)] = conn
+        while len(self._lru) > self.max_idle:
+            self._drop(next(iter(self._lru.values())))
+
+    def _drop(self, conn: PooledConnection):
+        del self._lru[id(conn)]
+        idle = self._idle[conn.key]
+        idle.remove(conn)
+        if not idle:
+            del self._idle[conn.key]
+        conn.close()
+        self.evicted += 1
+
+    def evict(self, proxy: Dict) -> int:
+        """Close every idle connection through ``proxy``, e.g. after it failed or was ejected."""
+        doomed = [conn for conn in self._lru.values() if conn.proxy is proxy]
+        for conn in doomed:
+            self._drop(conn)
+        return len(doomed)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Close connections idle past ``idle_timeout`` or closed by the peer."""
+        now = now or time.monotonic()
+        doomed = [conn for conn in self._lru.values()
+                  if now - conn.idle_since >= self.idle_timeout or not conn.alive()]
+        for conn in doomed:
+            self._drop(conn)
+        return len(doomed)
+
+    async def prewarm(self, proxy: Dict, host: str, port: int, count: int = 1) -> int:
+        """Dial up to ``count`` connections ahead of demand; returns how many are now idle for the key."""
+        key = self.key_for(proxy, host, port)
+        missing = min(count, self.max_idle_per_key) - len(self._idle.get(key, ()))
+        results = await asyncio.gather(*[self.dial(proxy, host, port) for _ in range(max(0, missing))],
+                                       return_exceptions=True)
+        for result in results:
+            if not isinstance(result, BaseException):
+                self._keep(PooledConnection(key, proxy, *result))
+        return len(self._idle.get(key, ()))
+
+    def _maybe_refill(self, key: Tuple, proxy: Dict, host: str, port: int):
+        # A key with many connections out gets plenty back on release; warming it would only churn
+        if (not self.refill or self._idle.get(key) or key in self._warming or
+                self._in_use.get(key, 0) >= self.max_idle_per_key):
+            return
+        self._warming.add(key)
+        task = asyncio.get_running_loop().create_task(self.prewarm(proxy, host, port))
+        self._tasks.add(task)
+        task.add_done_callback(lambda done: (self._tasks.discard(done), self._warming.discard(key)))
+
+    def start(self):
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(POOL_SWEEP_INTERVAL)
+            self.sweep()
+
+    async def close(self):
+        tasks = list(self._tasks) + ([self._sweeper] if self._sweeper else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._sweeper = None
+        for conn in list(self._lru.values()):
+            conn.close()
+        self._lru.clear()
+        self._idle.clear()